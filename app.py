@@ -1,23 +1,54 @@
+import os
+import sys
 import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
-import numpy as np
-import statsmodels.api as sm
 
-# Cache the data loading for performance
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+from storage import load_frame, resolve_dataset
+from anomaly_detection import StreamingResidualDetector
+from downsampling import downsample
+from aggregates import load_pyramid, range_series, range_summary, rolling_mean
+from decomposition import DecompositionCache
+
+# Plots are 10 inches wide at 100 dpi; more points than pixels cannot be seen
+PLOT_POINTS = 1000
+
+def file_version(path):
+    # Changes whenever the pipeline rewrites or appends to the file; for a partitioned
+    # dataset the directory changes whenever one of its month files is replaced
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (path, stat.st_size, stat.st_mtime_ns)
+
+# Cache the data loading for performance; the version makes a rewritten file load again
 @st.cache_data
-def load_data(path):
-    # Load CSV file, parse dates, and set 'Datetime' as index
+def load_data(path, columns=None, version=None):
+    # Load the Parquet dataset (or a CSV export) with 'Datetime' as an hourly index
     try:
-        df = pd.read_csv(path, index_col='Datetime', parse_dates=True)
-        return df.asfreq('H')
+        return load_frame(path, columns=columns, freq='H')
     except Exception as e:
         st.error(f"Error loading data from {path}: {e}")
         return pd.DataFrame()
 
+# Keep the aggregate pyramid in memory across reruns; the pipeline rewrites the hourly
+# level on every run, so its version makes an updated pyramid load again
+@st.cache_resource
+def load_aggregates(directory, version=None):
+    return load_pyramid(directory)
+
+# Decompositions are cached across reruns and sessions, keyed by the data file's version,
+# and extended when the selected range grows
+@st.cache_resource
+def decomposition_cache():
+    return DecompositionCache(maxsize=16)
+
 def plot_time_series(data, title, ylabel):
     fig, ax = plt.subplots(figsize=(10, 5))
-    ax.plot(data.index, data.iloc[:, 0], label=data.columns[0])
+    series = downsample(data.iloc[:, 0], PLOT_POINTS)
+    ax.plot(series.index, series, label=data.columns[0])
     ax.set_title(title)
     ax.set_xlabel('Datetime')
     ax.set_ylabel(ylabel)
@@ -25,20 +56,23 @@ def plot_time_series(data, title, ylabel):
     st.pyplot(fig)
 
 def detect_anomalies(actual, forecast, threshold_multiplier):
-    residual = actual - forecast
-    std_resid = residual.std()
-    anomaly_mask = np.abs(residual) > threshold_multiplier * std_resid
-    anomalies = actual[anomaly_mask]
+    # Score each point against the residuals before it, so flags never use later data
+    detector = StreamingResidualDetector(threshold=threshold_multiplier)
+    scores = detector.update_batch(actual, forecast)
+    anomalies = actual[scores['is_anomaly']]
     return anomalies
 
-def plot_seasonal_decomposition(series, model='additive'):
-    decomposition = sm.tsa.seasonal_decompose(series, model=model, period=24)
-    fig, axes = plt.subplots(4, 1, figsize=(10, 8), sharex=True)
-    
-    decomposition.observed.plot(ax=axes[0], title="Observed")
-    decomposition.trend.plot(ax=axes[1], title="Trend")
-    decomposition.seasonal.plot(ax=axes[2], title="Seasonal")
-    decomposition.resid.plot(ax=axes[3], title="Residual")
+def plot_seasonal_decomposition(series, model='additive', periods=(24,), version=None):
+    components = decomposition_cache().decompose(series, model=model, periods=periods, version=version)
+    panels = [('observed', "Observed"), ('trend', "Trend")]
+    panels += [(f'seasonal_{period}', f"Seasonal ({period}h)") for period in sorted(periods)]
+    panels.append(('resid', "Residual"))
+    fig, axes = plt.subplots(len(panels), 1, figsize=(10, 2 * len(panels)), sharex=True)
+
+    # Oscillating components keep their envelope with min/max downsampling
+    for ax, (column, title) in zip(axes, panels):
+        method = 'lttb' if column in ('observed', 'trend') else 'minmax'
+        downsample(components[column], PLOT_POINTS, method=method).plot(ax=ax, title=title)
 
     for ax in axes:
         ax.set_xlabel("Datetime")
@@ -62,12 +96,14 @@ This dashboard allows users to explore energy consumption data through various a
 """)
 
 # File paths for data
-processed_file = "data/processed/household_power_consumption_enhanced.csv"
-forecast_file  = "data/processed/arima_forecast.csv"
+processed_file = resolve_dataset("data/processed/household_power_consumption_enhanced")
+forecast_file  = resolve_dataset("data/processed/arima_forecast")
 
-# Load the datasets
-data = load_data(processed_file)
-forecast = load_data(forecast_file)
+# Load the datasets; the dashboard only plots the target column
+processed_version = file_version(processed_file)
+data = load_data(processed_file, columns=['Global_active_power'], version=processed_version)
+forecast = load_data(forecast_file, version=file_version(forecast_file))
+pyramid = load_aggregates("data/processed/pyramid", version=file_version("data/processed/pyramid/hourly.parquet"))
 
 # Sidebar Navigation and Filters
 st.sidebar.header("Navigation & Filters")
@@ -85,13 +121,30 @@ else:
 
 filtered_data = data.loc[str(start_date):str(end_date)] if start_date and end_date else data
 filtered_forecast = forecast.loc[str(start_date):str(end_date)] if start_date and end_date else forecast
+# Hour range covered by the selected dates, for queries against the aggregate pyramid
+if start_date and end_date:
+    range_start = pd.Timestamp(start_date)
+    range_end = pd.Timestamp(end_date) + pd.Timedelta(hours=23)
+elif not data.empty:
+    range_start, range_end = data.index[0], data.index[-1]
+else:
+    range_start = range_end = None
+use_pyramid = pyramid is not None and range_start is not None
 
 # Analysis Sections
 if analysis_type == "Historical & Forecast":
     st.header("Historical & Forecasted Energy Consumption")
     
     st.subheader("Historical Energy Consumption")
-    if not filtered_data.empty:
+    if use_pyramid:
+        # Wide ranges are drawn from the coarsest level that still fills the plot, and
+        # reduced to PLOT_POINTS by LTTB like the other plots
+        series, level = range_series(pyramid, 'Global_active_power', range_start, range_end, PLOT_POINTS)
+        summary = range_summary(pyramid, 'Global_active_power', range_start, range_end)
+        st.write(f"Mean {summary['mean']:.3f} kW, min {summary['min']:.3f} kW, max {summary['max']:.3f} kW "
+                 f"over {summary['count']} hours (plotted at {level} resolution).")
+        plot_time_series(series.to_frame('Global_active_power'), "Historical Global Active Power", "Global Active Power")
+    elif not filtered_data.empty:
         plot_time_series(filtered_data[['Global_active_power']], "Historical Global Active Power", "Global Active Power")
     else:
         st.write("No historical data available.")
@@ -121,8 +174,10 @@ elif analysis_type == "Anomaly Detection":
         st.write(f"Number of anomalies detected: {len(anomalies)}")
 
         fig, ax = plt.subplots(figsize=(10, 5))
-        ax.plot(common_index, actual_aligned, label="Actual", color='blue')
-        ax.plot(common_index, forecast_aligned, label="Forecast", linestyle="--", color='green')
+        actual_plot = downsample(actual_aligned, PLOT_POINTS, keep=anomalies.index)
+        forecast_plot = downsample(forecast_aligned, PLOT_POINTS)
+        ax.plot(actual_plot.index, actual_plot, label="Actual", color='blue')
+        ax.plot(forecast_plot.index, forecast_plot, label="Forecast", linestyle="--", color='green')
         if not anomalies.empty:
             ax.scatter(anomalies.index, anomalies, color="red", label="Anomalies", zorder=5)
         ax.set_title("Anomaly Detection: Actual vs Forecast")
@@ -147,10 +202,15 @@ elif analysis_type == "Rolling Average":
     st.header("Rolling Average Analysis")
     rolling_window = st.sidebar.slider("Select Rolling Window (Hours)", 3, 48, 24)
     if not filtered_data.empty:
-        rolling_avg = filtered_data['Global_active_power'].rolling(window=rolling_window).mean()
+        if use_pyramid:
+            rolling_avg = rolling_mean(pyramid, 'Global_active_power', rolling_window, range_start, range_end)
+        else:
+            rolling_avg = filtered_data['Global_active_power'].rolling(window=rolling_window).mean()
+        original_plot = downsample(filtered_data['Global_active_power'], PLOT_POINTS, method='minmax')
+        rolling_plot = downsample(rolling_avg, PLOT_POINTS)
         fig, ax = plt.subplots(figsize=(10, 5))
-        ax.plot(filtered_data.index, filtered_data['Global_active_power'], label="Original Data", alpha=0.5)
-        ax.plot(filtered_data.index, rolling_avg, label=f"Rolling Average ({rolling_window} hrs)", color="red")
+        ax.plot(original_plot.index, original_plot, label="Original Data", alpha=0.5)
+        ax.plot(rolling_plot.index, rolling_plot, label=f"Rolling Average ({rolling_window} hrs)", color="red")
         ax.set_title(f"Rolling Average with {rolling_window}-hour Window")
         ax.set_xlabel("Datetime")
         ax.set_ylabel("Global Active Power")
@@ -168,8 +228,10 @@ elif analysis_type == "Rolling Average":
 elif analysis_type == "Seasonal Decomposition":
     st.header("Seasonal Decomposition Analysis")
     model_type = st.sidebar.radio("Select Decomposition Model", ["Additive", "Multiplicative"])
+    periods = st.sidebar.multiselect("Seasonal Periods (hours)", [24, 168], default=[24]) or [24]
     if not filtered_data.empty:
-        plot_seasonal_decomposition(filtered_data['Global_active_power'].dropna(), model=model_type.lower())
+        plot_seasonal_decomposition(filtered_data['Global_active_power'].dropna(), model=model_type.lower(),
+                                    periods=periods, version=processed_version)
         description = (
             "Seasonal decomposition splits the time series into its constituent components: trend, seasonality, and residuals. "
             "This analysis reveals underlying patterns and irregularities, aiding in understanding the dynamics of energy consumption."
@@ -0,0 +1,232 @@
+# benchmarks/run_benchmarks.py
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCHMARK_DIR), "src"))
+from synthetic_data import write_meter_files
+from data_preprocessing import read_raw_chunks, HourlyResampler, MEASUREMENT_COLUMNS
+from data_pipeline import add_features, TARGET
+from forecasting_model import grid_search_arima, fit_arima_with_metadata
+from batch_forecasting import forecast_many
+from anomaly_detection import StreamingResidualDetector, IsolationForestAnomalyModel
+from aggregates import build_pyramid, range_summary
+from downsampling import downsample
+from decomposition import DecompositionCache
+from utils import configure_instrumentation, peak_rss_mb, write_json_atomic
+from logging_config import configure_logging
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.join(BENCHMARK_DIR, "data")
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, "results")
+BASELINE_FILE = os.path.join(BENCHMARK_DIR, "baseline.json")
+
+def bench_ingest_and_resample(ctx: dict):
+    """
+    Parse the raw files and resample them to hourly rows in one streaming pass; parsing
+    and resampling are timed separately.
+    """
+    rows, resample_seconds, hourly = 0, 0.0, []
+    for path in ctx["paths"]:
+        resampler, chunks = HourlyResampler(), []
+        for chunk in read_raw_chunks(path, chunksize=ctx["chunksize"]):
+            rows += len(chunk)
+            start = time.perf_counter()
+            chunks.append(resampler.push(chunk))
+            resample_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        chunks.append(resampler.flush())
+        frame = pd.concat(chunks)
+        resample_seconds += time.perf_counter() - start
+        hourly.append(frame)
+    ctx["hourly"] = hourly
+    return {"ingestion": rows, "resampling": rows}, {"resampling": resample_seconds}
+
+def bench_features(ctx: dict):
+    ctx["features"] = add_features(ctx["hourly"][0])
+    return len(ctx["features"])
+
+def bench_order_search(ctx: dict):
+    series = ctx["hourly"][0][TARGET].ffill().iloc[-ctx["model_hours"]:]
+    grid_search_arima(series, p_values=[0, 1, 2], d_values=[0, 1], q_values=[0, 1], workers=ctx["workers"])
+    return len(series)
+
+def bench_forecasting(ctx: dict):
+    """
+    Fit and forecast the first meter, and forecast every meter at once when there are several.
+    """
+    series = ctx["hourly"][0][TARGET].ffill().iloc[-ctx["model_hours"]:]
+    model_fit, _ = fit_arima_with_metadata(series, order=(2, 0, 1))
+    model_fit.forecast(steps=24)
+    rows = len(series)
+    if len(ctx["hourly"]) > 1:
+        wide = pd.concat({f"meter_{i:03d}": h[TARGET].iloc[-ctx["model_hours"]:] for i, h in enumerate(ctx["hourly"])},
+                         axis=1)
+        forecast_many(wide, order=(2, 0, 1), horizon=24, workers=ctx["workers"])
+        rows += wide.size
+    return rows
+
+def bench_anomaly_detection(ctx: dict):
+    """
+    Streaming residual detection over the whole series and an Isolation Forest fit and
+    score, against a seasonal-naive forecast so the timing excludes model filtering.
+    """
+    actual = ctx["hourly"][0][TARGET]
+    forecast = actual.shift(24)
+    StreamingResidualDetector(threshold=3.0).update_batch(actual, forecast)
+    model = IsolationForestAnomalyModel(n_jobs=ctx["workers"] or -1).fit(actual, forecast)
+    model.score(actual, forecast)
+    return len(actual)
+
+def bench_dashboard_prep(ctx: dict):
+    """
+    What the dashboard computes: aggregates, a plot-sized series and a weekly decomposition.
+    """
+    hourly = ctx["hourly"][0]
+    pyramid = build_pyramid(hourly, MEASUREMENT_COLUMNS)
+    range_summary(pyramid, TARGET, hourly.index[0], hourly.index[-1])
+    downsample(hourly[TARGET], 1000)
+    DecompositionCache().decompose(hourly[TARGET].dropna(), periods=(24, 168))
+    return len(hourly)
+
+BENCHMARKS = [
+    ("ingestion", bench_ingest_and_resample),
+    ("features", bench_features),
+    ("order_search", bench_order_search),
+    ("forecasting", bench_forecasting),
+    ("anomaly_detection", bench_anomaly_detection),
+    ("dashboard_prep", bench_dashboard_prep),
+]
+
+def _measure(func, ctx: dict, trace_memory: bool):
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        outcome = func(ctx)
+        seconds = time.perf_counter() - start
+        traced = tracemalloc.get_traced_memory()[1] / 2 ** 20 if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    return outcome, seconds, traced
+
+def run_benchmarks(paths: list, repeat: int = 3, chunksize: int = 500_000, model_hours: int = 24 * 90,
+                   workers: int = None, trace_memory: bool = False):
+    """
+    Run every benchmark `repeat` times and keep the fastest time of each stage.
+    :param trace_memory: Also record the peak of traced allocations per stage (slower).
+    :return: Dict of stage name to seconds, rows, rows_per_s and memory figures.
+    """
+    ctx = {"paths": paths, "chunksize": chunksize, "model_hours": model_hours, "workers": workers}
+    results = {}
+    for name, func in BENCHMARKS:
+        for _ in range(repeat):
+            outcome, seconds, traced = _measure(func, ctx, trace_memory)
+            # A benchmark either returns its row count, or rows and times for several stages
+            rows, split = (outcome, {}) if isinstance(outcome, int) else outcome
+            stage_seconds = {name: seconds - sum(split.values()), **split} if split else {name: seconds}
+            row_counts = {name: rows} if isinstance(rows, int) else rows
+            for stage, elapsed in stage_seconds.items():
+                best = results.get(stage)
+                if best is None or elapsed < best["seconds"]:
+                    results[stage] = {
+                        "seconds": elapsed,
+                        "rows": row_counts[stage],
+                        "rows_per_s": row_counts[stage] / elapsed if elapsed > 0 else None,
+                        "peak_rss_mb": peak_rss_mb(),
+                        "traced_peak_mb": traced,
+                    }
+        logger.info(f"{name}: {results[name]['seconds']:.3f}s")
+    return results
+
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float = 0.2, min_seconds: float = 0.05):
+    """
+    Compare stage timings with a baseline. A stage regressed when it is more than
+    `tolerance` slower and the difference exceeds `min_seconds` (to ignore timer noise).
+    """
+    rows = []
+    for stage, result in results["stages"].items():
+        reference = baseline["stages"].get(stage)
+        base_seconds = reference["seconds"] if reference else np.nan
+        ratio = result["seconds"] / base_seconds if reference and base_seconds > 0 else np.nan
+        regression = bool(reference) and ratio > 1 + tolerance and result["seconds"] - base_seconds > min_seconds
+        rows.append({"stage": stage, "seconds": result["seconds"], "baseline_seconds": base_seconds,
+                     "ratio": ratio, "regression": regression})
+    return pd.DataFrame(rows, columns=["stage", "seconds", "baseline_seconds", "ratio", "regression"])
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline on synthetic UCI-format data.")
+    parser.add_argument("--scale", type=float, default=1.0, help="History length as a multiple of the UCI data.")
+    parser.add_argument("--meters", type=int, default=1, help="Number of households.")
+    parser.add_argument("--missing-rate", type=float, default=0.0125)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--chunksize", type=int, default=500_000)
+    parser.add_argument("--model-hours", type=int, default=24 * 90, help="Hours used by order search and forecasting.")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--trace-memory", action="store_true", help="Record per-stage peak traced allocations.")
+    parser.add_argument("--output", default=None, help="Results file (default: results/<timestamp>.json).")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before flagging a regression.")
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    # Benchmarks time the functions themselves, without their instrumentation
+    configure_instrumentation(enabled=False)
+    config = {key: getattr(args, key) for key in ("scale", "meters", "missing_rate", "seed", "repeat",
+                                                  "chunksize", "model_hours", "workers")}
+    data_dir = os.path.join(DATA_DIR, f"scale{args.scale:g}_seed{args.seed}_missing{args.missing_rate:g}")
+    logger.info(f"Generating synthetic data in {data_dir}...")
+    paths = write_meter_files(data_dir, meters=args.meters, scale=args.scale, seed=args.seed,
+                              missing_rate=args.missing_rate)
+
+    results = {
+        "created": pd.Timestamp.now().isoformat(),
+        "environment": environment(),
+        "config": config,
+        "stages": run_benchmarks(paths, repeat=args.repeat, chunksize=args.chunksize, model_hours=args.model_hours,
+                                 workers=args.workers, trace_memory=args.trace_memory),
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{pd.Timestamp.now():%Y%m%dT%H%M%S}.json")
+    write_json_atomic(output, results)
+    logger.info("Results:\n" + pd.DataFrame(results["stages"]).T.to_string())
+    logger.info(f"Results saved to {output}")
+
+    regressed = False
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["config"] != config:
+            logger.warning(f"Baseline was recorded with a different configuration: {baseline['config']}")
+        comparison = compare_to_baseline(results, baseline, tolerance=args.tolerance)
+        logger.info("Comparison with baseline:\n" + comparison.to_string(index=False))
+        regressed = bool(comparison["regression"].any())
+        if regressed:
+            logger.warning("Regressions: " + ", ".join(comparison.loc[comparison["regression"], "stage"]))
+    if args.save_baseline:
+        write_json_atomic(args.baseline, results)
+        logger.info(f"Baseline saved to {args.baseline}")
+    return 1 if regressed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+# benchmarks/synthetic_data.py
+import os
+import numpy as np
+import pandas as pd
+from data_preprocessing import RAW_COLUMNS, MEASUREMENT_COLUMNS
+
+# Span of the UCI household dataset; scale 1 reproduces its length
+UCI_START = pd.Timestamp("2006-12-16 17:24:00")
+UCI_MINUTES = 2_075_259
+# Minutes generated and written at a time, so memory stays bounded at large scales
+CHUNK_MINUTES = 500_000
+
+def _time_strings():
+    minutes = np.arange(24 * 60)
+    return np.array([f"{m // 60:02d}:{m % 60:02d}:00" for m in minutes], dtype=object)
+
+def _date_strings(index: pd.DatetimeIndex):
+    # Day-first without zero padding, as in the UCI export (e.g. 16/12/2006)
+    codes, days = pd.factorize(index.normalize())
+    labels = np.array([f"{d.day}/{d.month}/{d.year}" for d in days], dtype=object)
+    return labels[codes]
+
+def synthetic_minutes(index: pd.DatetimeIndex, rng: np.random.Generator):
+    """
+    Minute-level readings with daily, weekly and yearly seasonality for one household.
+    """
+    hours = index.hour.to_numpy() + index.minute.to_numpy() / 60
+    daily = 0.35 + 1.1 * np.exp(-((hours - 8) ** 2) / 3) + 1.6 * np.exp(-((hours - 20) ** 2) / 5)
+    weekly = np.where(index.dayofweek.to_numpy() >= 5, 1.2, 1.0)
+    yearly = 1 + 0.35 * np.cos(2 * np.pi * (index.dayofyear.to_numpy() - 15) / 365.25)
+    power = daily * weekly * yearly * rng.gamma(4.0, 0.25, len(index))
+    voltage = 240 + 2.5 * np.sin(2 * np.pi * hours / 24) + rng.normal(0, 1.5, len(index))
+    return pd.DataFrame({
+        'Global_active_power': power,
+        'Global_reactive_power': 0.05 + 0.15 * rng.random(len(index)),
+        'Voltage': voltage,
+        'Global_intensity': power * 1000 / voltage,
+        'Sub_metering_1': np.round(np.where(rng.random(len(index)) < 0.05, 35 * rng.random(len(index)), 0)),
+        'Sub_metering_2': np.round(np.where(rng.random(len(index)) < 0.1, 20 * rng.random(len(index)), 0)),
+        'Sub_metering_3': np.round(np.minimum(power * 1000 / 60 * 0.4, 20)),
+    }, index=index)
+
+def _missing_mask(minutes: int, rng: np.random.Generator, missing_rate: float):
+    """
+    Scattered missing minutes plus a few outages of one hour to two days.
+    """
+    mask = rng.random(minutes) < missing_rate
+    if missing_rate > 0:
+        for start in rng.integers(0, minutes, max(1, minutes // CHUNK_MINUTES)):
+            mask[start:start + rng.integers(60, 2 * 24 * 60)] = True
+    return mask
+
+def write_uci_file(path: str, scale: float = 1.0, minutes: int = None, seed: int = 0, missing_rate: float = 0.0125,
+                   start: pd.Timestamp = UCI_START):
+    """
+    Write synthetic minute-level data in the UCI household_power_consumption.txt layout,
+    with '?' for missing readings.
+    :param scale: Length as a multiple of the UCI history (1, 10, 100, ...).
+    :param minutes: Exact number of rows instead of a scale.
+    :param missing_rate: Fraction of minutes missing at random; outages are added on top.
+    :return: The path and the number of rows written.
+    """
+    minutes = minutes if minutes is not None else int(UCI_MINUTES * scale)
+    rng = np.random.default_rng(seed)
+    missing = _missing_mask(minutes, rng, missing_rate)
+    times = _time_strings()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        f.write(";".join(RAW_COLUMNS) + "\n")
+        for offset in range(0, minutes, CHUNK_MINUTES):
+            index = pd.date_range(start + pd.Timedelta(minutes=offset), periods=min(CHUNK_MINUTES, minutes - offset),
+                                  freq="min")
+            # Rounded like the UCI export; writing rounded values without a float format is much faster
+            values = synthetic_minutes(index, rng).round(3)
+            values[missing[offset:offset + len(index)]] = np.nan
+            values.insert(0, 'Time', times[index.hour * 60 + index.minute])
+            values.insert(0, 'Date', _date_strings(index))
+            values[['Date', 'Time'] + MEASUREMENT_COLUMNS].to_csv(f, sep=';', header=False, index=False, na_rep='?')
+    os.replace(path + ".tmp", path)
+    return path, minutes
+
+def write_meter_files(directory: str, meters: int = 1, scale: float = 1.0, minutes: int = None, seed: int = 0,
+                      missing_rate: float = 0.0125):
+    """
+    Write one UCI-format file per meter, each with its own random variation. Existing
+    files are reused.
+    :return: List of file paths.
+    """
+    paths = []
+    for meter in range(meters):
+        path = os.path.join(directory, f"meter_{meter:03d}.txt")
+        if not os.path.exists(path):
+            write_uci_file(path, scale=scale, minutes=minutes, seed=seed + meter, missing_rate=missing_rate)
+        paths.append(path)
+    return paths
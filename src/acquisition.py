@@ -0,0 +1,423 @@
+# src/acquisition.py
+import io
+import os
+import time
+import zlib
+import struct
+import shutil
+import hashlib
+import logging
+import zipfile
+import itertools
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+import requests
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1 << 20
+# Bytes read from a connection at a time; a dropped connection loses at most one of these
+NETWORK_CHUNK_SIZE = 1 << 16
+# Seconds to wait for a connection or for the next bytes of a response
+TIMEOUT = 30
+# Reconnections per source after a dropped connection; each resumes where the last stopped
+RETRIES = 3
+# Directories or base URLs (separated by os.pathsep) tried before the original URL
+MIRROR_ENV = "ENERGY_DATA_MIRROR"
+
+ZIP_LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+ZIP_LOCAL_SIGNATURE = 0x04034b50
+ZIP_DESCRIPTOR_SIGNATURE = 0x08074b50
+
+class DownloadError(IOError):
+    """
+    A source could not be fetched completely, or did not match the expected size or hash.
+    """
+
+class IncompleteDownload(DownloadError):
+    """
+    A response ended before the size it announced; the bytes received so far are kept.
+    """
+
+# Worth reconnecting and resuming after these
+TRANSIENT_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                    IncompleteDownload)
+
+def default_mirrors():
+    return [mirror for mirror in os.environ.get(MIRROR_ENV, "").split(os.pathsep) if mirror]
+
+def _local_path(source: str):
+    """
+    The file system path of a file:// URL or plain path, or None for remote URLs.
+    """
+    parsed = urlparse(source)
+    if parsed.scheme == "file":
+        return url2pathname(parsed.path)
+    if len(parsed.scheme) <= 1:  # no scheme, or a Windows drive letter
+        return source
+    return None
+
+def candidate_sources(url: str, mirrors=()):
+    """
+    Where to look for the file at `url`: a file of the same name in every mirror, then `url`.
+    """
+    name = os.path.basename(urlparse(url).path)
+    sources = [f"{mirror.rstrip('/')}/{name}" if "://" in mirror else os.path.join(mirror, name)
+               for mirror in mirrors]
+    return sources + [url]
+
+def _range_total(content_range: str):
+    # "bytes 100-199/1000" or "bytes */1000"
+    total = (content_range or "").rpartition("/")[2]
+    return int(total) if total.isdigit() else None
+
+def _iter_file(f):
+    with f:
+        yield from iter(lambda: f.read(CHUNK_SIZE), b"")
+
+def _iter_response(response: requests.Response):
+    with response:
+        yield from response.iter_content(NETWORK_CHUNK_SIZE)
+
+def _open_source(source: str, offset: int, timeout: float):
+    """
+    Open a source at a byte offset.
+    :return: Iterator of byte chunks, the total size if known, and the offset the chunks
+             actually start at (0 when a server ignores the Range header).
+    """
+    path = _local_path(source)
+    if path is not None:
+        f = open(path, "rb")
+        total = os.fstat(f.fileno()).st_size
+        if offset > total:
+            f.close()
+            raise DownloadError(f"{source} is smaller than the {offset} bytes already received")
+        f.seek(offset)
+        return _iter_file(f), total, offset
+
+    # Ranges refer to the stored bytes, so ask for them without transfer encoding
+    headers = {"Accept-Encoding": "identity"}
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+    response = requests.get(source, headers=headers, stream=True, timeout=timeout)
+    if response.status_code == 416:
+        response.close()
+        total = _range_total(response.headers.get("Content-Range"))
+        if total != offset:
+            raise DownloadError(f"{source} has {total} bytes, but {offset} were already received")
+        return iter(()), total, offset
+    if not response.ok:
+        response.close()
+        response.raise_for_status()
+    if response.status_code == 206:
+        return _iter_response(response), _range_total(response.headers.get("Content-Range")), offset
+    length = response.headers.get("Content-Length")
+    return _iter_response(response), int(length) if length else None, 0
+
+def _source_size(source: str, timeout: float = TIMEOUT):
+    """
+    The size a source reports (its file size, or the Content-Length of a HEAD request),
+    or None if it cannot be reached or does not say.
+    """
+    path = _local_path(source)
+    try:
+        if path is not None:
+            return os.path.getsize(path)
+        response = requests.head(source, headers={"Accept-Encoding": "identity"}, allow_redirects=True,
+                                 timeout=timeout)
+    except (OSError, requests.RequestException):
+        return None
+    length = response.headers.get("Content-Length")
+    return int(length) if response.ok and length and length.isdigit() else None
+
+def _resumable_chunks(source: str, offset: int = 0, timeout: float = TIMEOUT, retries: int = RETRIES,
+                      info: dict = None):
+    """
+    Yield the bytes of a source from `offset` on. After a dropped connection the source is
+    reopened with a Range request at the first missing byte, up to `retries` times.
+    :param info: Receives the total size of the source under 'total', if it is known.
+    """
+    failures = 0
+    while True:
+        try:
+            chunks, total, start = _open_source(source, offset, timeout)
+            if info is not None:
+                info["total"] = total
+            for chunk in chunks:
+                # A server without Range support sends everything again
+                skip = min(offset - start, len(chunk))
+                start += len(chunk)
+                if len(chunk) > skip:
+                    offset += len(chunk) - skip
+                    yield chunk[skip:]
+            if total is not None and offset < total:
+                raise IncompleteDownload(f"{source} ended after {offset} of {total} bytes")
+            return
+        except TRANSIENT_ERRORS as e:
+            failures += 1
+            if failures > retries:
+                raise IncompleteDownload(f"Giving up on {source} after {retries} retries: {e}") from e
+            logger.warning(f"Download of {source} interrupted ({e}); resuming at byte {offset}...")
+            time.sleep(min(2 ** (failures - 1), 30) * 0.1)
+
+def file_sha256(path: str):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _verify(path: str, size: int = None, sha256: str = None):
+    """
+    Check a downloaded file against the expected size and hash, deleting it if it is wrong.
+    """
+    actual = os.path.getsize(path)
+    if size is not None and actual < size:
+        raise IncompleteDownload(f"{path} has {actual} of {size} bytes")
+    problem = None
+    if size is not None and actual != size:
+        problem = f"{actual} bytes instead of {size}"
+    elif sha256 is not None and file_sha256(path) != sha256.lower():
+        problem = "SHA-256 mismatch"
+    if problem is not None:
+        os.remove(path)
+        raise DownloadError(f"{path}: {problem}")
+
+def _fetch(url: str, dest: str, sha256: str = None, size: int = None, mirrors=(), timeout: float = TIMEOUT,
+           retries: int = RETRIES):
+    """
+    Stream a file from the first source that has it into `dest + '.part'`, resuming any
+    partial file left by an earlier attempt, and rename it to `dest` once verified.
+    """
+    part = dest + ".part"
+    errors = []
+    for source in candidate_sources(url, mirrors):
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        if offset:
+            logger.info(f"Resuming {source} at byte {offset}...")
+        info = {}
+        try:
+            with open(part, "ab") as f:
+                for chunk in _resumable_chunks(source, offset, timeout, retries, info):
+                    f.write(chunk)
+            # The hash guards against resuming from a different copy than the partial file
+            _verify(part, size if size is not None else info.get("total"), sha256)
+        except (OSError, requests.RequestException) as e:
+            logger.warning(f"Could not fetch {source}: {e}")
+            if isinstance(e, DownloadError) and not isinstance(e, IncompleteDownload) and os.path.exists(part):
+                os.remove(part)  # does not match this source, so it cannot be resumed
+            errors.append(f"{source}: {e}")
+            continue
+        os.replace(part, dest)
+        logger.info(f"Fetched {source} ({os.path.getsize(dest)} bytes).")
+        return dest
+    raise DownloadError(f"Could not download {url}:\n" + "\n".join(errors))
+
+def _extract_first_member(archive: str, dest: str):
+    with zipfile.ZipFile(archive) as zf, zf.open(zf.infolist()[0]) as member, open(dest + ".part", "wb") as f:
+        for block in iter(lambda: member.read(CHUNK_SIZE), b""):
+            f.write(block)
+    os.replace(dest + ".part", dest)
+
+def _refetch_existing(url: str, dest: str, sha256: str = None, size: int = None, mirrors=(),
+                      timeout: float = TIMEOUT):
+    """
+    Decide whether an existing `dest` that does not match `sha256` is fetched again. Only
+    `sha256` or `size` can show that it is a truncated or corrupt copy of the source; a
+    shorter one is then resumed from a copy in `dest + '.part'`, and `dest` is replaced
+    only once the new file is verified. A file longer than expected (e.g. with appended
+    rows), or one without an expected size or hash, is kept.
+    :return: Whether `dest` has to be fetched.
+    """
+    if sha256 is None and size is None:
+        logger.info(f"{dest} already exists.")
+        return False
+    expected = size
+    if expected is None:
+        reported = (_source_size(source, timeout) for source in candidate_sources(url, mirrors))
+        expected = next((total for total in reported if total is not None), None)
+    actual = os.path.getsize(dest)
+    if expected is not None and actual > expected:
+        logger.warning(f"{dest} has {actual} bytes, more than the {expected} expected; keeping it.")
+        return False
+    if sha256 is None and actual == expected:
+        logger.info(f"{dest} already exists.")
+        return False
+    part = dest + ".part"
+    if expected is not None and actual < expected:
+        logger.warning(f"{dest} has {actual} of {expected} bytes; resuming the download.")
+        if not os.path.exists(part) or os.path.getsize(part) < actual:
+            shutil.copyfile(dest, part)
+    else:
+        logger.warning(f"{dest} does not match the expected SHA-256; downloading it again.")
+    return True
+
+def download(url: str, dest: str, sha256: str = None, size: int = None, mirrors=(), timeout: float = TIMEOUT,
+             retries: int = RETRIES):
+    """
+    Download a file unless a complete copy already exists at `dest`. Data is streamed to
+    `dest + '.part'` in chunks and renamed into place only once complete and verified; an
+    interrupted download is resumed with Range requests, also on the next call. An
+    existing `dest` is checked against `sha256` and `size`, resumed if it is a truncated
+    copy and otherwise never deleted or overwritten unless a new copy verifies. A
+    `.zip` URL is downloaded as such next to `dest` and its first member extracted to
+    `dest`; an extracted file is not checked, as both values refer to the archive.
+    :param sha256: Expected SHA-256 of the file at `url`, if known.
+    :param size: Expected size in bytes of the file at `url`; by default the size the
+                 source reports.
+    :param mirrors: Directories, file:// URLs or base URLs holding a file of the same name,
+                    tried in order before `url`. `url` itself may also be a file:// URL.
+    :return: `dest`
+    """
+    os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+    zipped = urlparse(url).path.lower().endswith(".zip") and not dest.lower().endswith(".zip")
+    if os.path.exists(dest):
+        if zipped or (sha256 is not None and file_sha256(dest) == sha256.lower()):
+            logger.info(f"{dest} already exists.")
+            return dest
+        if not _refetch_existing(url, dest, sha256, size, mirrors, timeout):
+            return dest
+
+    if not zipped:
+        return _fetch(url, dest, sha256, size, mirrors, timeout, retries)
+    archive = os.path.join(os.path.dirname(dest), os.path.basename(urlparse(url).path))
+    _fetch(url, archive, sha256, size, mirrors, timeout, retries)
+    logger.info(f"Extracting {archive}...")
+    _extract_first_member(archive, dest)
+    os.remove(archive)
+    return dest
+
+def iter_unzipped(chunks):
+    """
+    Decompress the first member of a zip archive from an iterator of byte chunks, while
+    they arrive. Zip files are usually read from the central directory at their end; this
+    reads the member's local header instead. Stored and deflated members are supported.
+    """
+    chunks = iter(chunks)
+    buffer = b""
+    try:
+        while len(buffer) < ZIP_LOCAL_HEADER.size:
+            buffer += next(chunks)
+        signature, _, flags, method, _, _, crc, compressed, _, name_length, extra_length = \
+            ZIP_LOCAL_HEADER.unpack_from(buffer)
+        if signature != ZIP_LOCAL_SIGNATURE:
+            raise DownloadError("Not a zip archive")
+        data_start = ZIP_LOCAL_HEADER.size + name_length + extra_length
+        while len(buffer) < data_start:
+            buffer += next(chunks)
+    except StopIteration:
+        raise DownloadError("Truncated zip archive")
+    has_descriptor = bool(flags & 0x08)
+    if method == zipfile.ZIP_DEFLATED:
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+    elif method == zipfile.ZIP_STORED and not has_descriptor:
+        remaining = compressed
+    else:
+        raise DownloadError(f"Unsupported zip member (compression method {method}, flags {flags:#x})")
+
+    checksum = 0
+    ended = method == zipfile.ZIP_STORED and remaining == 0
+    pieces = itertools.chain([buffer[data_start:]], chunks)
+    while not ended:
+        piece = next(pieces, None)
+        if piece is None:
+            raise DownloadError("Truncated zip archive")
+        if method == zipfile.ZIP_DEFLATED:
+            out = decompressor.decompress(piece)
+            ended = decompressor.eof
+        else:
+            out = piece[:remaining]
+            remaining -= len(out)
+            ended = remaining == 0
+        if out:
+            checksum = zlib.crc32(out, checksum)
+            yield out
+
+    if has_descriptor:
+        # The CRC follows the data, optionally preceded by a signature
+        tail = decompressor.unused_data
+        while len(tail) < 8:
+            piece = next(pieces, None)
+            if piece is None:
+                break
+            tail += piece
+        if len(tail) >= 4 and struct.unpack_from("<I", tail)[0] == ZIP_DESCRIPTOR_SIGNATURE:
+            tail = tail[4:]
+        if len(tail) < 4:
+            raise DownloadError("Truncated zip archive")
+        crc = struct.unpack_from("<I", tail)[0]
+    if checksum != crc:
+        raise DownloadError("CRC mismatch in zip member")
+
+def _tee(chunks, path: str):
+    """
+    Pass chunks through while writing them to `path`, which appears once all were read.
+    """
+    part = path + ".part"
+    complete = False
+    try:
+        with open(part, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                yield chunk
+        os.replace(part, path)
+        complete = True
+    finally:
+        if not complete and os.path.exists(part):
+            os.remove(part)
+
+class _ChunkReader(io.RawIOBase):
+    """
+    Read-only file object over an iterator of byte chunks.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.pending = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self.pending:
+            self.pending = next(self.chunks, None)
+            if self.pending is None:
+                self.pending = b""
+                return 0
+        size = min(len(b), len(self.pending))
+        b[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+    def close(self):
+        if not self.closed and hasattr(self.chunks, "close"):
+            self.chunks.close()
+        super().close()
+
+def open_stream(url: str, mirrors=(), save_to: str = None, timeout: float = TIMEOUT, retries: int = RETRIES):
+    """
+    Open a file as a binary stream that returns bytes as they arrive, so parsing can start
+    before the download has finished (e.g. pass it to data_preprocessing.iter_hourly_chunks).
+    Dropped connections are resumed with Range requests and `.zip` files are decompressed
+    on the fly.
+    :param mirrors: As for download.
+    :param save_to: Also write the (decompressed) bytes to this path; it appears once the
+                    stream has been read to the end.
+    """
+    errors = []
+    for source in candidate_sources(url, mirrors):
+        chunks = _resumable_chunks(source, 0, timeout, retries)
+        try:
+            first = next(chunks, b"")
+        except (OSError, requests.RequestException) as e:
+            logger.warning(f"Could not open {source}: {e}")
+            errors.append(f"{source}: {e}")
+            continue
+        chunks = itertools.chain([first], chunks)
+        if urlparse(url).path.lower().endswith(".zip"):
+            chunks = iter_unzipped(chunks)
+        if save_to is not None:
+            os.makedirs(os.path.dirname(save_to) or ".", exist_ok=True)
+            chunks = _tee(chunks, save_to)
+        return io.BufferedReader(_ChunkReader(chunks), buffer_size=CHUNK_SIZE)
+    raise DownloadError(f"Could not open {url}:\n" + "\n".join(errors))
@@ -0,0 +1,208 @@
+# src/aggregates.py
+import os
+import numpy as np
+import pandas as pd
+from storage import save_frame, load_frame, append_frame
+
+# Pyramid levels from finest to coarsest; coarser levels are built from the daily one.
+# Weeks start on Monday and every bucket is labelled with its start. The hourly level,
+# which grows with every update, is stored partitioned by month.
+LEVELS = {
+    'hourly': 'H',
+    'daily': 'D',
+    'weekly': 'W-MON',
+    'monthly': 'MS',
+}
+
+def _hourly_level(df: pd.DataFrame, columns: list, offsets: dict = None):
+    """
+    Hourly values with prefix sums and counts of the non-missing values, so the sum, count
+    and mean over any range of hours take O(1).
+    """
+    level = {}
+    for col in columns:
+        values = df[col].to_numpy(dtype='float64')
+        valid = ~np.isnan(values)
+        sum_offset, count_offset = (offsets or {}).get(col, (0.0, 0))
+        level[col] = values
+        level[f'{col}_cumsum'] = sum_offset + np.cumsum(np.where(valid, values, 0.0))
+        level[f'{col}_cumcount'] = count_offset + np.cumsum(valid)
+    return pd.DataFrame(level, index=df.index)
+
+def _aggregate(df: pd.DataFrame, columns: list, freq: str):
+    """
+    Aggregate hourly values into buckets of the given frequency.
+    """
+    # Sums of compact float32 columns are accumulated in float64
+    resampler = df[columns].astype('float64').resample(freq, label='left', closed='left')
+    sums, counts, mins, maxs = resampler.sum(), resampler.count(), resampler.min(), resampler.max()
+    return _combine(sums, counts, mins, maxs, columns)
+
+def _combine(sums, counts, mins, maxs, columns):
+    level = {}
+    for col in columns:
+        level[f'{col}_mean'] = sums[col] / counts[col].where(counts[col] > 0)
+        level[f'{col}_min'] = mins[col]
+        level[f'{col}_max'] = maxs[col]
+        level[f'{col}_sum'] = sums[col]
+        level[f'{col}_count'] = counts[col]
+    return pd.DataFrame(level)
+
+def _rollup(daily: pd.DataFrame, columns: list, freq: str):
+    """
+    Build a coarser level from the daily one (sums of sums, minimum of minima, ...).
+    """
+    resampler = daily.resample(freq, label='left', closed='left')
+    sums = resampler[[f'{c}_sum' for c in columns]].sum().set_axis(columns, axis=1)
+    counts = resampler[[f'{c}_count' for c in columns]].sum().set_axis(columns, axis=1)
+    mins = resampler[[f'{c}_min' for c in columns]].min().set_axis(columns, axis=1)
+    maxs = resampler[[f'{c}_max' for c in columns]].max().set_axis(columns, axis=1)
+    return _combine(sums, counts, mins, maxs, columns)
+
+def build_pyramid(df: pd.DataFrame, columns: list, offsets: dict = None):
+    """
+    Build the hourly, daily, weekly and monthly aggregate levels of an hourly frame.
+    :param df: Hourly DataFrame with datetime index.
+    :param columns: Columns to aggregate.
+    :param offsets: Prefix-sum values (sum, count) preceding df, per column, when df is the
+                    tail of a longer series.
+    :return: Dict of level name to DataFrame.
+    """
+    daily = _aggregate(df, columns, LEVELS['daily'])
+    return {
+        'hourly': _hourly_level(df, columns, offsets),
+        'daily': daily,
+        'weekly': _rollup(daily, columns, LEVELS['weekly']),
+        'monthly': _rollup(daily, columns, LEVELS['monthly']),
+    }
+
+def save_pyramid(pyramid: dict, directory: str):
+    os.makedirs(directory, exist_ok=True)
+    for name, level in pyramid.items():
+        save_frame(level, os.path.join(directory, f'{name}.parquet'), partitioned=name == 'hourly')
+
+def load_pyramid(directory: str, levels: list = None):
+    """
+    Load the stored levels, or None if no pyramid has been built. Levels keep their
+    float64 columns, since differences of prefix sums need the full precision.
+    """
+    if not os.path.exists(os.path.join(directory, 'hourly.parquet')):
+        return None
+    return {name: load_frame(os.path.join(directory, f'{name}.parquet'), full_precision=True)
+            for name in (levels or LEVELS)}
+
+def update_pyramid(directory: str, new_df: pd.DataFrame, columns: list):
+    """
+    Fold new hourly rows into a stored pyramid. Only the buckets from the start of the
+    week or month containing the first new row onwards are recomputed, and of the hourly
+    level only those hours (and the month partitions holding them) are read and rewritten.
+    :return: Dict of level name to the rewritten rows of that level.
+    """
+    first = new_df.index[0]
+    # First bucket of every level that the new rows touch
+    cuts = {
+        'hourly': first,
+        'daily': first.floor('D'),
+        'weekly': first.to_period('W-SUN').start_time,
+        'monthly': first.to_period('M').start_time,
+    }
+    recompute_from = min(cuts.values())
+
+    hourly_path = os.path.join(directory, 'hourly.parquet')
+    # The hour before the recomputed span holds the prefix sums to continue from
+    stored_hourly = load_frame(hourly_path, start=recompute_from - pd.Timedelta(hours=1),
+                               end=first - pd.Timedelta(hours=1), full_precision=True)
+    hourly = pd.concat([stored_hourly.loc[recompute_from:, columns], new_df[columns]])
+    before = stored_hourly.loc[:recompute_from - pd.Timedelta(hours=1)]
+    offsets = {col: (before[f'{col}_cumsum'].iloc[-1], before[f'{col}_cumcount'].iloc[-1]) if len(before) else (0.0, 0)
+               for col in columns}
+    tail = build_pyramid(hourly, columns, offsets)
+
+    pyramid = {'hourly': append_frame(tail['hourly'].loc[first:], hourly_path)}
+    for name, level in tail.items():
+        if name == 'hourly':
+            continue
+        path = os.path.join(directory, f'{name}.parquet')
+        stored = load_frame(path, full_precision=True)
+        combined = pd.concat([stored[stored.index < cuts[name]], level[level.index >= cuts[name]]])
+        save_frame(combined.asfreq(LEVELS[name]), path)
+        pyramid[name] = level[level.index >= cuts[name]]
+    return pyramid
+
+def choose_level(start, end, points: int = 1000):
+    """
+    Pick the coarsest level that still has at least `points` buckets over the span (or the
+    hourly level for short spans), so wide ranges are answered from a coarser level instead
+    of raw hourly rows without dropping below the resolution the plot can show.
+    """
+    span = pd.Timestamp(end) - pd.Timestamp(start)
+    bucket_lengths = {'monthly': pd.Timedelta(days=31), 'weekly': pd.Timedelta(weeks=1),
+                      'daily': pd.Timedelta(days=1)}
+    for name, length in bucket_lengths.items():
+        if span / length >= points:
+            return name
+    return 'hourly'
+
+def range_series(pyramid: dict, column: str, start, end, points: int = 1000, stat: str = 'mean'):
+    """
+    The series of a column over a range at the level chosen by choose_level; downsample
+    it to the number of points to plot.
+    :return: The series and the name of the level it came from.
+    """
+    name = choose_level(start, end, points)
+    level = pyramid[name].loc[start:end]
+    return level[column if name == 'hourly' else f'{column}_{stat}'], name
+
+def _hour_positions(hourly: pd.DataFrame, start, end):
+    index = hourly.index
+    i = index.searchsorted(pd.Timestamp(start), side='left')
+    j = index.searchsorted(pd.Timestamp(end), side='right')
+    return i, j
+
+def range_summary(pyramid: dict, column: str, start, end):
+    """
+    Mean, sum, count, min and max of a column over [start, end]. Sum, count and mean come
+    from the hourly prefix sums in O(1); min and max combine complete days from the daily
+    level with the hours at either edge.
+    """
+    hourly = pyramid['hourly']
+    i, j = _hour_positions(hourly, start, end)
+    if i >= j:
+        return {'mean': np.nan, 'sum': 0.0, 'count': 0, 'min': np.nan, 'max': np.nan}
+    cumsum = hourly[f'{column}_cumsum'].to_numpy()
+    cumcount = hourly[f'{column}_cumcount'].to_numpy()
+    total = cumsum[j - 1] - (cumsum[i - 1] if i > 0 else 0.0)
+    count = int(cumcount[j - 1] - (cumcount[i - 1] if i > 0 else 0))
+
+    first, last = hourly.index[i], hourly.index[j - 1]
+    day_start = first.ceil('D')
+    day_end = (last + pd.Timedelta(hours=1)).floor('D')
+    if day_start < day_end:
+        days = pyramid['daily'].loc[day_start:day_end - pd.Timedelta(days=1)]
+        edges = pd.concat([hourly[column].iloc[i:hourly.index.searchsorted(day_start)],
+                           hourly[column].iloc[hourly.index.searchsorted(day_end):j]])
+        low = np.nanmin(np.append(days[f'{column}_min'].to_numpy(), edges.to_numpy()))
+        high = np.nanmax(np.append(days[f'{column}_max'].to_numpy(), edges.to_numpy()))
+    else:
+        values = hourly[column].iloc[i:j]
+        low, high = values.min(), values.max()
+    return {'mean': total / count if count else np.nan, 'sum': total, 'count': count, 'min': low, 'max': high}
+
+def rolling_mean(pyramid: dict, column: str, window: int, start, end):
+    """
+    Trailing rolling mean of the hourly values over [start, end] from the prefix sums, in O(1)
+    per point. Like pandas' rolling mean, a window with a missing hour gives NaN.
+    """
+    hourly = pyramid['hourly']
+    i, j = _hour_positions(hourly, start, end)
+    cumsum = np.concatenate(([0.0], hourly[f'{column}_cumsum'].to_numpy()))
+    cumcount = np.concatenate(([0], hourly[f'{column}_cumcount'].to_numpy()))
+    # After the leading zero, position p holds the prefix sums of hours [0, p)
+    ends = np.arange(i, j) + 1
+    starts = ends - window
+    result = np.full(len(ends), np.nan)
+    ok = starts >= 0
+    sums = cumsum[ends[ok]] - cumsum[starts[ok]]
+    counts = cumcount[ends[ok]] - cumcount[starts[ok]]
+    result[ok] = np.where(counts == window, sums / window, np.nan)
+    return pd.Series(result, index=hourly.index[i:j], name=column)
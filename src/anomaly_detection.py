@@ -1,31 +1,46 @@
 # src/anomaly_detection.py
+import logging
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
+from scipy.signal import lfilter
 from sklearn.ensemble import IsolationForest
+from storage import load_frame, resolve_dataset
+from model_store import save_model, load_model
+from utils import timed
+from logging_config import configure_logging
+
+logger = logging.getLogger(__name__)
 
 def load_actual_and_forecast(actual_file: str, forecast_file: str):
     """
-    Load actual data and forecast data from CSV files.
+    Load actual data and forecast data from Parquet (or CSV) files.
+    Only the forecast span of the actual data is read.
     """
-    actual = pd.read_csv(actual_file, index_col='Datetime', parse_dates=True)['Global_active_power']
-    forecast = pd.read_csv(forecast_file, index_col='Datetime', parse_dates=True)['Global_active_power']
+    forecast = load_frame(forecast_file, columns=['Global_active_power'])['Global_active_power']
+    actual = load_frame(actual_file, columns=['Global_active_power'],
+                        start=forecast.index[0], end=forecast.index[-1])['Global_active_power']
     
     # Align the actual data with forecast index
     actual = actual[forecast.index]
     return actual, forecast
 
 
-def detect_anomalies_residual(actual: pd.Series, forecast: pd.Series, threshold: float = 3.0):
+@timed()
+def detect_anomalies_residual(actual: pd.Series, forecast: pd.Series, threshold: float = 3.0, resid_std: float = None):
     """
     Detect anomalies where the residual (actual - forecast) exceeds a threshold multiplier.
+    :param resid_std: Reference residual standard deviation, e.g. from the model's training
+                      span; defaults to the standard deviation over the given span.
     """
     residual = actual - forecast
-    resid_std = residual.std()
+    if resid_std is None:
+        resid_std = residual.std()
     anomaly_mask = np.abs(residual) > threshold * resid_std
     anomalies = residual[anomaly_mask]
     return anomalies
 
+@timed()
 def detect_anomalies_isolation_forest(actual: pd.Series, forecast: pd.Series, contamination: float = 0.01):
     """
     Detect anomalies using Isolation Forest on the residuals.
@@ -37,6 +52,239 @@ def detect_anomalies_isolation_forest(actual: pd.Series, forecast: pd.Series, co
     anomalies = residual[anomaly_flags == -1]
     return anomalies
 
+def residual_features(actual: pd.Series, forecast: pd.Series, window: int = 24):
+    """
+    Build the feature vector used by IsolationForestAnomalyModel: the residual, calendar
+    fields and trailing rolling statistics of the residual. Readings without a residual
+    are dropped.
+    """
+    residual = actual - forecast
+    rolling = residual.rolling(window, min_periods=1)
+    features = pd.DataFrame({
+        'residual': residual,
+        'hour': actual.index.hour,
+        'day_of_week': actual.index.dayofweek,
+        'residual_rolling_mean': rolling.mean(),
+        'residual_rolling_std': rolling.std().fillna(0.0),
+    }, index=actual.index)
+    return features[residual.notna()]
+
+class IsolationForestAnomalyModel:
+    """
+    Isolation Forest fitted once on a reference window of residual features and then used
+    to score new readings in batches. It is retrained on a sliding window on a schedule.
+    """
+
+    def __init__(self, contamination: float = 0.01, window: int = 24 * 90, retrain_every: pd.Timedelta = pd.Timedelta(days=7),
+                 rolling_window: int = 24, n_jobs: int = -1, random_state: int = 42):
+        """
+        :param window: Number of most recent readings in the reference window.
+        :param retrain_every: Retrain once the data extends this far past the reference window.
+        :param rolling_window: Window of the rolling residual statistics.
+        :param n_jobs: Parallel jobs for fitting and scoring (-1 uses all cores).
+        """
+        self.contamination = contamination
+        self.window = window
+        self.retrain_every = retrain_every
+        self.rolling_window = rolling_window
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.forest = None
+        self.trained_until = None
+
+    @timed()
+    def fit(self, actual: pd.Series, forecast: pd.Series):
+        """
+        Fit on the last `window` readings of the given span.
+        """
+        features = residual_features(actual, forecast, self.rolling_window).iloc[-self.window:]
+        self.forest = IsolationForest(contamination=self.contamination, random_state=self.random_state, n_jobs=self.n_jobs)
+        self.forest.fit(features)
+        self.trained_until = features.index[-1]
+        return self
+
+    def score_features(self, features: pd.DataFrame):
+        """
+        Score precomputed features (e.g. those of many meters concatenated) in one call.
+        :return: DataFrame with the anomaly score (lower is more anomalous) and is_anomaly.
+        """
+        # IsolationForest.predict flags negative decision values; reuse them instead of
+        # walking the trees a second time
+        scores = self.forest.decision_function(features)
+        return pd.DataFrame({'score': scores, 'is_anomaly': scores < 0}, index=features.index)
+
+    @timed()
+    def score(self, actual: pd.Series, forecast: pd.Series, start=None):
+        """
+        Score readings. Pass a little history before `start` so the rolling statistics of
+        the first scored readings are complete; only readings from `start` on are returned.
+        """
+        features = residual_features(actual, forecast, self.rolling_window)
+        return self.score_features(features.loc[start:])
+
+    def needs_retrain(self, latest: pd.Timestamp):
+        return self.forest is None or pd.Timestamp(latest) - self.trained_until >= self.retrain_every
+
+    def maybe_retrain(self, actual: pd.Series, forecast: pd.Series):
+        """
+        Retrain on the sliding window ending at the latest reading if the schedule says so.
+        Returns True if the model was retrained.
+        """
+        if not self.needs_retrain(actual.index[-1]):
+            return False
+        self.fit(actual, forecast)
+        return True
+
+    def save(self, store_dir: str, name: str):
+        save_model(self, store_dir, name, {
+            'kind': 'isolation_forest',
+            'trained_until': self.trained_until.isoformat(),
+            'window': self.window,
+            'contamination': self.contamination,
+        })
+
+    @classmethod
+    def load(cls, store_dir: str, name: str):
+        """
+        Load a stored model, or return None if there is none.
+        """
+        return load_model(store_dir, name)[0]
+
+class StreamingResidualDetector:
+    """
+    Flag anomalous readings one at a time against running statistics of the residual
+    (actual - forecast). Each reading is compared with the residuals seen before it, so a
+    flag never depends on later data. Updates take O(1) time and memory per reading.
+
+    With `halflife=None` the statistics cover all residuals seen so far; otherwise they are
+    exponentially weighted with the given half-life (in readings). With `by_hour=True`
+    separate statistics are kept for every hour of the day.
+    """
+
+    def __init__(self, threshold: float = 3.0, min_periods: int = 24, by_hour: bool = False, halflife: float = None):
+        self.threshold = threshold
+        self.min_periods = min_periods
+        self.by_hour = by_hour
+        self.alpha = None if halflife is None else 1 - np.exp(np.log(0.5) / halflife)
+        n_groups = 24 if by_hour else 1
+        self.count = np.zeros(n_groups, dtype='int64')
+        # Expanding statistics are kept as sums of residuals shifted by the group's first
+        # residual, which keeps the variance numerically stable; EW statistics use mean/var.
+        self.shift = np.full(n_groups, np.nan)
+        self.sum = np.zeros(n_groups)
+        self.sumsq = np.zeros(n_groups)
+        self.mean = np.zeros(n_groups)
+        self.var = np.zeros(n_groups)
+
+    def _group(self, timestamp):
+        return timestamp.hour if self.by_hour else 0
+
+    def _zscore(self, deviation: float, var: float, count: int):
+        if count < self.min_periods or not var > 0:
+            return np.nan
+        return abs(deviation) / np.sqrt(var)
+
+    def update(self, timestamp, actual: float, forecast: float):
+        """
+        Score one reading and fold it into the statistics.
+        Returns an anomaly event as a dict, or None.
+        """
+        residual = actual - forecast
+        if np.isnan(residual):
+            return None
+        g = self._group(pd.Timestamp(timestamp))
+        n = self.count[g]
+        if self.alpha is None:
+            if n == 0:
+                self.shift[g] = residual
+            y = residual - self.shift[g]
+            s, q = self.sum[g], self.sumsq[g]
+            zscore = self._zscore(y - s / n, (q - s * s / n) / (n - 1), n) if n > 1 else np.nan
+            self.sum[g], self.sumsq[g] = s + y, q + y * y
+        else:
+            zscore = self._zscore(residual - self.mean[g], self.var[g], n)
+            self._update_ewm(g, residual)
+        self.count[g] = n + 1
+        if zscore > self.threshold:
+            return {'Datetime': pd.Timestamp(timestamp), 'actual': actual, 'forecast': forecast,
+                    'residual': residual, 'zscore': zscore}
+        return None
+
+    def _update_ewm(self, g: int, residual: float):
+        if self.count[g] == 0:
+            self.mean[g], self.var[g] = residual, 0.0
+            return
+        diff = residual - self.mean[g]
+        increment = self.alpha * diff
+        self.mean[g] = self.mean[g] + increment
+        self.var[g] = (1 - self.alpha) * (self.var[g] + diff * increment)
+
+    def update_batch(self, actual: pd.Series, forecast: pd.Series):
+        """
+        Replay a batch of readings in time order, with the results of calling update on each
+        of them, and leave the statistics as update would. Expanding statistics match update
+        exactly; exponentially weighted ones are computed with a linear filter and match up
+        to rounding.
+        :return: DataFrame with residual, zscore and is_anomaly for every reading.
+        """
+        residual = (actual - forecast).to_numpy(dtype='float64')
+        zscores = np.full(len(residual), np.nan)
+        valid = ~np.isnan(residual)
+        groups = actual.index.hour.to_numpy() if self.by_hour else np.zeros(len(residual), dtype=int)
+
+        for g in np.unique(groups[valid]):
+            positions = np.flatnonzero(valid & (groups == g))
+            if self.alpha is None:
+                zscores[positions] = self._replay_expanding(g, residual[positions])
+            else:
+                zscores[positions] = self._replay_ewm(g, residual[positions])
+
+        with np.errstate(invalid='ignore'):
+            is_anomaly = zscores > self.threshold
+        return pd.DataFrame({'residual': residual, 'zscore': zscores, 'is_anomaly': is_anomaly}, index=actual.index)
+
+    def _replay_expanding(self, g: int, residuals: np.ndarray):
+        if self.count[g] == 0:
+            self.shift[g] = residuals[0]
+        y = residuals - self.shift[g]
+        # Sequential cumulative sums seeded with the current totals reproduce the
+        # additions update performs, bit for bit
+        sums = np.cumsum(np.concatenate(([self.sum[g]], y)))
+        squares = np.cumsum(np.concatenate(([self.sumsq[g]], y * y)))
+        n = self.count[g] + np.arange(len(y))
+        s, q = sums[:-1], squares[:-1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            deviation = y - s / n
+            var = (q - s * s / n) / (n - 1)
+            zscores = np.abs(deviation) / np.sqrt(var)
+        zscores[(n < self.min_periods) | (n < 2) | ~(var > 0)] = np.nan
+        self.sum[g], self.sumsq[g] = sums[-1], squares[-1]
+        self.count[g] += len(y)
+        return zscores
+
+    def _replay_ewm(self, g: int, residuals: np.ndarray):
+        count = self.count[g]
+        if count == 0:
+            self.mean[g], self.var[g] = residuals[0], 0.0
+        rest = residuals[1:] if count == 0 else residuals
+        # update's recurrences, mean' = (1 - alpha) * mean + alpha * r and
+        # var' = (1 - alpha) * var + (1 - alpha) * alpha * (r - mean)^2, as first-order filters
+        decay = 1 - self.alpha
+        means = lfilter([self.alpha], [1, -decay], rest, zi=[decay * self.mean[g]])[0]
+        prev_means = np.concatenate(([self.mean[g]], means[:-1]))
+        deviations = rest - prev_means
+        variances = lfilter([decay * self.alpha], [1, -decay], deviations ** 2, zi=[decay * self.var[g]])[0]
+        prev_vars = np.concatenate(([self.var[g]], variances[:-1]))
+
+        n = count + (count == 0) + np.arange(len(rest))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            zscores = np.abs(deviations) / np.sqrt(prev_vars)
+        zscores[(n < self.min_periods) | ~(prev_vars > 0)] = np.nan
+        if len(rest):
+            self.mean[g], self.var[g] = means[-1], variances[-1]
+        self.count[g] += len(residuals)
+        return np.concatenate(([np.nan], zscores)) if count == 0 else zscores
+
 def plot_anomalies(actual: pd.Series, forecast: pd.Series, anomalies: pd.Series, method: str = "Residual"):
     """
     Plot actual and forecast data, highlighting detected anomalies.
@@ -53,8 +301,9 @@ def plot_anomalies(actual: pd.Series, forecast: pd.Series, anomalies: pd.Series,
     plt.show()
 
 if __name__ == "__main__":
-    actual_file = "data/processed/household_power_consumption_enhanced.csv"
-    forecast_file = "data/processed/arima_forecast.csv"
+    configure_logging()
+    actual_file = resolve_dataset("data/processed/household_power_consumption_enhanced")
+    forecast_file = resolve_dataset("data/processed/arima_forecast")
     actual, forecast = load_actual_and_forecast(actual_file, forecast_file)
     
     anomalies_res = detect_anomalies_residual(actual, forecast, threshold=3.0)
@@ -63,5 +312,5 @@ if __name__ == "__main__":
     plot_anomalies(actual, forecast, anomalies_res, method="Residual")
     plot_anomalies(actual, forecast, anomalies_if, method="Isolation Forest")
     
-    print(f"Residual method found {len(anomalies_res)} anomalies.")
-    print(f"Isolation Forest found {len(anomalies_if)} anomalies.")
+    logger.info(f"Residual method found {len(anomalies_res)} anomalies.")
+    logger.info(f"Isolation Forest found {len(anomalies_if)} anomalies.")
@@ -0,0 +1,121 @@
+# src/backtesting.py
+import os
+import logging
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from statsmodels.tsa.arima.model import ARIMA
+from storage import resolve_dataset
+from forecasting_model import load_processed_data
+from model_store import load_metadata
+from utils import timed
+from logging_config import configure_logging
+
+logger = logging.getLogger(__name__)
+
+def rolling_origins(n_obs: int, initial: int, horizon: int, step: int):
+    """
+    Positions of the forecast origins: the first one after `initial` observations, then every
+    `step` observations, as long as a full horizon of actuals follows.
+    """
+    return np.arange(initial, n_obs - horizon + 1, step)
+
+def forecast_from_origins(results, origins: np.ndarray, horizon: int):
+    """
+    Compute h-step-ahead forecasts from many origins of one filtered state-space result.
+    The predicted state at each origin only depends on earlier observations, so iterating
+    the transition equation from it gives the same forecast as refiltering the series up to
+    that origin, for all origins at once.
+    :return: Array of shape (len(origins), horizon).
+    """
+    ssm = results.model.ssm
+    design, transition = ssm['design'], ssm['transition']
+    state_intercept = ssm['state_intercept'].reshape(-1, 1)
+    obs_intercept = ssm['obs_intercept'].reshape(-1)
+
+    state = results.predicted_state[:, origins]
+    forecasts = np.empty((len(origins), horizon))
+    for step in range(horizon):
+        # Time-varying intercepts (e.g. a trend) are held at their last value past the sample
+        intercept = obs_intercept[np.minimum(origins + step, len(obs_intercept) - 1)]
+        forecasts[:, step] = (design @ state)[0] + intercept
+        state = transition @ state + state_intercept
+    return forecasts
+
+def _backtest_group(series: pd.Series, order: tuple, origins: np.ndarray, horizon: int, window: int = None):
+    """
+    Estimate parameters on the data before the first origin of a group, filter the whole
+    series once with them, and forecast from every origin in the group.
+    """
+    fit_end = origins[0]
+    fit_start = 0 if window is None else max(0, fit_end - window)
+    params = ARIMA(series.iloc[fit_start:fit_end], order=order).fit().params
+    results = ARIMA(series, order=order).filter(params)
+    return forecast_from_origins(results, origins, horizon)
+
+@timed()
+def backtest_arima(series: pd.Series, order: tuple, horizon: int = 24, step: int = 24, initial: int = None,
+                   window: int = None, refit_every: int = None, workers: int = None):
+    """
+    Rolling-origin backtest of an ARIMA model with a fixed horizon (e.g. 24h ahead every day).
+    :param initial: Observations before the first origin; defaults to 80% of the series.
+    :param window: Fit on the last `window` observations before an origin instead of all of them.
+    :param refit_every: Re-estimate parameters every this many origins. By default they are
+                        estimated once and every origin reuses the filtered state.
+    :param workers: Number of worker processes across which refit groups are spread.
+    :return: Long DataFrame with one row per origin and horizon step.
+    """
+    initial = initial if initial is not None else int(len(series) * 0.8)
+    origins = rolling_origins(len(series), initial, horizon, step)
+    if len(origins) == 0:
+        raise ValueError("Series is too short for the requested initial span and horizon.")
+    group_size = refit_every or len(origins)
+    groups = [origins[i:i + group_size] for i in range(0, len(origins), group_size)]
+
+    workers = min(workers or os.cpu_count(), len(groups))
+    if workers == 1:
+        forecasts = [_backtest_group(series, order, group, horizon, window) for group in groups]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            forecasts = list(executor.map(_backtest_group, [series] * len(groups), [order] * len(groups),
+                                          groups, [horizon] * len(groups), [window] * len(groups)))
+    forecasts = np.vstack(forecasts)
+
+    targets = origins[:, None] + np.arange(horizon)
+    return pd.DataFrame({
+        'origin': series.index[np.repeat(origins, horizon)],
+        'horizon_step': np.tile(np.arange(1, horizon + 1), len(origins)),
+        'Datetime': series.index[targets.ravel()],
+        'actual': series.values[targets.ravel()],
+        'forecast': forecasts.ravel(),
+    })
+
+def horizon_metrics(backtest: pd.DataFrame):
+    """
+    Summarize a backtest as MAE, RMSE and MAPE (in percent) per horizon step.
+    Steps with missing actuals are ignored, and zero actuals are left out of the MAPE.
+    """
+    df = backtest.dropna(subset=['actual'])
+    error = df['actual'] - df['forecast']
+    nonzero = df['actual'] != 0
+    grouped = pd.DataFrame({
+        'horizon_step': df['horizon_step'],
+        'abs_error': error.abs(),
+        'sq_error': error ** 2,
+        'ape': (error.abs() / df['actual'].abs()).where(nonzero) * 100,
+    }).groupby('horizon_step')
+    return pd.DataFrame({
+        'mae': grouped['abs_error'].mean(),
+        'rmse': np.sqrt(grouped['sq_error'].mean()),
+        'mape': grouped['ape'].mean(),
+        'n': grouped['abs_error'].count(),
+    })
+
+if __name__ == "__main__":
+    configure_logging()
+    processed_file = resolve_dataset("data/processed/household_power_consumption_enhanced")
+    series = load_processed_data(processed_file, columns=['Global_active_power'])['Global_active_power']
+    metadata = load_metadata("data/models", "Global_active_power")
+    order = tuple(metadata['order']) if metadata else (2, 0, 1)
+    backtest = backtest_arima(series, order=order, horizon=24, step=24)
+    logger.info("Metrics by horizon step:\n" + horizon_metrics(backtest).to_string())
@@ -0,0 +1,91 @@
+# src/batch_forecasting.py
+import os
+import logging
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from statsmodels.tsa.arima.model import ARIMA
+from storage import save_frame
+from utils import timed
+
+logger = logging.getLogger(__name__)
+
+def to_wide(frame: pd.DataFrame, id_column: str = 'meter_id', value_column: str = 'Global_active_power',
+            time_column: str = 'Datetime'):
+    """
+    Convert a long-format frame (one row per meter and timestamp) to a wide frame with
+    one column per meter. A frame without the id column is assumed to be wide already.
+    """
+    if id_column not in frame.columns:
+        return frame
+    if time_column in frame.columns:
+        frame = frame.set_index(time_column)
+    return frame.pivot_table(index=frame.index, columns=id_column, values=value_column, aggfunc='mean')
+
+def prepare_wide(wide: pd.DataFrame, freq: str = 'H'):
+    """
+    Shared preprocessing for all series at once: resample to a common hourly index and
+    forward-fill gaps, as one vectorized operation on the whole matrix.
+    """
+    wide = wide.sort_index().resample(freq).mean().ffill()
+    wide.index.name = 'Datetime'
+    return wide.astype('float64')
+
+def _forecast_chunk(chunk: pd.DataFrame, order: tuple, horizon: int):
+    """
+    Fit and forecast every series (column) of a chunk; failures are reported, not raised.
+    """
+    forecasts, errors = {}, {}
+    for meter_id in chunk.columns:
+        series = chunk[meter_id]
+        series = series.loc[series.first_valid_index():] if series.notna().any() else series
+        try:
+            forecasts[meter_id] = ARIMA(series, order=order).fit().forecast(steps=horizon).values
+        except Exception as e:
+            errors[meter_id] = f'{type(e).__name__}: {e}'
+    return forecasts, errors
+
+@timed()
+def forecast_many(frame: pd.DataFrame, order: tuple = (2, 0, 1), horizon: int = 24, workers: int = None,
+                  chunk_size: int = 16, output_path: str = None, id_column: str = 'meter_id',
+                  value_column: str = 'Global_active_power'):
+    """
+    Fit and forecast a per-series ARIMA model for many meters at once.
+    :param frame: Long-format frame (id, Datetime, value) or wide frame with one column per meter.
+    :param order: ARIMA order used for every series.
+    :param horizon: Number of hours to forecast.
+    :param workers: Number of worker processes (defaults to the number of CPUs).
+    :param chunk_size: Number of series per task, so scheduling and transfer overhead is
+                       paid per chunk rather than per series.
+    :param output_path: Optional Parquet file for the results.
+    :return: Long DataFrame (meter_id, Datetime, forecast) and a dict of per-meter errors.
+    """
+    wide = prepare_wide(to_wide(frame, id_column=id_column, value_column=value_column))
+    chunks = [wide.iloc[:, i:i + chunk_size] for i in range(0, wide.shape[1], chunk_size)]
+    workers = min(workers or os.cpu_count(), len(chunks))
+
+    start = time.perf_counter()
+    if workers <= 1:
+        results = [_forecast_chunk(chunk, order, horizon) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_forecast_chunk, chunks, [order] * len(chunks), [horizon] * len(chunks)))
+    elapsed = time.perf_counter() - start
+
+    forecasts, errors = {}, {}
+    for chunk_forecasts, chunk_errors in results:
+        forecasts.update(chunk_forecasts)
+        errors.update(chunk_errors)
+    logger.info(f"Forecast {len(forecasts)} series in {elapsed:.1f}s ({wide.shape[1] / elapsed:.1f} series/s), "
+                f"{len(errors)} failed.")
+
+    future_index = pd.date_range(wide.index[-1], periods=horizon + 1, freq=wide.index.freq)[1:]
+    meter_ids = list(forecasts)
+    result = pd.DataFrame({
+        id_column: np.repeat(meter_ids, horizon),
+        'forecast': np.concatenate([forecasts[m] for m in meter_ids]) if meter_ids else np.empty(0),
+    }, index=pd.DatetimeIndex(np.tile(future_index, len(meter_ids)), name='Datetime'))
+    if output_path is not None:
+        save_frame(result, output_path)
+    return result, errors
@@ -1,52 +1,353 @@
 # src/data_pipeline.py
 import os
+import json
+import logging
+import argparse
 import pandas as pd
-from data_preprocessing import download_dataset, load_and_preprocess_data
-from feature_engineering import add_lag_features, add_rolling_features, add_fourier_features
-from forecasting_model import load_processed_data, train_arima_model, grid_search_arima
-from anomaly_detection import load_actual_and_forecast, detect_anomalies_residual
-
-def run_pipeline():
-    # Directories
-    raw_dir = "data/raw"
-    processed_dir = "data/processed"
-    os.makedirs(raw_dir, exist_ok=True)
-    os.makedirs(processed_dir, exist_ok=True)
-    
-    # Download and preprocess data
-    dataset_url = "https://archive.ics.uci.edu/ml/machine-learning-databases/00235/household_power_consumption.txt"
-    dataset_path = os.path.join(raw_dir, "household_power_consumption.txt")
-    download_dataset(dataset_url, dataset_path)
-    df_preprocessed = load_and_preprocess_data(dataset_path)
-    
-    # Save the initial processed data
-    processed_file = os.path.join(processed_dir, "household_power_consumption_processed.csv")
-    df_preprocessed.to_csv(processed_file)
-    
-    # Advanced feature engineering
-    df = pd.read_csv(processed_file, index_col="Datetime", parse_dates=True)
-    df = add_lag_features(df, "Global_active_power")
-    df = add_rolling_features(df, "Global_active_power")
-    df = add_fourier_features(df, period=24, order=3)
-    enhanced_file = os.path.join(processed_dir, "household_power_consumption_enhanced.csv")
-    df.to_csv(enhanced_file)
-    
-    # Forecasting using enhanced data
-    series = df["Global_active_power"]
-    train_size = int(len(series) * 0.8)
-    train, test = series[:train_size], series[train_size:]
-    best_order = grid_search_arima(train, p_values=[0, 1, 2], d_values=[0, 1], q_values=[0, 1, 2])
-    model_fit = train_arima_model(train, order=best_order)
-    forecast = model_fit.forecast(steps=len(test))
-    forecast_df = forecast.to_frame(name='Global_active_power')
-    forecast_file = os.path.join(processed_dir, "arima_forecast.csv")
-    forecast_df.to_csv(forecast_file)
-    
-    # Anomaly detection using the residual method
-    actual, forecast_loaded = load_actual_and_forecast(enhanced_file, forecast_file)
-    anomalies = detect_anomalies_residual(actual, forecast_loaded, threshold=3.0)
-    print(f"Pipeline detected {len(anomalies)} anomalies using the residual method.")
+from data_preprocessing import (download_dataset, load_and_preprocess_data, iter_hourly_chunks,
+                                read_new_raw_rows, HourlyResampler, DEFAULT_CHUNKSIZE, MEASUREMENT_COLUMNS)
+from feature_engineering import build_feature_matrix, short_fourier_names
+from forecasting_model import (load_processed_data, grid_search_arima, fit_arima_with_metadata,
+                               update_arima_model, needs_refit, record_residuals, DRIFT_WINDOW)
+from anomaly_detection import load_actual_and_forecast, detect_anomalies_residual, IsolationForestAnomalyModel
+from model_store import save_model, load_model
+from aggregates import LEVELS, build_pyramid, save_pyramid, update_pyramid
+from storage import save_frame, load_frame, append_frame, memory_report
+from pipeline_dag import Stage, run_stages
+from utils import timed, export_metrics, write_json_atomic
+from logging_config import configure_logging
+
+logger = logging.getLogger(__name__)
+
+# Directories and files
+RAW_DIR = "data/raw"
+PROCESSED_DIR = "data/processed"
+DATASET_URL = "https://archive.ics.uci.edu/ml/machine-learning-databases/00235/household_power_consumption.txt"
+DATASET_PATH = os.path.join(RAW_DIR, "household_power_consumption.txt")
+PROCESSED_STEM = os.path.join(PROCESSED_DIR, "household_power_consumption_processed")
+ENHANCED_STEM = os.path.join(PROCESSED_DIR, "household_power_consumption_enhanced")
+FORECAST_STEM = os.path.join(PROCESSED_DIR, "arima_forecast")
+# Watermark of the last processed raw data, and the raw rows of the last (possibly partial) hour
+STATE_FILE = os.path.join(PROCESSED_DIR, "pipeline_state.json")
+RAW_TAIL_FILE = os.path.join(PROCESSED_DIR, "raw_tail.parquet")
+# Memoized AIC of ARIMA candidates, keyed by training-set hash and order
+ORDER_CACHE_FILE = os.path.join(PROCESSED_DIR, "arima_order_cache.json")
+# Fitted models, and the forecast for the hours following the latest data
+MODEL_DIR = "data/models"
+NEXT_FORECAST_STEM = os.path.join(PROCESSED_DIR, "next_forecast")
+ISOLATION_FOREST_NAME = "isolation_forest"
+# Hourly/daily/weekly/monthly aggregates for fast range queries
+PYRAMID_DIR = os.path.join(PROCESSED_DIR, "pyramid")
+FORECAST_HORIZON = 24
+# Outputs of the order search, the training-span model and the residual detection
+ORDER_FILE = os.path.join(PROCESSED_DIR, "arima_order.json")
+TRAIN_MODEL_NAME = "Global_active_power_train"
+ANOMALIES_STEM = os.path.join(PROCESSED_DIR, "residual_anomalies")
+# Input hashes and output fingerprints of the last run of every stage
+MANIFEST_FILE = os.path.join(PROCESSED_DIR, "pipeline_manifest.json")
+ORDER_GRID = {"p_values": [0, 1, 2], "d_values": [0, 1], "q_values": [0, 1, 2]}
+ANOMALY_THRESHOLD = 3.0
+# Timings of every instrumented function, one file per run
+METRICS_DIR = os.path.join(PROCESSED_DIR, "metrics")
+
+# Feature settings shared by full and incremental runs
+TARGET = "Global_active_power"
+FEATURE_SPEC = {
+    "lags": (1, 2, 3, 24),
+    "rolling_windows": (3, 6, 24),
+    "rolling_stats": ("mean",),
+    "fourier": ((24, 3),),
+}
+
+def add_features(df: pd.DataFrame, start: int = 0, full_precision: bool = False):
+    """
+    Add the pipeline's lag, rolling and Fourier features.
+    :param start: Position of the first row of df in the full hourly series.
+    :param full_precision: Store the features as float64 instead of float32. They are
+                           computed in float64 either way.
+    """
+    dtype = 'float64' if full_precision else 'float32'
+    features = build_feature_matrix(df, TARGET, FEATURE_SPEC, dtype=dtype, start=start)
+    # The enhanced dataset keeps its sin_1 ... cos_3 column names
+    (period, _), = FEATURE_SPEC["fourier"]
+    return pd.concat([df, short_fourier_names(features, period)], axis=1)
+
+def save_state(resampler: HourlyResampler, raw_offset: int, first_hour: pd.Timestamp, last_hour: pd.Timestamp,
+               full_precision: bool = False):
+    """
+    Persist the incremental watermark: how far the raw file has been read and the
+    forward-filled raw rows of the last hour, which is recomputed on the next update.
+    """
+    save_frame(resampler.tail, RAW_TAIL_FILE)
+    state = {
+        "raw_offset": raw_offset,
+        "first_hour": first_hour.isoformat(),
+        "last_hour": last_hour.isoformat(),
+        "full_precision": full_precision,
+    }
+    write_json_atomic(STATE_FILE, state)
+
+def load_state():
+    """
+    Load the incremental watermark, or None if no full run has recorded one.
+    """
+    if not (os.path.exists(STATE_FILE) and os.path.exists(RAW_TAIL_FILE)):
+        return None
+    with open(STATE_FILE) as f:
+        state = json.load(f)
+    state["first_hour"] = pd.Timestamp(state["first_hour"])
+    state["last_hour"] = pd.Timestamp(state["last_hour"])
+    state["raw_tail"] = load_frame(RAW_TAIL_FILE, full_precision=True)
+    state.setdefault("full_precision", False)
+    return state
+
+def _model_files(name: str):
+    return [os.path.join(MODEL_DIR, f"{name}.pkl"), os.path.join(MODEL_DIR, f"{name}.json")]
+
+def _outputs(stem: str, export_csv: bool):
+    return [stem + ".parquet"] + ([stem + ".csv"] if export_csv else [])
+
+def _load_target(file_path: str):
+    """
+    The target series and the size of its training span (the first 80%).
+    """
+    series = load_processed_data(file_path, columns=[TARGET])[TARGET]
+    return series, int(len(series) * 0.8)
+
+@timed()
+def download_raw(url: str):
+    download_dataset(url, DATASET_PATH)
+
+@timed()
+def preprocess_raw(export_csv: bool = False, full_precision: bool = False):
+    """
+    Resample the raw file to hourly data, build the aggregate pyramid and record the
+    incremental watermark.
+    """
+    raw_offset = os.path.getsize(DATASET_PATH)
+    resampler = HourlyResampler()
+    df_preprocessed = load_and_preprocess_data(DATASET_PATH, chunksize=DEFAULT_CHUNKSIZE, resampler=resampler,
+                                               full_precision=full_precision)
+    save_frame(df_preprocessed, PROCESSED_STEM + ".parquet", csv_path=PROCESSED_STEM + ".csv" if export_csv else None,
+               partitioned=True)
+    save_pyramid(build_pyramid(df_preprocessed, MEASUREMENT_COLUMNS), PYRAMID_DIR)
+    save_state(resampler, raw_offset, df_preprocessed.index[0], df_preprocessed.index[-1], full_precision)
+
+@timed()
+def compute_features(export_csv: bool = False, full_precision: bool = False):
+    df = add_features(load_processed_data(PROCESSED_STEM + ".parquet", full_precision=full_precision),
+                      full_precision=full_precision)
+    logger.info(f"Memory per row of the enhanced dataset:\n{memory_report(df).loc[['total']].to_string()}")
+    save_frame(df, ENHANCED_STEM + ".parquet", csv_path=ENHANCED_STEM + ".csv" if export_csv else None,
+               partitioned=True)
+
+@timed()
+def search_order(grid: dict):
+    series, train_size = _load_target(ENHANCED_STEM + ".parquet")
+    best_order = grid_search_arima(series[:train_size], cache_path=ORDER_CACHE_FILE, **grid)
+    write_json_atomic(ORDER_FILE, {"order": list(best_order)})
+
+@timed()
+def fit_model():
+    series, train_size = _load_target(ENHANCED_STEM + ".parquet")
+    with open(ORDER_FILE) as f:
+        order = tuple(json.load(f)["order"])
+    model_fit, metadata = fit_arima_with_metadata(series[:train_size], order=order)
+    save_model(model_fit, MODEL_DIR, TRAIN_MODEL_NAME, metadata)
+
+@timed()
+def forecast_and_update(export_csv: bool = False):
+    """
+    Forecast the test span with the training-span model, then bring the model up to date
+    with all complete hours for incremental updates and forecast the hours ahead.
+    """
+    series, train_size = _load_target(ENHANCED_STEM + ".parquet")
+    model_fit, metadata = load_model(MODEL_DIR, TRAIN_MODEL_NAME)
+    forecast_df = model_fit.forecast(steps=len(series) - train_size).to_frame(name=TARGET)
+    forecast_df.index.name = 'Datetime'
+    save_frame(forecast_df, FORECAST_STEM + ".parquet", csv_path=FORECAST_STEM + ".csv" if export_csv else None)
+
+    extension = series.iloc[train_size:-1]
+    model_fit = update_arima_model(model_fit, extension)
+    # The drift window continues from the latest hours, where incremental runs pick it up
+    recent = extension.iloc[-DRIFT_WINDOW:]
+    if not recent.empty:
+        metadata = record_residuals(metadata, recent - model_fit.predict(start=recent.index[0], end=recent.index[-1]))
+    save_model(model_fit, MODEL_DIR, TARGET, metadata)
+    save_next_forecast(model_fit)
+
+@timed()
+def detect_residual_anomalies(threshold: float = ANOMALY_THRESHOLD):
+    actual, forecast = load_actual_and_forecast(ENHANCED_STEM + ".parquet", FORECAST_STEM + ".parquet")
+    anomalies = detect_anomalies_residual(actual, forecast, threshold=threshold)
+    save_frame(anomalies.to_frame(name='residual'), ANOMALIES_STEM + ".parquet")
+    logger.info(f"Pipeline detected {len(anomalies)} anomalies using the residual method.")
+
+@timed()
+def fit_isolation_forest():
+    """
+    Reference Isolation Forest on the one-step-ahead residuals, for scoring new data.
+    """
+    series, _ = _load_target(ENHANCED_STEM + ".parquet")
+    model_fit, _ = load_model(MODEL_DIR, TARGET)
+    complete = series.iloc[:-1]
+    one_step = model_fit.predict(start=complete.index[0], end=complete.index[-1])
+    IsolationForestAnomalyModel().fit(complete, one_step).save(MODEL_DIR, ISOLATION_FOREST_NAME)
+
+def pipeline_stages(export_csv: bool = False, threshold: float = ANOMALY_THRESHOLD, full_precision: bool = False):
+    """
+    The full pipeline as a DAG of stages with the files each one reads and writes.
+    """
+    processed = PROCESSED_STEM + ".parquet"
+    enhanced = ENHANCED_STEM + ".parquet"
+    pyramid = [os.path.join(PYRAMID_DIR, f"{name}.parquet") for name in LEVELS]
+    return [
+        Stage("download", download_raw, outputs=[DATASET_PATH], params={"url": DATASET_URL}),
+        Stage("preprocess", preprocess_raw, inputs=[DATASET_PATH],
+              outputs=_outputs(PROCESSED_STEM, export_csv) + pyramid + [STATE_FILE, RAW_TAIL_FILE],
+              params={"export_csv": export_csv, "full_precision": full_precision}),
+        Stage("features", compute_features, inputs=[processed], outputs=_outputs(ENHANCED_STEM, export_csv),
+              params={"export_csv": export_csv, "full_precision": full_precision}),
+        Stage("order_search", search_order, inputs=[enhanced], outputs=[ORDER_FILE], params={"grid": ORDER_GRID}),
+        Stage("fit", fit_model, inputs=[enhanced, ORDER_FILE], outputs=_model_files(TRAIN_MODEL_NAME)),
+        Stage("forecast", forecast_and_update, inputs=[enhanced] + _model_files(TRAIN_MODEL_NAME),
+              outputs=_outputs(FORECAST_STEM, export_csv) + _model_files(TARGET) + [NEXT_FORECAST_STEM + ".parquet"],
+              params={"export_csv": export_csv}),
+        Stage("detect_residual", detect_residual_anomalies, inputs=[enhanced, FORECAST_STEM + ".parquet"],
+              outputs=[ANOMALIES_STEM + ".parquet"], params={"threshold": threshold}),
+        Stage("detect_isolation_forest", fit_isolation_forest, inputs=[enhanced] + _model_files(TARGET),
+              outputs=_model_files(ISOLATION_FOREST_NAME)),
+    ]
+
+def run_pipeline(export_csv: bool = False, threshold: float = ANOMALY_THRESHOLD, workers: int = None,
+                 executor: str = "thread", force=(), full_precision: bool = False):
+    """
+    Run the full pipeline. Stages exchange data through Parquet files in data/processed;
+    a stage is skipped when its inputs and parameters are unchanged since its last run,
+    and independent stages (e.g. the two anomaly detectors) run concurrently.
+    :param export_csv: Also write CSV copies of the stage outputs.
+    :param threshold: Threshold multiplier of the residual anomaly detection.
+    :param workers: Maximum number of stages running at once.
+    :param executor: 'thread' or 'process'.
+    :param force: Names of stages to run even if unchanged.
+    :param full_precision: Store float64/int64 columns instead of float32 measurements and
+                           features and uint8 calendar fields.
+    :return: Per-stage timing report.
+    """
+    os.makedirs(RAW_DIR, exist_ok=True)
+    os.makedirs(PROCESSED_DIR, exist_ok=True)
+    return run_stages(pipeline_stages(export_csv, threshold, full_precision), MANIFEST_FILE, workers=workers,
+                      executor=executor, force=force)
+
+def save_next_forecast(model_fit):
+    """
+    Forecast the hours following the model's latest observation and store the result.
+    """
+    next_forecast = model_fit.forecast(steps=FORECAST_HORIZON).to_frame(name=TARGET)
+    next_forecast.index.name = 'Datetime'
+    save_frame(next_forecast, NEXT_FORECAST_STEM + ".parquet")
+    return next_forecast
+
+@timed()
+def run_incremental_pipeline(threshold: float = ANOMALY_THRESHOLD):
+    """
+    Process only the raw rows appended since the last run. The last stored hour is
+    recomputed, features are computed for the new span using just enough stored history
+    for the longest lag or rolling window, and the results are appended to the stored
+    datasets, rewriting only their latest month partitions. Falls back to a full run when
+    no watermark exists or the raw file shrank.
+    :param threshold: Threshold multiplier of the residual anomaly detection.
+    """
+    state = load_state()
+    if state is None or os.path.getsize(DATASET_PATH) < state["raw_offset"]:
+        logger.info("No usable incremental state; running the full pipeline.")
+        return run_pipeline(threshold=threshold)
+
+    new_bytes, raw_offset = read_new_raw_rows(DATASET_PATH, state["raw_offset"])
+    if not new_bytes:
+        logger.info("No new data since the last run.")
+        return None
+
+    logger.info("Resampling newly arrived data...")
+    resampler = HourlyResampler(tail=state["raw_tail"])
+    chunks = list(iter_hourly_chunks(new_bytes, chunksize=DEFAULT_CHUNKSIZE, resampler=resampler, header=False))
+    new_hourly = pd.concat(chunks)
+    boundary = new_hourly.index[0]
+    # Appending casts the new rows to the stored schema, so they match a full run
+    new_hourly = append_frame(new_hourly, PROCESSED_STEM + ".parquet")
+    update_pyramid(PYRAMID_DIR, new_hourly, MEASUREMENT_COLUMNS)
+
+    logger.info("Updating features for the new span...")
+    full_precision = state["full_precision"]
+    history_hours = max(max(FEATURE_SPEC["lags"]), max(FEATURE_SPEC["rolling_windows"]))
+    history = load_processed_data(PROCESSED_STEM + ".parquet", start=boundary - pd.Timedelta(hours=history_hours),
+                                  end=boundary - pd.Timedelta(hours=1), full_precision=full_precision)
+    df = pd.concat([history, new_hourly])
+    start = (df.index[0] - state["first_hour"]) // pd.Timedelta(hours=1)
+    df = add_features(df, start=start, full_precision=full_precision).loc[boundary:]
+    enhanced_file = ENHANCED_STEM + ".parquet"
+    append_frame(df, enhanced_file)
+
+    # Extend the stored model with the new complete hours instead of re-estimating it;
+    # the last hour may still be partial and is only filtered once it is complete
+    model_fit, metadata = load_model(MODEL_DIR, TARGET)
+    last_seen = model_fit.data.row_labels[-1]
+    new_obs = df[TARGET].iloc[:-1]
+    new_obs = new_obs[new_obs.index > last_seen]
+    model_fit = update_arima_model(model_fit, new_obs)
+    if not new_obs.empty:
+        # Anomaly detection on the new span against one-step-ahead predictions
+        predicted = model_fit.predict(start=new_obs.index[0], end=new_obs.index[-1])
+        metadata = record_residuals(metadata, new_obs - predicted)
+        anomalies = detect_anomalies_residual(new_obs, predicted, threshold=threshold, resid_std=metadata['resid_std'])
+        logger.info(f"Incremental run detected {len(anomalies)} anomalies in {len(new_obs)} new hours.")
+        score_isolation_forest(model_fit, enhanced_file, new_obs)
+    reason = needs_refit(model_fit, metadata, new_obs)
+    if reason is not None:
+        logger.info(f"Refitting the ARIMA model ({reason})...")
+        series = load_processed_data(enhanced_file, columns=[TARGET])[TARGET].iloc[:-1]
+        model_fit, metadata = fit_arima_with_metadata(series, order=tuple(metadata['order']))
+    save_model(model_fit, MODEL_DIR, TARGET, metadata)
+    save_next_forecast(model_fit)
+
+    save_state(resampler, raw_offset, state["first_hour"], df.index[-1], full_precision)
+    return df
+
+@timed()
+def score_isolation_forest(model_fit, enhanced_file: str, new_obs: pd.Series):
+    """
+    Score new complete hours with the stored Isolation Forest, retraining it on its sliding
+    window when it is due.
+    """
+    iso_model = IsolationForestAnomalyModel.load(MODEL_DIR, ISOLATION_FOREST_NAME)
+    if iso_model is None:
+        return None
+    # Enough history for the rolling residual statistics (or the whole window when retraining)
+    context = iso_model.window if iso_model.needs_retrain(new_obs.index[-1]) else iso_model.rolling_window
+    context_start = max(new_obs.index[-1] - pd.Timedelta(hours=context - 1), model_fit.data.row_labels[0])
+    actual = load_processed_data(enhanced_file, columns=[TARGET], start=context_start, end=new_obs.index[-1])[TARGET]
+    one_step = model_fit.predict(start=context_start, end=new_obs.index[-1])
+    if iso_model.maybe_retrain(actual, one_step):
+        logger.info("Retrained the Isolation Forest on its sliding window.")
+        iso_model.save(MODEL_DIR, ISOLATION_FOREST_NAME)
+    scores = iso_model.score(actual, one_step, start=new_obs.index[0])
+    logger.info(f"Isolation Forest flagged {int(scores['is_anomaly'].sum())} of {len(scores)} new hours.")
+    return scores
 
 if __name__ == "__main__":
-    run_pipeline()
-    print("Data pipeline execution complete.")
+    parser = argparse.ArgumentParser(description="Run the energy consumption data pipeline.")
+    parser.add_argument("--incremental", action="store_true", help="Only process newly appended raw data.")
+    parser.add_argument("--threshold", type=float, default=ANOMALY_THRESHOLD, help="Residual anomaly threshold.")
+    parser.add_argument("--workers", type=int, default=None, help="Maximum number of concurrent stages.")
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread")
+    parser.add_argument("--force", nargs="*", default=(), help="Stages to run even if unchanged.")
+    parser.add_argument("--full-precision", action="store_true", help="Store float64 instead of the compact schema.")
+    args = parser.parse_args()
+    configure_logging()
+    if args.incremental:
+        run_incremental_pipeline(threshold=args.threshold)
+    else:
+        run_pipeline(threshold=args.threshold, workers=args.workers, executor=args.executor, force=args.force,
+                     full_precision=args.full_precision)
+    metrics_file = export_metrics(os.path.join(METRICS_DIR, f"run_{pd.Timestamp.now():%Y%m%dT%H%M%S}.json"))
+    logger.info(f"Data pipeline execution complete. Metrics saved to {metrics_file}")
@@ -1,52 +1,200 @@
+import logging
+import io
 import os
 import pandas as pd
-import requests
+from acquisition import download, default_mirrors
+from storage import save_frame, compact_frame, full_precision_frame, memory_report
+from utils import timed
+from logging_config import configure_logging
 
-def download_dataset(url: str, dest: str):
+logger = logging.getLogger(__name__)
+
+# Column layout of the raw UCI semicolon-separated file
+RAW_COLUMNS = [
+    'Date', 'Time', 'Global_active_power', 'Global_reactive_power', 'Voltage',
+    'Global_intensity', 'Sub_metering_1', 'Sub_metering_2', 'Sub_metering_3',
+]
+MEASUREMENT_COLUMNS = RAW_COLUMNS[2:]
+RAW_DTYPES = {'Date': str, 'Time': str, **{col: 'float64' for col in MEASUREMENT_COLUMNS}}
+
+# Number of raw minute rows read per chunk in streaming mode
+DEFAULT_CHUNKSIZE = 500_000
+
+@timed()
+def download_dataset(url: str, dest: str, sha256: str = None, size: int = None, mirrors=None):
+    """
+    Download the dataset from the specified URL if a complete copy does not already exist.
+    The file is streamed to disk, resumed if interrupted and verified (see acquisition.download).
+    :param mirrors: Local directories or base URLs tried before the URL; by default those
+                    in the ENERGY_DATA_MIRROR environment variable.
+    """
+    return download(url, dest, sha256=sha256, size=size, mirrors=default_mirrors() if mirrors is None else mirrors)
+
+def parse_datetime(date: pd.Series, time: pd.Series):
+    """
+    Combine the raw 'Date' and 'Time' string columns into a DatetimeIndex.
+    Each distinct date and time string is parsed only once, which is much faster than
+    parsing the concatenated strings row by row on minute-level data.
+    """
+    date_codes, date_values = pd.factorize(date)
+    time_codes, time_values = pd.factorize(time)
+    dates = pd.to_datetime(date_values, format='%d/%m/%Y').take(date_codes)
+    times = pd.to_timedelta(time_values).take(time_codes)
+    return pd.DatetimeIndex(dates + times, name='Datetime')
+
+def add_calendar_features(df_hourly: pd.DataFrame):
+    """
+    Create some basic temporal features for further modeling.
+    """
+    df_hourly['hour'] = df_hourly.index.hour
+    df_hourly['day_of_week'] = df_hourly.index.dayofweek
+    return df_hourly
+
+class HourlyResampler:
+    """
+    Forward-fill and resample minute-level readings to hourly means, one chunk at a time.
+
+    Raw rows of the most recent (possibly incomplete) hour are held back in `tail` until
+    a later chunk starts a new hour, so every emitted hour is averaged over exactly the
+    rows the in-memory path would use. The held rows are already forward-filled and
+    therefore also carry the fill state into the next chunk.
     """
-    Download the dataset from the specified URL if it does not already exist.
+
+    def __init__(self, tail: pd.DataFrame = None):
+        self.tail = tail
+
+    def push(self, chunk: pd.DataFrame):
+        """
+        Add minute-level rows (Datetime index, measurement columns, sorted by time)
+        and return the hourly rows that are now complete.
+        """
+        if self.tail is not None and not self.tail.empty:
+            chunk = pd.concat([self.tail, chunk])
+        chunk = chunk.ffill()
+        if chunk.empty:
+            self.tail = chunk
+            return self._resample(chunk)
+        open_hour = chunk.index[-1].floor('H')
+        complete = chunk.index < open_hour
+        self.tail = chunk[~complete]
+        return self._resample(chunk[complete], end=open_hour)
+
+    def flush(self):
+        """
+        Emit the held-back final hour. The rows stay held back, so a later push
+        recomputes this hour once more of its minutes have arrived.
+        """
+        if self.tail is None:
+            empty_index = pd.DatetimeIndex([], name='Datetime')
+            return self._resample(pd.DataFrame(index=empty_index, columns=MEASUREMENT_COLUMNS, dtype='float64'))
+        return self._resample(self.tail)
+
+    @staticmethod
+    def _resample(df: pd.DataFrame, end: pd.Timestamp = None):
+        hourly = df.resample('H').mean()
+        if end is not None and not hourly.empty:
+            # Hours without any rows between this chunk and the held-back hour
+            hourly = hourly.reindex(pd.date_range(hourly.index[0], end, freq='H', inclusive='left', name='Datetime'))
+        return add_calendar_features(hourly)
+
+def read_raw_chunks(file_path, chunksize: int = DEFAULT_CHUNKSIZE, header: bool = True):
+    """
+    Read the raw semicolon file in bounded chunks with explicit numeric dtypes and
+    yield minute-level frames indexed by Datetime.
+    :param file_path: Path or readable buffer of the raw dataset.
+    :param chunksize: Number of raw rows per chunk.
+    :param header: Whether the input starts with the header line.
+    """
+    names = None if header else RAW_COLUMNS
+    reader = pd.read_csv(file_path, sep=';', na_values='?', dtype=RAW_DTYPES, chunksize=chunksize,
+                         header=0 if header else None, names=names)
+    for chunk in reader:
+        index = parse_datetime(chunk['Date'], chunk['Time'])
+        chunk = chunk[MEASUREMENT_COLUMNS]
+        chunk.index = index
+        yield chunk
+
+def read_new_raw_rows(file_path: str, offset: int):
+    """
+    Read the complete raw lines appended to the file after a byte offset.
+    Returns the unparsed bytes (without header) and the offset of the end of the last
+    complete line, so a line that is still being written is picked up next time.
     """
-    if not os.path.exists(dest):
-        print("Downloading dataset...")
-        response = requests.get(url)
-        with open(dest, 'wb') as f:
-            f.write(response.content)
-        print("Download complete.")
-    else:
-        print("Dataset already exists.")
+    with open(file_path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b'\n') + 1
+    return data[:end], offset + end
 
-def load_and_preprocess_data(file_path: str):
+def iter_hourly_chunks(file_path, chunksize: int = DEFAULT_CHUNKSIZE, resampler: HourlyResampler = None,
+                       header: bool = True):
+    """
+    Stream the raw dataset and yield hourly rows incrementally. Memory use is bounded by
+    the chunk size regardless of the input size. The raw file must be sorted by time,
+    as the UCI export is.
+    :param file_path: Path or readable buffer of the raw dataset.
+    :param chunksize: Number of raw rows per chunk.
+    :param resampler: Resampler carrying state from an earlier run; a new one by default.
+    :param header: Whether the input starts with the header line.
+    """
+    if resampler is None:
+        resampler = HourlyResampler()
+    if isinstance(file_path, bytes):
+        file_path = io.BytesIO(file_path)
+    for chunk in read_raw_chunks(file_path, chunksize=chunksize, header=header):
+        hourly = resampler.push(chunk)
+        if not hourly.empty:
+            yield hourly
+    hourly = resampler.flush()
+    if not hourly.empty:
+        yield hourly
+
+@timed()
+def load_and_preprocess_data(file_path: str, chunksize: int = None, resampler: HourlyResampler = None,
+                             full_precision: bool = False):
     """
     Load the dataset, parse datetime columns, handle missing values,
     and perform resampling and feature engineering.
+    :param file_path: Path to the raw dataset.
+    :param chunksize: If given, stream the file in chunks of this many rows instead of
+                      loading it at once. The result is identical either way.
+    :param resampler: In streaming mode, a resampler whose final state (the raw rows of
+                      the last hour) the caller wants to keep for incremental updates.
+    :param full_precision: Return float64/int64 columns instead of float32 measurements
+                           and uint8 calendar fields. Resampling is done in float64 either way.
     """
-    print("Loading dataset...")
+    to_schema = full_precision_frame if full_precision else compact_frame
+    if chunksize is not None:
+        logger.info(f"Loading dataset in chunks of {chunksize} rows...")
+        chunks = iter_hourly_chunks(file_path, chunksize=chunksize, resampler=resampler)
+        df_hourly = pd.concat(list(chunks))
+        df_hourly.index.freq = 'H'
+        return to_schema(df_hourly)
+
+    logger.info("Loading dataset...")
     # Load the dataset; note that missing values are denoted by '?' in this dataset
     df = pd.read_csv(file_path, sep=';', na_values='?', low_memory=False)
     
-    print("Parsing datetime...")
+    logger.info("Parsing datetime...")
     # Merge 'Date' and 'Time' into a single datetime column
     df['Datetime'] = pd.to_datetime(df['Date'] + ' ' + df['Time'], format='%d/%m/%Y %H:%M:%S')
     df.set_index('Datetime', inplace=True)
     df.drop(columns=['Date', 'Time'], inplace=True)
     
-    print("Handling missing values...")
+    logger.info("Handling missing values...")
     # Forward-fill missing values; other strategies can be used based on your analysis
     df.fillna(method='ffill', inplace=True)
     
-    print("Resampling data to hourly frequency...")
+    logger.info("Resampling data to hourly frequency...")
     # Resample the data to hourly intervals; this can be adjusted (e.g., to daily) if needed
     df_hourly = df.resample('H').mean()
     df_hourly.index.freq = 'H'  # Explicitly set the frequency
     
-    print("Creating additional features...")
-    # Create some basic temporal features for further modeling
-    df_hourly['hour'] = df_hourly.index.hour
-    df_hourly['day_of_week'] = df_hourly.index.dayofweek
-
-    return df_hourly
+    logger.info("Creating additional features...")
+    return to_schema(add_calendar_features(df_hourly))
 
 if __name__ == "__main__":
+    configure_logging()
     # Define directories for raw and processed data
     raw_data_dir = "data/raw"
     processed_data_dir = "data/processed"
@@ -61,10 +209,11 @@ if __name__ == "__main__":
     download_dataset(dataset_url, dataset_path)
     
     # Load and preprocess the dataset
-    df_preprocessed = load_and_preprocess_data(dataset_path)
+    df_preprocessed = load_and_preprocess_data(dataset_path, chunksize=DEFAULT_CHUNKSIZE)
+    logger.info(f"Memory per row by column:\n{memory_report(df_preprocessed).to_string()}")
     
     # Save the processed data for future use
-    processed_file_path = os.path.join(processed_data_dir, "household_power_consumption_processed.csv")
-    df_preprocessed.to_csv(processed_file_path)
+    processed_file_path = os.path.join(processed_data_dir, "household_power_consumption_processed.parquet")
+    save_frame(df_preprocessed, processed_file_path)
     
-    print("Data preprocessing complete. Processed data saved to:", processed_file_path)
+    logger.info(f"Data preprocessing complete. Processed data saved to: {processed_file_path}")
@@ -0,0 +1,137 @@
+# src/decomposition.py
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+def trend_filter(period: int):
+    """
+    Centered moving-average weights used by statsmodels' seasonal_decompose.
+    """
+    if period % 2 == 0:
+        return np.array([0.5] + [1.0] * (period - 1) + [0.5]) / period
+    return np.repeat(1.0 / period, period)
+
+class SeasonalDecomposition:
+    """
+    Moving-average seasonal decomposition (as statsmodels' seasonal_decompose) that can be
+    extended as new observations are appended. The trend is a vectorized convolution and
+    appending only convolves the tail; seasonal indices are phase means computed with
+    bincount. With several periods (e.g. 24 and 168) the trend uses the longest one and
+    each seasonal component is estimated, shortest period first, on what the previous
+    ones left over.
+    """
+
+    def __init__(self, periods=(24,), model: str = 'additive'):
+        if model not in ('additive', 'multiplicative'):
+            raise ValueError(f"Unknown decomposition model: {model}")
+        self.periods = tuple(sorted(periods))
+        self.model = model
+        self.filter = trend_filter(max(self.periods))
+        self.half = len(self.filter) // 2
+        self.values = np.empty(0)
+        self.index = pd.DatetimeIndex([])
+        self.trend = np.empty(0)
+
+    def extend(self, series: pd.Series):
+        """
+        Append observations (without missing values) and update the trend where it is now defined.
+        """
+        values = series.to_numpy(dtype='float64')
+        if self.model == 'multiplicative' and np.any(values <= 0):
+            raise ValueError("Multiplicative seasonality is not appropriate for zero and negative values")
+        n_old = len(self.values)
+        self.values = np.concatenate((self.values, values))
+        self.index = self.index.append(series.index) if n_old else series.index
+        self.trend = np.concatenate((self.trend, np.full(len(values), np.nan)))
+
+        # Trend at position i needs values[i - half : i + half + 1]
+        first = max(self.half, n_old - self.half)
+        last = len(self.values) - self.half
+        if last > first:
+            window = self.values[first - self.half:last + self.half]
+            self.trend[first:last] = np.convolve(window, self.filter, mode='valid')
+        return self
+
+    def _phase_means(self, detrended: np.ndarray, period: int):
+        phase = np.arange(len(detrended)) % period
+        valid = ~np.isnan(detrended)
+        sums = np.bincount(phase[valid], weights=detrended[valid], minlength=period)
+        counts = np.bincount(phase[valid], minlength=period)
+        with np.errstate(invalid='ignore'):
+            means = sums / counts
+        if self.model == 'additive':
+            return means - np.mean(means)
+        return means / np.mean(means)
+
+    def components(self):
+        """
+        The decomposition as a DataFrame: observed, trend, one seasonal column per period,
+        their combined seasonal effect, and the residual.
+        """
+        n = len(self.values)
+        additive = self.model == 'additive'
+        remaining = self.values - self.trend if additive else self.values / self.trend
+        frame = {'observed': self.values, 'trend': self.trend}
+        seasonal_total = np.zeros(n) if additive else np.ones(n)
+        for period in self.periods:
+            seasonal = np.tile(self._phase_means(remaining, period), n // period + 1)[:n]
+            frame[f'seasonal_{period}'] = seasonal
+            if additive:
+                remaining, seasonal_total = remaining - seasonal, seasonal_total + seasonal
+            else:
+                remaining, seasonal_total = remaining / seasonal, seasonal_total * seasonal
+        frame['seasonal'] = seasonal_total
+        frame['resid'] = remaining
+        return pd.DataFrame(frame, index=self.index)
+
+class DecompositionCache:
+    """
+    LRU cache of decompositions keyed by (series version, range, model, periods). When a
+    request covers a cached range plus newly appended observations, the cached
+    decomposition is extended instead of recomputed. It is safe to share between threads.
+    """
+
+    def __init__(self, maxsize: int = 16):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def decompose(self, series: pd.Series, model: str = 'additive', periods=(24,), version=None):
+        """
+        Decompose a series (without missing values), reusing cached work where possible.
+        :param version: Identifies the contents of the underlying data (e.g. the file's size
+                        and modification time); cached results are only reused for the same version.
+        """
+        with self.lock:
+            return self._decompose(series, model, tuple(sorted(periods)), version)
+
+    def _decompose(self, series: pd.Series, model: str, periods: tuple, version):
+        base = (version, series.index[0], model, periods)
+        key = base + (series.index[-1], len(series))
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key][1]
+
+        decomposition = self._pop_extendable(base, series)
+        if decomposition is None:
+            decomposition = SeasonalDecomposition(periods, model).extend(series)
+        else:
+            decomposition.extend(series.iloc[len(decomposition.values):])
+        components = decomposition.components()
+        self.entries[key] = (decomposition, components)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return components
+
+    def _pop_extendable(self, base: tuple, series: pd.Series):
+        """
+        Remove and return a cached decomposition of a prefix of the series, if any.
+        """
+        for key, (decomposition, _) in self.entries.items():
+            n = key[-1]
+            if key[:4] == base and n < len(series) and series.index[n - 1] == key[4] \
+                    and series.iat[n - 1] == decomposition.values[-1]:
+                del self.entries[key]
+                return decomposition
+        return None
@@ -0,0 +1,81 @@
+# src/downsampling.py
+import numpy as np
+import pandas as pd
+
+def _bucket_edges(n: int, n_buckets: int):
+    return np.linspace(0, n, n_buckets + 1).astype(int)
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int):
+    """
+    Positions kept by Largest-Triangle-Three-Buckets: the first and last point, plus one
+    point per bucket that forms the largest triangle with the previously kept point and
+    the average of the next bucket. Bucket averages are computed in one vectorized pass.
+    """
+    n = len(x)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    # Buckets over the inner points; the first and last point are always kept
+    edges = _bucket_edges(n - 2, n_out - 2) + 1
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[1:-1], edges[:-1] - 1) / counts
+    avg_y = np.add.reduceat(y[1:-1], edges[:-1] - 1) / counts
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        areas = np.abs((x[a] - next_x[i]) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y[i] - y[a]))
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+def minmax_indices(y: np.ndarray, n_out: int):
+    """
+    Positions of the minimum and maximum of each of n_out / 2 equal-size buckets,
+    computed for all buckets at once on a padded 2-D view.
+    """
+    n = len(y)
+    n_buckets = n_out // 2
+    if n <= n_out or n_buckets < 1:
+        return np.arange(n)
+    size = -(-n // n_buckets)
+    padded = np.full(n_buckets * size, np.nan)
+    padded[:n] = y
+    rows = padded.reshape(n_buckets, size)
+    offsets = np.arange(n_buckets) * size
+    lows = offsets + np.argmin(np.where(np.isnan(rows), np.inf, rows), axis=1)
+    highs = offsets + np.argmax(np.where(np.isnan(rows), -np.inf, rows), axis=1)
+    selected = np.unique(np.concatenate((lows, highs)))
+    return selected[selected < n]
+
+def downsample(series: pd.Series, n_out: int = 1000, method: str = 'lttb', keep=None):
+    """
+    Reduce a time series to roughly n_out points for plotting while preserving its shape.
+    :param series: Series with a datetime index.
+    :param n_out: Target number of points, e.g. the pixel width of the plot.
+    :param method: 'lttb' (Largest-Triangle-Three-Buckets) or 'minmax' (min and max per bucket).
+    :param keep: Index labels that must survive, e.g. detected anomalies.
+    :return: The selected points; a NaN is kept at the start of each gap so lines stay broken.
+    """
+    if len(series) <= n_out:
+        return series
+    values = series.to_numpy(dtype='float64')
+    valid = ~np.isnan(values)
+    positions = np.flatnonzero(valid)
+    x = series.index.asi8[valid].astype('float64') if isinstance(series.index, pd.DatetimeIndex) else positions.astype('float64')
+
+    if method == 'lttb':
+        selected = positions[lttb_indices(x, values[valid], n_out)]
+    elif method == 'minmax':
+        selected = positions[minmax_indices(values[valid], n_out)]
+    else:
+        raise ValueError(f"Unknown downsampling method: {method}")
+
+    gap_starts = np.flatnonzero(~valid[1:] & valid[:-1]) + 1
+    extra = [gap_starts]
+    if keep is not None and len(keep):
+        extra.append(series.index.get_indexer(pd.Index(keep).intersection(series.index)))
+    return series.iloc[np.unique(np.concatenate([selected, *extra]))]
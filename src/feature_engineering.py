@@ -1,51 +1,181 @@
 # src/feature_engineering.py
+import logging
 import pandas as pd
 import numpy as np
+from storage import load_frame, resolve_dataset, save_frame
+from utils import timed
+from logging_config import configure_logging
 
-def add_lag_features(df: pd.DataFrame, column: str, lags: list = [1, 2, 3, 24]):
+logger = logging.getLogger(__name__)
+
+# Declarative description of the features built by build_feature_matrix
+DEFAULT_FEATURE_SPEC = {
+    'lags': (1, 2, 3, 24),              # shifts of the target column, in periods
+    'rolling_windows': (3, 6, 24),      # trailing window sizes, in periods
+    'rolling_stats': ('mean',),         # any of 'mean', 'std', 'min', 'max'
+    'fourier': ((24, 3),),              # (period, order) pairs of sine/cosine terms
+    'calendar': (),                     # any of 'hour', 'day_of_week', 'month', 'day_of_year', 'is_weekend'
+}
+
+CALENDAR_FEATURES = {
+    'hour': lambda index: index.hour,
+    'day_of_week': lambda index: index.dayofweek,
+    'month': lambda index: index.month,
+    'day_of_year': lambda index: index.dayofyear,
+    'is_weekend': lambda index: index.dayofweek >= 5,
+}
+
+def feature_names(column: str, spec: dict):
+    """
+    Names of the columns produced by build_feature_matrix, in order.
+    """
+    names = [f'{column}_lag_{lag}' for lag in spec.get('lags', ())]
+    names += [f'{column}_rolling_{stat}_{window}'
+              for window in spec.get('rolling_windows', ()) for stat in spec.get('rolling_stats', ('mean',))]
+    for period, order in spec.get('fourier', ()):
+        for i in range(1, order + 1):
+            names += [f'sin_{period}_{i}', f'cos_{period}_{i}']
+    names += list(spec.get('calendar', ()))
+    return names
+
+def short_fourier_names(features: pd.DataFrame, period: int):
+    """
+    Rename the Fourier columns of one period from sin_<period>_<i>/cos_<period>_<i> to
+    sin_<i>/cos_<i>, the names used by add_fourier_features and the enhanced dataset.
+    The feature block is not copied.
+    """
+    features.columns = [name.replace(f'sin_{period}_', 'sin_').replace(f'cos_{period}_', 'cos_')
+                        for name in features.columns]
+    return features
+
+def _window_sums(values: np.ndarray, window: int):
+    """
+    Trailing window sums of values and of squared values, plus a mask of the windows that are
+    complete and contain no NaN, from cumulative sums. Values are centered first to limit
+    cancellation error in the differences.
+    """
+    valid = ~np.isnan(values)
+    offset = values[valid].mean() if valid.any() else 0.0
+    centered = np.where(valid, values - offset, 0.0)
+    sums = np.concatenate(([0.0], np.cumsum(centered)))
+    squares = np.concatenate(([0.0], np.cumsum(centered ** 2)))
+    nan_counts = np.concatenate(([0], np.cumsum(~valid)))
+    n = len(values)
+    ok = np.zeros(n, dtype=bool)
+    if n >= window:
+        ok[window - 1:] = (nan_counts[window:] - nan_counts[:-window]) == 0
+    window_sum = np.full(n, np.nan)
+    window_squares = np.full(n, np.nan)
+    window_sum[window - 1:] = sums[window:] - sums[:n - window + 1]
+    window_squares[window - 1:] = squares[window:] - squares[:n - window + 1]
+    return window_sum, window_squares, ok, offset
+
+def _rolling(values: np.ndarray, window: int, stats: tuple, out: np.ndarray):
+    """
+    Write trailing rolling statistics (NaN unless the full window is present) into the
+    columns of `out`, one per requested stat.
+    """
+    n = len(values)
+    if {'mean', 'std'} & set(stats):
+        window_sum, window_squares, ok, offset = _window_sums(values, window)
+    if {'min', 'max'} & set(stats) and n >= window:
+        windows = np.lib.stride_tricks.sliding_window_view(values, window)
+    for j, stat in enumerate(stats):
+        col = out[:, j]
+        if stat == 'mean':
+            col[:] = np.where(ok, window_sum / window + offset, np.nan)
+        elif stat == 'std':
+            var = (window_squares - window_sum ** 2 / window) / (window - 1) if window > 1 else np.nan
+            col[:] = np.where(ok, np.sqrt(np.maximum(var, 0.0)), np.nan)
+        elif stat in ('min', 'max'):
+            col[:window - 1] = np.nan
+            if n >= window:
+                col[window - 1:] = windows.min(axis=1) if stat == 'min' else windows.max(axis=1)
+        else:
+            raise ValueError(f'Unknown rolling statistic: {stat}')
+
+@timed()
+def build_feature_matrix(df: pd.DataFrame, column: str = None, spec: dict = None, dtype='float64', start: int = 0):
+    """
+    Build all features described by a spec into one preallocated block, using vectorized
+    operations, and return them as a DataFrame backed by that block. The input is not modified.
+    :param df: DataFrame with datetime index.
+    :param column: Column from which lag and rolling features are built.
+    :param spec: Feature spec; see DEFAULT_FEATURE_SPEC.
+    :param dtype: dtype of the feature block, e.g. 'float32' to halve its memory.
+    :param start: Position of the first row in the full series, when df is only its tail.
+    """
+    spec = DEFAULT_FEATURE_SPEC if spec is None else spec
+    names = feature_names(column, spec)
+    n = len(df)
+    # Column-major, so every feature is contiguous and the frame can wrap the block as is
+    block = np.empty((n, len(names)), dtype=dtype, order='F')
+    values = df[column].to_numpy(dtype='float64') if column is not None else None
+
+    j = 0
+    for lag in spec.get('lags', ()):
+        block[:min(lag, n), j] = np.nan
+        if lag < n:
+            block[lag:, j] = values[:n - lag]
+        j += 1
+    stats = tuple(spec.get('rolling_stats', ('mean',)))
+    for window in spec.get('rolling_windows', ()):
+        _rolling(values, window, stats, block[:, j:j + len(stats)])
+        j += len(stats)
+    t = np.arange(start, start + n, dtype='float64')
+    for period, order in spec.get('fourier', ()):
+        angles = (2 * np.pi / period) * t[:, None] * np.arange(1, order + 1)
+        block[:, j:j + 2 * order:2] = np.sin(angles)
+        block[:, j + 1:j + 2 * order:2] = np.cos(angles)
+        j += 2 * order
+    for name in spec.get('calendar', ()):
+        block[:, j] = CALENDAR_FEATURES[name](df.index)
+        j += 1
+
+    return pd.DataFrame(block, index=df.index, columns=names, copy=False)
+
+@timed()
+def add_lag_features(df: pd.DataFrame, column: str, lags: tuple = (1, 2, 3, 24)):
     """
     Create lag features for a given column.
     :param df: DataFrame with datetime index.
     :param column: Column for which to create lag features.
     :param lags: List of lag intervals (e.g., hours).
     """
-    for lag in lags:
-        df[f'{column}_lag_{lag}'] = df[column].shift(lag)
-    return df
+    return pd.concat([df, build_feature_matrix(df, column, {'lags': lags})], axis=1)
 
-def add_rolling_features(df: pd.DataFrame, column: str, windows: list = [3, 6, 24]):
+@timed()
+def add_rolling_features(df: pd.DataFrame, column: str, windows: tuple = (3, 6, 24)):
     """
     Create rolling mean features for a given column.
     :param df: DataFrame with datetime index.
     :param column: Column for which to create rolling features.
     :param windows: List of window sizes (in number of periods).
     """
-    for window in windows:
-        df[f'{column}_rolling_mean_{window}'] = df[column].rolling(window=window).mean()
-    return df
+    return pd.concat([df, build_feature_matrix(df, column, {'rolling_windows': windows})], axis=1)
 
-def add_fourier_features(df: pd.DataFrame, period: int = 24, order: int = 3):
+@timed()
+def add_fourier_features(df: pd.DataFrame, period: int = 24, order: int = 3, start: int = 0):
     """
     Add Fourier series features to capture seasonality.
     :param df: DataFrame with datetime index.
     :param period: The period of the seasonality (e.g., 24 for hourly data).
     :param order: Number of sine/cosine pairs to add.
+    :param start: Position of the first row in the full series, when df is only its tail.
     """
-    t = np.arange(len(df))
-    for i in range(1, order + 1):
-        df[f'sin_{i}'] = np.sin(2 * np.pi * i * t / period)
-        df[f'cos_{i}'] = np.cos(2 * np.pi * i * t / period)
-    return df
+    features = build_feature_matrix(df, spec={'fourier': ((period, order),)}, start=start)
+    return pd.concat([df, short_fourier_names(features, period)], axis=1)
 
 if __name__ == "__main__":
+    configure_logging()
     # Example usage: load processed data, add features, and save the updated file.
-    processed_path = "data/processed/household_power_consumption_processed.csv"
-    df = pd.read_csv(processed_path, index_col="Datetime", parse_dates=True)
+    processed_path = resolve_dataset("data/processed/household_power_consumption_processed")
+    df = load_frame(processed_path, freq="H")
     
     df = add_lag_features(df, "Global_active_power")
     df = add_rolling_features(df, "Global_active_power")
     df = add_fourier_features(df, period=24, order=3)
     
-    enhanced_path = "data/processed/household_power_consumption_enhanced.csv"
-    df.to_csv(enhanced_path)
-    print(f"Enhanced features saved to {enhanced_path}")
+    enhanced_path = "data/processed/household_power_consumption_enhanced.parquet"
+    save_frame(df, enhanced_path)
+    logger.info(f"Enhanced features saved to {enhanced_path}")
@@ -0,0 +1,462 @@
+# src/forecast_service.py
+import os
+import json
+import time
+import queue
+import logging
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import Future
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from forecasting_model import load_processed_data
+from anomaly_detection import IsolationForestAnomalyModel, residual_features
+from model_store import load_model, load_metadata
+from data_pipeline import (MODEL_DIR, ENHANCED_STEM, TARGET, TRAIN_MODEL_NAME, ISOLATION_FOREST_NAME,
+                           ANOMALY_THRESHOLD)
+from logging_config import configure_logging
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds on a single request
+MAX_HORIZON = 24 * 14
+MAX_READINGS = 24 * 31
+# Requests are collected for up to MAX_WAIT seconds (or MAX_BATCH requests) per model call
+MAX_BATCH = 256
+MAX_WAIT = 0.002
+FORECAST_TTL = 300.0
+LATENCY_SAMPLES = 10_000
+
+StubResponse = namedtuple("StubResponse", ["status", "json"])
+
+class UnknownMeter(LookupError):
+    """
+    No model is loaded for the requested meter; answered with 404.
+    """
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire `ttl` seconds after they were stored.
+    """
+
+    def __init__(self, ttl: float = FORECAST_TTL, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+class MicroBatcher:
+    """
+    Collect requests submitted from many threads and hand them to `process` in batches: a
+    batch closes `max_wait` seconds after its first request or once it holds `max_batch`
+    requests. `process` receives a list of requests and returns one result per request
+    (an exception instance fails only that request). A single worker thread calls
+    `process`, so the models it uses are never accessed concurrently.
+    """
+
+    def __init__(self, process, max_batch: int = MAX_BATCH, max_wait: float = MAX_WAIT):
+        self.process = process
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.batches = 0
+        self.thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, request, timeout: float = 30.0):
+        future = Future()
+        self.queue.put((request, future))
+        return future.result(timeout=timeout)
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self.queue.put(None)  # stop after this batch
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            batch = self._collect(item)
+            self.batches += 1
+            try:
+                results = self.process([request for request, _ in batch])
+            except Exception as e:
+                results = [e] * len(batch)
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def _records(frame: pd.DataFrame):
+    """
+    Rows of a time-indexed frame as JSON-ready dicts, with missing values as None.
+    """
+    rows = []
+    for timestamp, row in zip(frame.index, frame.to_dict("records")):
+        rows.append({"Datetime": timestamp.isoformat(),
+                     **{key: None if isinstance(value, float) and np.isnan(value) else value
+                        for key, value in row.items()}})
+    return rows
+
+def parse_readings(readings: list):
+    """
+    Readings given as [{"Datetime": ..., "value": ...}, ...] as an hourly Series.
+    """
+    if not isinstance(readings, list) or not readings:
+        raise ValueError("readings must be a non-empty list")
+    if len(readings) > MAX_READINGS:
+        raise ValueError(f"At most {MAX_READINGS} readings per request")
+    try:
+        index = pd.DatetimeIndex([reading["Datetime"] for reading in readings], name="Datetime")
+        values = [np.nan if reading["value"] is None else float(reading["value"]) for reading in readings]
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Every reading needs a Datetime and a value ({e})")
+    if index.tz is not None:
+        raise ValueError("Datetimes must be naive local times, as in the dataset")
+    if not index.is_monotonic_increasing or not index.is_unique:
+        raise ValueError("Readings must be in increasing time order without duplicates")
+    if (index != index.floor("h")).any():
+        raise ValueError("Readings must be at whole hours")
+    return pd.Series(values, index=index, dtype="float64")
+
+class ForecastService:
+    """
+    Serve forecasts and anomaly scores from models held in memory. All model calls go
+    through one MicroBatcher, so concurrent requests for a meter share a single forecast
+    (of the longest horizon asked for) or a single prediction and Isolation Forest call.
+    Forecasts are cached for `ttl` seconds.
+    """
+
+    def __init__(self, models: dict, iso_model: IsolationForestAnomalyModel = None, history: dict = None,
+                 iso_meter: str = TARGET, threshold: float = ANOMALY_THRESHOLD, ttl: float = FORECAST_TTL,
+                 max_batch: int = MAX_BATCH, max_wait: float = MAX_WAIT):
+        """
+        :param models: Meter id to (fitted ARIMA results, model-store metadata).
+        :param iso_model: Isolation Forest for the residuals of `iso_meter`, if any.
+        :param history: Meter id to its hourly series, used as context for the rolling
+                        residual statistics of scored readings.
+        :param threshold: Residual anomaly threshold in residual standard deviations.
+        """
+        self.models = models
+        self.iso_model = iso_model
+        self.iso_meter = iso_meter
+        self.history = history or {}
+        self.threshold = threshold
+        self.cache = TTLCache(ttl)
+        self.batcher = MicroBatcher(self._process_batch, max_batch=max_batch, max_wait=max_wait)
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.counters = {"requests": 0, "errors": 0, "cache_hits": 0, "model_calls": 0}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_store(cls, model_dir: str = MODEL_DIR, enhanced_file: str = ENHANCED_STEM + ".parquet", **kwargs):
+        """
+        Load every stored ARIMA model (except the training-span one), the Isolation Forest
+        and the target column of the enhanced dataset once.
+        """
+        models = {}
+        for file_name in sorted(os.listdir(model_dir)):
+            name, extension = os.path.splitext(file_name)
+            if extension != ".json" or name in (TRAIN_MODEL_NAME, ISOLATION_FOREST_NAME):
+                continue
+            if "order" in load_metadata(model_dir, name):
+                models[name] = load_model(model_dir, name)
+        iso_model = IsolationForestAnomalyModel.load(model_dir, ISOLATION_FOREST_NAME)
+        history = {}
+        if os.path.exists(enhanced_file):
+            history[TARGET] = load_processed_data(enhanced_file, columns=[TARGET])[TARGET]
+        logger.info(f"Loaded models for {len(models)} meters: {', '.join(models)}")
+        return cls(models, iso_model=iso_model, history=history, **kwargs)
+
+    def _model(self, meter: str):
+        if meter not in self.models:
+            raise UnknownMeter(f"Unknown meter: {meter}")
+        return self.models[meter]
+
+    def forecast(self, meter: str, hours: int):
+        """
+        Forecast the `hours` hours following the latest observation of a meter.
+        :return: The forecast Series and whether it was served from the cache.
+        """
+        self._model(meter)
+        if not 1 <= hours <= MAX_HORIZON:
+            raise ValueError(f"hours must be between 1 and {MAX_HORIZON}")
+        # A cached longer forecast also answers shorter horizons
+        cached = self.cache.get(meter)
+        if cached is not None and len(cached) >= hours:
+            with self.lock:
+                self.counters["cache_hits"] += 1
+            return cached.iloc[:hours], True
+        return self.batcher.submit(("forecast", meter, hours)), False
+
+    def score(self, meter: str, readings: pd.Series):
+        """
+        Score readings against the model's predictions: one-step-ahead within the span the
+        model has seen and multi-step after it.
+        :return: DataFrame with the prediction, residual, z-score and anomaly flags.
+        """
+        model_fit, _ = self._model(meter)
+        if readings.index[0] < model_fit.data.row_labels[0]:
+            raise ValueError(f"Readings start before the model's data ({model_fit.data.row_labels[0]})")
+        return self.batcher.submit(("score", meter, readings))
+
+    def _process_batch(self, requests: list):
+        results = [None] * len(requests)
+        groups = {}
+        for position, (kind, meter, _) in enumerate(requests):
+            groups.setdefault((kind, meter), []).append(position)
+        for (kind, meter), positions in groups.items():
+            try:
+                if kind == "forecast":
+                    forecast = self._forecast_batch(meter, max(requests[i][2] for i in positions))
+                    outputs = [forecast.iloc[:requests[i][2]] for i in positions]
+                else:
+                    outputs = self._score_batch(meter, [requests[i][2] for i in positions])
+            except Exception as e:
+                logger.exception(f"Failed to {kind} {meter}")
+                outputs = [e] * len(positions)
+            for position, output in zip(positions, outputs):
+                results[position] = output
+        return results
+
+    def _forecast_batch(self, meter: str, hours: int):
+        model_fit, _ = self.models[meter]
+        forecast = model_fit.forecast(steps=hours).rename(meter)
+        forecast.index.name = "Datetime"
+        with self.lock:
+            self.counters["model_calls"] += 1
+        cached = self.cache.get(meter)
+        if cached is None or len(cached) < hours:
+            self.cache.put(meter, forecast)
+        return forecast
+
+    def _score_batch(self, meter: str, batch: list):
+        """
+        Score several requests' readings with one prediction call and one Isolation Forest call.
+        """
+        model_fit, metadata = self.models[meter]
+        first_seen = model_fit.data.row_labels[0]
+        use_forest = self.iso_model is not None and meter == self.iso_meter
+        window = self.iso_model.rolling_window if use_forest else 1
+        history = self.history.get(meter)
+        hour = pd.Timedelta(hours=1)
+
+        # Readings preceded by stored history, for complete rolling statistics
+        actuals = []
+        for readings in batch:
+            context_start = max(readings.index[0] - (window - 1) * hour, first_seen)
+            context = (history.loc[context_start:readings.index[0] - hour].astype("float64")
+                       if history is not None and window > 1 else readings.iloc[:0])
+            actuals.append(pd.concat([context, readings]))
+        predicted = model_fit.predict(start=min(actual.index[0] for actual in actuals),
+                                      end=max(readings.index[-1] for readings in batch))
+        with self.lock:
+            self.counters["model_calls"] += 1
+
+        outputs = []
+        for readings in batch:
+            result = pd.DataFrame({"value": readings, "predicted": predicted.reindex(readings.index)})
+            result["residual"] = result["value"] - result["predicted"]
+            result["zscore"] = result["residual"] / metadata["resid_std"]
+            result["is_anomaly"] = result["zscore"].abs() > self.threshold
+            outputs.append(result)
+        if use_forest:
+            features = pd.concat({position: residual_features(actual, predicted.reindex(actual.index), window)
+                                  .loc[readings.index[0]:]
+                                  for position, (actual, readings) in enumerate(zip(actuals, batch))})
+            if not features.empty:
+                scores = self.iso_model.score_features(features)
+                scored = {position: group.droplevel(0) for position, group in scores.groupby(level=0)}
+                for position, result in enumerate(outputs):
+                    if position in scored:
+                        result["isolation_score"] = scored[position]["score"].reindex(result.index)
+                        result["isolation_anomaly"] = scored[position]["is_anomaly"].reindex(result.index,
+                                                                                              fill_value=False)
+        return outputs
+
+    def handle(self, method: str, path: str, query: dict = None, body: bytes = b""):
+        """
+        Answer one API request; shared by the HTTP server and StubClient.
+        :param query: Query parameters as parsed by urllib.parse.parse_qs.
+        :return: HTTP status and JSON-ready payload.
+        """
+        query = query or {}
+        start = time.perf_counter()
+        try:
+            if method == "GET" and path == "/forecast":
+                meter = query.get("meter", [TARGET])[0]
+                forecast, cached = self.forecast(meter, int(query.get("hours", ["24"])[0]))
+                status, payload = 200, {"meter": meter, "cached": cached,
+                                        "forecast": _records(forecast.to_frame("value"))}
+            elif method == "POST" and path == "/score":
+                request = json.loads(body or b"{}")
+                if not isinstance(request, dict):
+                    raise ValueError("The request body must be a JSON object")
+                meter = request.get("meter", TARGET)
+                scores = self.score(meter, parse_readings(request.get("readings")))
+                status, payload = 200, {"meter": meter, "scores": _records(scores)}
+            elif method == "GET" and path == "/health":
+                status, payload = 200, {"status": "ok", "meters": sorted(self.models)}
+            elif method == "GET" and path == "/stats":
+                status, payload = 200, self.stats()
+            else:
+                status, payload = 404, {"error": f"No route for {method} {path}"}
+        except UnknownMeter as e:
+            status, payload = 404, {"error": str(e)}
+        except ValueError as e:
+            status, payload = 400, {"error": str(e)}
+        except Exception as e:
+            logger.exception(f"{method} {path} failed")
+            status, payload = 500, {"error": str(e)}
+        with self.lock:
+            self.counters["requests"] += 1
+            self.counters["errors"] += status >= 400
+            self.latencies.append(time.perf_counter() - start)
+        return status, payload
+
+    def stats(self):
+        """
+        Request counters, batching figures and latency percentiles (ms) of recent requests.
+        """
+        with self.lock:
+            latencies = np.array(self.latencies) * 1000
+            stats = dict(self.counters)
+        stats["batches"] = self.batcher.batches
+        for name, q in (("p50_ms", 50), ("p99_ms", 99)):
+            stats[name] = float(np.percentile(latencies, q)) if len(latencies) else None
+        return stats
+
+    def close(self):
+        self.batcher.close()
+
+class StubClient:
+    """
+    In-process client for tests: calls ForecastService.handle directly instead of going
+    over HTTP, with payloads round-tripped through JSON as the server would send them.
+    """
+
+    def __init__(self, service: ForecastService):
+        self.service = service
+
+    def _call(self, method: str, path: str, query: dict, body: bytes):
+        status, payload = self.service.handle(method, path, query, body)
+        return StubResponse(status, json.loads(json.dumps(payload, default=_json_default)))
+
+    def get(self, path: str, **params):
+        return self._call("GET", path, {key: [str(value)] for key, value in params.items()}, b"")
+
+    def post(self, path: str, payload: dict):
+        return self._call("POST", path, {}, json.dumps(payload, default=_json_default).encode())
+
+def make_handler(service: ForecastService):
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive connections avoid a TCP handshake per request
+        protocol_version = "HTTP/1.1"
+
+        def _respond(self, method: str):
+            url = urlparse(self.path)
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            status, payload = service.handle(method, url.path, parse_qs(url.query), body)
+            data = json.dumps(payload, default=_json_default).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._respond("GET")
+
+        def do_POST(self):
+            self._respond("POST")
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return Handler
+
+class ServiceHTTPServer(ThreadingHTTPServer):
+    # Room for hundreds of simultaneous connection attempts
+    request_queue_size = 1024
+    daemon_threads = True
+
+def make_server(service: ForecastService, host: str = "127.0.0.1", port: int = 8000):
+    """
+    HTTP server with one thread per connection; port 0 picks a free port.
+    """
+    return ServiceHTTPServer((host, port), make_handler(service))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve forecasts and anomaly scores over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--threshold", type=float, default=ANOMALY_THRESHOLD, help="Residual anomaly threshold.")
+    parser.add_argument("--ttl", type=float, default=FORECAST_TTL, help="Seconds a forecast stays cached.")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT * 1000, help="Batching window.")
+    args = parser.parse_args()
+
+    configure_logging()
+    service = ForecastService.from_store(args.model_dir, threshold=args.threshold, ttl=args.ttl,
+                                         max_batch=args.max_batch, max_wait=args.max_wait_ms / 1000)
+    server = make_server(service, args.host, args.port)
+    logger.info(f"Serving on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
@@ -1,36 +1,161 @@
 # src/forecasting_model.py
+import logging
+import os
+import json
+import time
+import signal
+import hashlib
+import threading
+import contextlib
 import pandas as pd
 import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
 from statsmodels.tsa.arima.model import ARIMA
 import itertools
+from storage import load_frame, resolve_dataset, save_frame
+from utils import timed, write_json_atomic
+from logging_config import configure_logging
 
-def load_processed_data(file_path: str):
+logger = logging.getLogger(__name__)
+
+# Hours of one-step residuals kept with a stored model, and how many drift detection needs
+DRIFT_WINDOW = 168
+DRIFT_MIN_COUNT = 24
+
+def load_processed_data(file_path: str, columns: list = None, start=None, end=None, full_precision: bool = False):
+    """
+    Load the processed data with a datetime index and enforce an hourly frequency.
+    :param columns: Optional subset of columns to load.
+    :param start: Optional inclusive start of the time range to load.
+    :param end: Optional inclusive end of the time range to load.
+    :param full_precision: Load float64/int64 columns instead of the compact schema.
+    """
+    return load_frame(file_path, columns=columns, start=start, end=end, freq='H', full_precision=full_precision)
+
+
+def series_hash(series: pd.Series):
+    """
+    Hash the values and index of a series, to key cached results on the exact training data.
+    """
+    return hashlib.sha1(pd.util.hash_pandas_object(series, index=True).values.tobytes()).hexdigest()
+
+@contextlib.contextmanager
+def _time_limit(seconds: float):
+    """
+    Raise TimeoutError if the block runs longer than `seconds`. Only enforced where
+    SIGALRM is available and we are on the main thread (as in pool worker processes).
     """
-    Load the processed CSV data with a datetime index and enforce an hourly frequency.
+    if not seconds or not hasattr(signal, 'SIGALRM') or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def _raise_timeout(signum, frame):
+        raise TimeoutError(f'fit exceeded {seconds}s')
+
+    previous = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+def _fit_candidate(series: pd.Series, order: tuple, timeout: float = None):
+    """
+    Fit a single ARIMA candidate and return its AIC, fit time and failure reason, if any.
+    """
+    start = time.perf_counter()
+    try:
+        with _time_limit(timeout):
+            aic = ARIMA(series, order=order).fit().aic
+        error = None
+    except Exception as e:
+        aic, error = float('inf'), f'{type(e).__name__}: {e}'
+    return {'order': order, 'aic': aic, 'fit_time': time.perf_counter() - start, 'error': error}
+
+def _load_aic_cache(cache_path: str):
+    if cache_path is None or not os.path.exists(cache_path):
+        return {}
+    with open(cache_path) as f:
+        return json.load(f)
+
+def _fit_candidates(series: pd.Series, orders: list, stage: str, workers: int, timeout: float, cache: dict):
+    """
+    Fit candidates that are not already cached, fanning them out over a process pool.
     """
-    df = pd.read_csv(file_path, index_col='Datetime', parse_dates=True)
-    df = df.asfreq('H')  # Reassign frequency since CSV does not store freq metadata
-    return df
+    key_prefix = series_hash(series)
+    results, pending = [], []
+    for order in orders:
+        cached = cache.get(f'{key_prefix}:{order}')
+        if cached is not None:
+            results.append({'order': order, 'aic': cached['aic'], 'fit_time': 0.0,
+                            'error': cached['error'], 'cached': True})
+        else:
+            pending.append(order)
 
+    if workers == 1 or len(pending) <= 1:
+        fitted = [_fit_candidate(series, order, timeout) for order in pending]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as executor:
+            fitted = list(executor.map(_fit_candidate, [series] * len(pending), pending, [timeout] * len(pending)))
 
-def grid_search_arima(series: pd.Series, p_values: list, d_values: list, q_values: list):
+    for result in fitted:
+        result['cached'] = False
+        results.append(result)
+        # Timeouts depend on machine load, so only deterministic outcomes are memoized
+        if result['error'] is None or not result['error'].startswith('TimeoutError'):
+            cache[f'{key_prefix}:{result["order"]}'] = {'aic': result['aic'], 'error': result['error']}
+    for result in results:
+        result['stage'] = stage
+    return results
+
+def search_arima_orders(series: pd.Series, p_values: list, d_values: list, q_values: list, workers: int = None,
+                        timeout: float = None, screen_size: int = None, screen_top: int = 3, cache_path: str = None):
+    """
+    Fit ARIMA candidates in parallel and report the AIC of each.
+    :param workers: Number of worker processes (defaults to the number of CPUs).
+    :param timeout: Maximum seconds per fit; slower candidates are reported as failed.
+    :param screen_size: If given, first fit every candidate on the last `screen_size`
+                        points and only fit the best `screen_top` on the full series.
+    :param screen_top: Number of screened candidates kept for full-length fits.
+    :param cache_path: JSON file memoizing AIC results by series hash and order, so an
+                       unchanged training set never triggers a refit.
+    :return: DataFrame with one row per fit: order, stage, aic, fit_time, error, cached.
+    """
+    workers = workers or os.cpu_count()
+    cache = _load_aic_cache(cache_path)
+    orders = list(itertools.product(p_values, d_values, q_values))
+
+    report = []
+    if screen_size is not None and len(series) > screen_size:
+        screened = _fit_candidates(series[-screen_size:], orders, 'screen', workers, timeout, cache)
+        report.extend(screened)
+        ranked = sorted((r for r in screened if r['error'] is None), key=lambda r: r['aic'])
+        orders = [r['order'] for r in ranked[:screen_top]]
+    report.extend(_fit_candidates(series, orders, 'full', workers, timeout, cache))
+
+    if cache_path is not None:
+        write_json_atomic(cache_path, cache)
+    return pd.DataFrame(report, columns=['order', 'stage', 'aic', 'fit_time', 'error', 'cached'])
+
+@timed()
+def grid_search_arima(series: pd.Series, p_values: list, d_values: list, q_values: list, **search_kwargs):
     """
     Perform a grid search to find the best ARIMA parameters based on AIC.
+    Keyword arguments are passed to search_arima_orders (workers, timeout, screening, cache).
     """
-    best_score, best_cfg = float("inf"), None
-    for p, d, q in itertools.product(p_values, d_values, q_values):
-        order = (p, d, q)
-        try:
-            model = ARIMA(series, order=order)
-            model_fit = model.fit()
-            aic = model_fit.aic
-            if aic < best_score:
-                best_score, best_cfg = aic, order
-        except Exception:
-            continue
-    print(f'Best ARIMA order: {best_cfg} with AIC {best_score}')
+    report = search_arima_orders(series, p_values, d_values, q_values, **search_kwargs)
+    logger.info(report.to_string(index=False))
+    full = report[(report['stage'] == 'full') & report['error'].isna() & report['aic'].notna()]
+    if full.empty:
+        best_score, best_cfg = float("inf"), None
+    else:
+        best = full.loc[full['aic'].idxmin()]
+        best_score, best_cfg = best['aic'], tuple(best['order'])
+    logger.info(f'Best ARIMA order: {best_cfg} with AIC {best_score}')
     return best_cfg
 
+@timed()
 def train_arima_model(series: pd.Series, order=(1, 1, 1)):
     """
     Fit an ARIMA model to the given time series data.
@@ -39,6 +164,78 @@ def train_arima_model(series: pd.Series, order=(1, 1, 1)):
     model_fit = model.fit()
     return model_fit
 
+def model_metadata(model_fit, train: pd.Series, order: tuple, fit_time: float):
+    """
+    Describe a fitted model for the model store.
+    """
+    resid = model_fit.resid.iloc[model_fit.loglikelihood_burn:]
+    return {
+        'order': list(order),
+        'train_hash': series_hash(train),
+        'train_start': train.index[0].isoformat(),
+        'train_end': train.index[-1].isoformat(),
+        'fit_time': fit_time,
+        'fitted_at': pd.Timestamp.now().isoformat(),
+        'resid_std': float(resid.std()),
+        # Seeds the rolling window of one-step residuals that needs_refit checks for drift
+        'recent_resid': resid.dropna().iloc[-DRIFT_WINDOW:].tolist(),
+    }
+
+@timed()
+def fit_arima_with_metadata(series: pd.Series, order: tuple):
+    """
+    Fit an ARIMA model and return it together with its model-store metadata.
+    """
+    start = time.perf_counter()
+    model_fit = train_arima_model(series, order=order)
+    return model_fit, model_metadata(model_fit, series, order, time.perf_counter() - start)
+
+@timed()
+def update_arima_model(model_fit, new_obs: pd.Series):
+    """
+    Extend a fitted model with new observations by running the Kalman filter with the
+    already estimated parameters, without re-estimating them. Observations at or before
+    the last one the model has seen are ignored.
+    """
+    last_seen = model_fit.data.row_labels[-1]
+    new_obs = new_obs[new_obs.index > last_seen]
+    if new_obs.empty:
+        return model_fit
+    return model_fit.append(new_obs.asfreq('H'), refit=False)
+
+def record_residuals(metadata: dict, resid: pd.Series, window: int = DRIFT_WINDOW):
+    """
+    Add one-step residuals of newly filtered observations to the rolling window kept in a
+    model's metadata, which holds the last `window` of them.
+    :return: The updated metadata (a copy).
+    """
+    recent = metadata.get('recent_resid', []) + [float(r) for r in resid.dropna()]
+    return {**metadata, 'recent_resid': recent[-window:]}
+
+def needs_refit(model_fit, metadata: dict, new_obs: pd.Series, refit_every: pd.Timedelta = pd.Timedelta(days=7),
+                drift_threshold: float = 2.0, min_count: int = DRIFT_MIN_COUNT, now: pd.Timestamp = None):
+    """
+    Decide whether a stored model should be re-estimated after it was extended with new_obs.
+    Returns the reason for a refit, or None. Record the residuals of new_obs with
+    record_residuals first.
+    :param refit_every: Refit once this much time has passed since the parameters were
+                        estimated (metadata 'fitted_at').
+    :param drift_threshold: Refit when the mean absolute one-step residual over the rolling
+                            window exceeds this many in-sample residual standard deviations.
+    :param min_count: Residuals the window must hold before drift is judged, so a single
+                      outlying hour does not force a refit.
+    :param now: Current time (for tests).
+    """
+    if new_obs.empty:
+        return None
+    now = pd.Timestamp.now() if now is None else pd.Timestamp(now)
+    if now - pd.Timestamp(metadata['fitted_at']) >= refit_every:
+        return 'schedule'
+    recent = pd.Series(metadata.get('recent_resid', []), dtype='float64').abs()
+    if len(recent) >= min_count and recent.mean() > drift_threshold * metadata['resid_std']:
+        return 'drift'
+    return None
+
 def plot_forecast(train, test, forecast):
     """
     Plot the training data, test data, and forecasted values.
@@ -55,8 +252,9 @@ def plot_forecast(train, test, forecast):
     plt.show()
 
 if __name__ == "__main__":
-    processed_file = "data/processed/household_power_consumption_enhanced.csv"
-    df = load_processed_data(processed_file)
+    configure_logging()
+    processed_file = resolve_dataset("data/processed/household_power_consumption_enhanced")
+    df = load_processed_data(processed_file, columns=['Global_active_power'])
     series = df['Global_active_power']
     
     # Split data: 80% training, 20% testing
@@ -71,7 +269,6 @@ if __name__ == "__main__":
     
     forecast_df = forecast.to_frame(name='Global_active_power')
     forecast_df.index.name = 'Datetime'  # Ensure the index is named
-    # Save with index_label to include the index header in the CSV file
-    forecast_df.to_csv("data/processed/arima_forecast.csv", index_label='Datetime')
-    print("Forecasting complete and saved.")
+    save_frame(forecast_df, "data/processed/arima_forecast.parquet")
+    logger.info("Forecasting complete and saved.")
 
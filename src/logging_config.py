@@ -0,0 +1,44 @@
+# src/logging_config.py
+import os
+import json
+import logging
+
+# Set ENERGY_LOG_FORMAT=json to emit one JSON object per log line
+LOG_FORMAT_ENV = "ENERGY_LOG_FORMAT"
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format records as JSON lines. Metrics attached with `extra={'metrics': {...}}` are
+    included as a nested object.
+    """
+
+    def format(self, record: logging.LogRecord):
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        metrics = getattr(record, "metrics", None)
+        if metrics is not None:
+            entry["metrics"] = metrics
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+def configure_logging(level=logging.INFO, json_format: bool = None, log_file: str = None):
+    """
+    Configure the root logger for the pipeline scripts.
+    :param json_format: Emit JSON lines; defaults to the ENERGY_LOG_FORMAT environment variable.
+    :param log_file: Optional file to log to in addition to stderr.
+    """
+    if json_format is None:
+        json_format = os.environ.get(LOG_FORMAT_ENV, "").lower() == "json"
+    formatter = JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if log_file is not None:
+        handlers.append(logging.FileHandler(log_file))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    logging.basicConfig(level=level, handlers=handlers, force=True)
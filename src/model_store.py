@@ -0,0 +1,42 @@
+# src/model_store.py
+import os
+import json
+import pickle
+
+def _paths(store_dir: str, name: str):
+    return os.path.join(store_dir, f"{name}.pkl"), os.path.join(store_dir, f"{name}.json")
+
+def save_model(model_fit, store_dir: str, name: str, metadata: dict):
+    """
+    Serialize a fitted model and its metadata (order, training-span hash, fit time, ...).
+    Both files are written to temporary paths first and renamed into place.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    model_path, metadata_path = _paths(store_dir, name)
+    with open(model_path + ".tmp", "wb") as f:
+        pickle.dump(model_fit, f, protocol=pickle.HIGHEST_PROTOCOL)
+    with open(metadata_path + ".tmp", "w") as f:
+        json.dump(metadata, f, indent=2, default=str)
+    os.replace(model_path + ".tmp", model_path)
+    os.replace(metadata_path + ".tmp", metadata_path)
+
+def load_metadata(store_dir: str, name: str):
+    """
+    Load only the metadata of a stored model, or None if there is no such model.
+    """
+    metadata_path = _paths(store_dir, name)[1]
+    if not os.path.exists(metadata_path):
+        return None
+    with open(metadata_path) as f:
+        return json.load(f)
+
+def load_model(store_dir: str, name: str):
+    """
+    Load a stored model and its metadata. Returns (None, None) if there is no such model.
+    """
+    model_path = _paths(store_dir, name)[0]
+    metadata = load_metadata(store_dir, name)
+    if metadata is None or not os.path.exists(model_path):
+        return None, None
+    with open(model_path, "rb") as f:
+        return pickle.load(f), metadata
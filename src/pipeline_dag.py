@@ -0,0 +1,149 @@
+# src/pipeline_dag.py
+import os
+import json
+import time
+import logging
+import hashlib
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from utils import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+class Stage:
+    """
+    One step of a pipeline. Stages exchange data only through files: a stage depends on
+    the stages whose outputs it reads, and its params are passed to func as keyword arguments.
+    """
+
+    def __init__(self, name: str, func, inputs=(), outputs=(), params: dict = None):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = params or {}
+
+def _run_stage(func, params: dict):
+    # Module-level so it can be sent to worker processes
+    start = time.perf_counter()
+    func(**params)
+    return time.perf_counter() - start
+
+def _file_stat(path: str):
+    if os.path.isdir(path):
+        # A partitioned dataset: its total size and latest change, including removed files
+        stats = [_file_stat(os.path.join(path, name)) for name in sorted(os.listdir(path))]
+        return [sum(size for size, _ in stats), max([os.stat(path).st_mtime_ns] + [mtime for _, mtime in stats])]
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def file_digest(path: str, known: dict = None):
+    """
+    SHA-1 of a file's contents, or of the names and digests of the files in a directory.
+    A digest recorded in `known` is reused while the file's size and modification time
+    are unchanged, so large unchanged files (e.g. the old partitions of a dataset) are
+    not re-read.
+    """
+    stat = _file_stat(path)
+    if known is not None and path in known and known[path][:2] == stat:
+        return known[path][2]
+    digest = hashlib.sha1()
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            digest.update(f"{name}:{file_digest(os.path.join(path, name), known)}\n".encode())
+    else:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    if known is not None:
+        known[path] = stat + [digest.hexdigest()]
+    return digest.hexdigest()
+
+def _load_manifest(path: str):
+    if not os.path.exists(path):
+        return {'stages': {}, 'files': {}}
+    with open(path) as f:
+        return json.load(f)
+
+def _dependencies(stages: list):
+    """
+    Upstream stages of every stage, derived from which stage produces each input file.
+    """
+    producers = {}
+    for stage in stages:
+        for path in stage.outputs:
+            if path in producers:
+                raise ValueError(f"{path} is an output of both {producers[path]} and {stage.name}")
+            producers[path] = stage.name
+    return {stage.name: {producers[path] for path in stage.inputs if path in producers} for stage in stages}
+
+def stage_key(stage: Stage, known: dict = None):
+    """
+    Hash of a stage's name, parameters and the contents of its input files.
+    """
+    payload = {
+        'name': stage.name,
+        'params': stage.params,
+        'inputs': {path: file_digest(path, known) for path in stage.inputs},
+    }
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+def _is_cached(stage: Stage, key: str, manifest: dict):
+    if manifest['stages'].get(stage.name) != key:
+        return False
+    # Outputs must still be exactly what the stage wrote
+    return all(os.path.exists(path) and manifest['files'].get(path, [])[:2] == _file_stat(path)
+               for path in stage.outputs)
+
+def run_stages(stages: list, manifest_path: str, workers: int = None, executor: str = 'thread', force=()):
+    """
+    Run a DAG of stages, each as soon as its upstream stages are done, with independent
+    stages running concurrently. A stage whose key (see stage_key) matches the one
+    recorded in the manifest and whose outputs are unchanged is skipped.
+    :param workers: Maximum number of stages running at once.
+    :param executor: 'thread', or 'process' for stages that hold the GIL (their functions
+                     must then be importable module-level functions).
+    :param force: Names of stages to run even if cached.
+    :return: DataFrame with the status and duration of every stage, in completion order.
+    """
+    dependencies = _dependencies(stages)
+    pending = {stage.name: stage for stage in stages}
+    manifest = _load_manifest(manifest_path)
+    known = manifest['files']
+    done, report = set(), []
+    pool_class = {'thread': ThreadPoolExecutor, 'process': ProcessPoolExecutor}[executor]
+
+    with pool_class(max_workers=workers) as pool:
+        running = {}
+        while pending or running:
+            ready = [stage for name, stage in pending.items() if dependencies[name] <= done]
+            for stage in ready:
+                del pending[stage.name]
+                key = stage_key(stage, known)
+                if stage.name not in force and _is_cached(stage, key, manifest):
+                    logger.info(f"Stage {stage.name}: unchanged, skipped.")
+                    report.append({'stage': stage.name, 'status': 'cached', 'seconds': 0.0})
+                    done.add(stage.name)
+                else:
+                    logger.info(f"Stage {stage.name}: running...")
+                    running[pool.submit(_run_stage, stage.func, stage.params)] = (stage, key)
+            if ready and not running:
+                continue  # cached stages may have unblocked others
+            if not running:
+                raise ValueError(f"Stages with unsatisfiable dependencies: {sorted(pending)}")
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, key = running.pop(future)
+                elapsed = future.result()
+                for path in stage.outputs:
+                    known.pop(path, None)
+                    file_digest(path, known)
+                manifest['stages'][stage.name] = key
+                write_json_atomic(manifest_path, manifest)
+                report.append({'stage': stage.name, 'status': 'ran', 'seconds': elapsed})
+                done.add(stage.name)
+
+    report = pd.DataFrame(report, columns=['stage', 'status', 'seconds'])
+    logger.info("Stage timings:\n" + report.to_string(index=False))
+    return report
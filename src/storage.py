@@ -0,0 +1,230 @@
+# src/storage.py
+import os
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Schema metadata key under which the index frequency is stored
+FREQ_METADATA_KEY = b'energy.freq'
+
+# One month of hourly rows per row group, so time-range reads can skip most of the file
+ROW_GROUP_SIZE = 24 * 31
+
+# Partitioned datasets are directories with one Parquet file per calendar month, named
+# after it, so appending rewrites only the last partition
+PARTITION_FREQ = 'M'
+
+# Compact schema: measurements and features as float32 (about 7 significant digits, far
+# more than the meters resolve), calendar fields as uint8
+COMPACT_FLOAT = 'float32'
+CALENDAR_DTYPES = {'hour': 'uint8', 'day_of_week': 'uint8'}
+
+def resolve_dataset(stem: str):
+    """
+    Return the path of a dataset given its path without extension, preferring the
+    Parquet file and falling back to a CSV export.
+    """
+    parquet_path = stem + '.parquet'
+    if os.path.exists(parquet_path) or not os.path.exists(stem + '.csv'):
+        return parquet_path
+    return stem + '.csv'
+
+def save_frame(df: pd.DataFrame, path: str, csv_path: str = None, partitioned: bool = False):
+    """
+    Save a time-indexed frame as Parquet, storing the index frequency with the schema.
+    The file is written to a temporary path first and renamed into place.
+    :param df: DataFrame with a datetime index.
+    :param path: Destination Parquet file.
+    :param csv_path: Optional path for an additional CSV export.
+    :param partitioned: Write a directory with one file per month instead (see
+                        save_partitions), for datasets that grow by appending.
+    """
+    if partitioned:
+        _save_partitioned(df, path)
+        if csv_path is not None:
+            df.to_csv(csv_path)
+        return
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    metadata = dict(table.schema.metadata or {})
+    if getattr(df.index, 'freqstr', None):
+        metadata[FREQ_METADATA_KEY] = df.index.freqstr.encode()
+    table = table.replace_schema_metadata(metadata)
+
+    tmp_path = path + '.tmp'
+    pq.write_table(table, tmp_path, row_group_size=ROW_GROUP_SIZE)
+    os.replace(tmp_path, path)
+    if csv_path is not None:
+        df.to_csv(csv_path)
+
+def _partition_name(period: pd.Period):
+    return f'{period.strftime("%Y-%m")}.parquet'
+
+def _partition_start(name: str):
+    return pd.Timestamp(name[:-len('.parquet')] + '-01')
+
+def is_partitioned(path: str):
+    return os.path.isdir(path)
+
+def partition_files(path: str, start=None, end=None):
+    """
+    The files of a partitioned dataset, in time order, that may hold rows in [start, end].
+    """
+    names = sorted(name for name in os.listdir(path) if name.endswith('.parquet'))
+    files = []
+    for name in names:
+        month_start = _partition_start(name)
+        if start is not None and month_start + pd.offsets.MonthBegin(1) <= pd.Timestamp(start):
+            continue
+        if end is not None and month_start > pd.Timestamp(end):
+            continue
+        files.append(os.path.join(path, name))
+    return files
+
+def save_partitions(df: pd.DataFrame, path: str):
+    """
+    Write the months of df to a partitioned dataset, replacing the files of those months.
+    Every file keeps the index frequency of df.
+    """
+    os.makedirs(path, exist_ok=True)
+    freq = getattr(df.index, 'freq', None)
+    for period, part in df.groupby(df.index.to_period(PARTITION_FREQ), sort=True):
+        if freq is not None:
+            part = part.asfreq(freq)
+        save_frame(part, os.path.join(path, _partition_name(period)))
+
+def _save_partitioned(df: pd.DataFrame, path: str):
+    """
+    Replace a dataset (a single file or a partition directory) by a partitioned copy of df,
+    written next to it and swapped into place.
+    """
+    tmp_path = path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    save_partitions(df, tmp_path)
+    if os.path.isdir(path):
+        old_path = path + '.old'
+        shutil.rmtree(old_path, ignore_errors=True)
+        os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path)
+    else:
+        if os.path.exists(path):
+            os.remove(path)
+        os.replace(tmp_path, path)
+
+def compact_frame(df: pd.DataFrame):
+    """
+    Downcast float columns to float32 and integer calendar fields to uint8.
+    """
+    dtypes = {}
+    for col in df.columns:
+        if col in CALENDAR_DTYPES and pd.api.types.is_integer_dtype(df[col]):
+            dtypes[col] = CALENDAR_DTYPES[col]
+        elif pd.api.types.is_float_dtype(df[col]):
+            dtypes[col] = COMPACT_FLOAT
+    return df.astype(dtypes) if dtypes else df
+
+def full_precision_frame(df: pd.DataFrame):
+    """
+    Upcast float columns to float64 and integer columns to int64.
+    """
+    dtypes = {col: 'float64' if pd.api.types.is_float_dtype(df[col]) else 'int64'
+              for col in df.columns if pd.api.types.is_float_dtype(df[col]) or pd.api.types.is_integer_dtype(df[col])}
+    return df.astype(dtypes) if dtypes else df
+
+def memory_report(df: pd.DataFrame):
+    """
+    Bytes per row of every column (and in total) with full-precision and compact dtypes.
+    """
+    full = full_precision_frame(df).memory_usage(index=True, deep=True)
+    compact = compact_frame(df).memory_usage(index=True, deep=True)
+    report = pd.DataFrame({'full_bytes_per_row': full, 'compact_bytes_per_row': compact}) / max(len(df), 1)
+    report.loc['total'] = report.sum()
+    return report
+
+def read_frequency(path: str):
+    """
+    Return the index frequency stored with a Parquet dataset, or None.
+    """
+    if is_partitioned(path):
+        files = partition_files(path)
+        if not files:
+            return None
+        path = files[0]
+    metadata = pq.read_schema(path).metadata or {}
+    freq = metadata.get(FREQ_METADATA_KEY)
+    return freq.decode() if freq else None
+
+def load_frame(path: str, columns: list = None, start=None, end=None, freq: str = None, full_precision: bool = False):
+    """
+    Load a time-indexed frame written by save_frame, or a legacy CSV export.
+    :param path: Parquet or CSV file with a 'Datetime' index, or a partitioned dataset,
+                 of which only the months overlapping [start, end] are read.
+    :param columns: Columns to load; other columns are not decoded.
+    :param start: Inclusive lower bound of the time range to load.
+    :param end: Inclusive upper bound of the time range to load.
+    :param freq: Frequency to enforce on the index; defaults to the stored frequency.
+    :param full_precision: Return float64/int64 columns instead of the compact schema.
+    """
+    if path.endswith('.csv'):
+        usecols = None if columns is None else ['Datetime', *columns]
+        df = pd.read_csv(path, index_col='Datetime', parse_dates=True, usecols=usecols)
+        df = df.loc[start:end]
+    else:
+        filters = []
+        if start is not None:
+            filters.append(('Datetime', '>=', pd.Timestamp(start)))
+        if end is not None:
+            filters.append(('Datetime', '<=', pd.Timestamp(end)))
+        files = partition_files(path, start, end) if is_partitioned(path) else [path]
+        frames = [pq.read_table(f, columns=columns, filters=filters or None, use_pandas_metadata=True).to_pandas()
+                  for f in files]
+        df = pd.concat(frames) if frames else pd.DataFrame(columns=columns or [])
+        freq = freq or read_frequency(path)
+
+    if freq is not None and not df.empty:
+        df = df.asfreq(freq)
+    return full_precision_frame(df) if full_precision else compact_frame(df)
+
+def _append_rows(existing_path: str, df: pd.DataFrame, first: pd.Timestamp):
+    """
+    The rows of a Parquet file before `first`, followed by df cast to the stored dtypes.
+    """
+    existing = pq.read_table(existing_path, filters=[('Datetime', '<', first)], use_pandas_metadata=True).to_pandas()
+    return pd.concat([existing, df.astype({col: existing[col].dtype for col in df.columns if col in existing})])
+
+def append_frame(df: pd.DataFrame, path: str):
+    """
+    Append rows to a Parquet dataset, replacing any stored rows at or after the first
+    timestamp of df (e.g. a partial hour that has since been completed). The new rows
+    are cast to the stored dtypes. Of a partitioned dataset only the months from the
+    first new row on are read and rewritten, so the cost does not grow with the history.
+    :return: The stored rows from the first timestamp of df on.
+    """
+    first = df.index[0]
+    if not os.path.exists(path):
+        save_frame(df, path)
+        return df
+    freq = read_frequency(path)
+    if not is_partitioned(path):
+        df = _append_rows(path, df, first)
+        if freq is not None:
+            df = df.asfreq(freq)
+        save_frame(df, path)
+        return df.loc[first:]
+
+    stored = partition_files(path)
+    month_file = os.path.join(path, _partition_name(first.to_period(PARTITION_FREQ)))
+    if os.path.exists(month_file):
+        df = _append_rows(month_file, df, first)
+    elif stored:
+        # The first row of a new month; the stored data only gives the dtypes
+        df = _append_rows(stored[-1], df, pd.Timestamp.min)
+    if freq is not None:
+        df = df.asfreq(freq)
+    for f in stored:
+        # Months after the new rows are replaced by them too
+        if _partition_start(os.path.basename(f)) > df.index[-1]:
+            os.remove(f)
+    save_partitions(df, path)
+    return df.loc[first:]
@@ -0,0 +1,194 @@
+# src/utils.py
+import os
+import io
+import sys
+import json
+import time
+import pstats
+import cProfile
+import logging
+import functools
+import threading
+import contextlib
+import tracemalloc
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# ENERGY_METRICS=0 turns instrumentation off; ENERGY_PROFILE=cpu, memory or cpu,memory
+# additionally profiles the outermost timed block
+METRICS_ENV = "ENERGY_METRICS"
+PROFILE_ENV = "ENERGY_PROFILE"
+
+_settings = {
+    "enabled": os.environ.get(METRICS_ENV, "1") != "0",
+    "profile": {mode for mode in os.environ.get(PROFILE_ENV, "").split(",") if mode},
+    "top": 15,
+}
+_records = []
+_records_lock = threading.Lock()
+# cProfile and tracemalloc are process-wide, so only one block is profiled at a time
+_profile_lock = threading.Lock()
+
+def configure_instrumentation(enabled: bool = None, profile=None, top: int = None):
+    """
+    Change the instrumentation settings at runtime.
+    :param enabled: Record timings at all. When False, timed functions are called directly.
+    :param profile: Iterable of 'cpu' (cProfile) and/or 'memory' (tracemalloc).
+    :param top: Number of hotspots to report when profiling.
+    """
+    if enabled is not None:
+        _settings["enabled"] = enabled
+    if profile is not None:
+        _settings["profile"] = set(profile)
+    if top is not None:
+        _settings["top"] = top
+
+def peak_rss_mb():
+    """
+    Peak resident set size of the process so far, in MB (None where unsupported).
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes elsewhere
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+def count_rows(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    return None
+
+class Span:
+    """
+    Measurements of one timed block; set `rows` inside the block to record a row count.
+    """
+
+    def __init__(self, name: str, rows: int = None):
+        self.name = name
+        self.rows = rows
+        self.metrics = None
+
+def _start_profilers():
+    """
+    Start the requested profilers, unless another block is being profiled.
+    :return: The profiling session, or None.
+    """
+    if not _settings["profile"] or not _profile_lock.acquire(blocking=False):
+        return None
+    session = {"cpu": None, "memory": False}
+    if "cpu" in _settings["profile"]:
+        session["cpu"] = cProfile.Profile()
+        session["cpu"].enable()
+    if "memory" in _settings["profile"] and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        session["memory"] = True
+    return session
+
+def _stop_profilers(session: dict, metrics: dict):
+    top = _settings["top"]
+    try:
+        if session["cpu"] is not None:
+            session["cpu"].disable()
+            out = io.StringIO()
+            pstats.Stats(session["cpu"], stream=out).sort_stats("cumulative").print_stats(top)
+            metrics["cpu_hotspots"] = out.getvalue()
+            logger.info(f"CPU hotspots of {metrics['name']}:\n{metrics['cpu_hotspots']}")
+        if session["memory"]:
+            snapshot = tracemalloc.take_snapshot()
+            metrics["traced_peak_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            metrics["memory_hotspots"] = [str(stat) for stat in snapshot.statistics("lineno")[:top]]
+            tracemalloc.stop()
+            logger.info(f"Memory hotspots of {metrics['name']}:\n" + "\n".join(metrics["memory_hotspots"]))
+    finally:
+        _profile_lock.release()
+
+@contextlib.contextmanager
+def timer(name: str, rows: int = None):
+    """
+    Record wall time, CPU time, peak RSS and an optional row count for a block, log them
+    as structured metrics and add them to the run's records (see export_metrics).
+    """
+    span = Span(name, rows)
+    if not _settings["enabled"]:
+        yield span
+        return
+    session = _start_profilers()
+    started = time.time()
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    status = "ok"
+    try:
+        yield span
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        span.metrics = {
+            "name": name,
+            "started": pd.Timestamp(started, unit="s").isoformat(),
+            "wall_s": time.perf_counter() - wall_start,
+            "cpu_s": time.process_time() - cpu_start,
+            "peak_rss_mb": peak_rss_mb(),
+            "rows": span.rows,
+            "status": status,
+        }
+        if session is not None:
+            _stop_profilers(session, span.metrics)
+        with _records_lock:
+            _records.append(span.metrics)
+        logger.info(f"{name} took {span.metrics['wall_s']:.3f}s wall, {span.metrics['cpu_s']:.3f}s CPU"
+                    + (f", {span.rows} rows" if span.rows is not None else ""), extra={"metrics": span.metrics})
+
+def timed(name: str = None):
+    """
+    Decorator version of timer. The row count is taken from the returned DataFrame or
+    Series, or else from the first argument that is one.
+    """
+    def decorator(func):
+        label = name or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _settings["enabled"]:
+                return func(*args, **kwargs)
+            with timer(label) as span:
+                result = func(*args, **kwargs)
+                span.rows = count_rows(result)
+                if span.rows is None:
+                    span.rows = next((count_rows(arg) for arg in args if count_rows(arg) is not None), None)
+            return result
+        return wrapper
+    return decorator
+
+def get_metrics():
+    with _records_lock:
+        return list(_records)
+
+def reset_metrics():
+    with _records_lock:
+        _records.clear()
+
+def write_json_atomic(path: str, data):
+    """
+    Write data as JSON to a temporary file and rename it into place, so readers never see
+    a partially written file. The parent directory is created if needed.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f, indent=2, default=str)
+    os.replace(path + ".tmp", path)
+
+def export_metrics(path: str):
+    """
+    Write the metrics recorded in this process to a JSON file and start a new run.
+    """
+    with _records_lock:
+        records = list(_records)
+        _records.clear()
+    write_json_atomic(path, {"records": records})
+    return path
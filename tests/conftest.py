@@ -0,0 +1,75 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# The pipeline modules import each other as top-level modules from src/;
+# the benchmark helpers live in benchmarks/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from data_preprocessing import RAW_COLUMNS
+
+
+def _make_hourly_frame(periods=24 * 60, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2008-01-01", periods=periods, freq="H", name="Datetime")
+    daily = 1.5 + np.sin(2 * np.pi * np.arange(periods) / 24)
+    df = pd.DataFrame({
+        "Global_active_power": daily + 0.2 * rng.standard_normal(periods),
+        "Voltage": 240 + rng.standard_normal(periods),
+    }, index=index)
+    df.index.freq = "H"
+    return df
+
+
+def _make_actual_and_forecast(periods=24 * 30, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2009-06-01", periods=periods, freq="H", name="Datetime")
+    forecast = pd.Series(1.5 + np.sin(2 * np.pi * np.arange(periods) / 24), index=index)
+    actual = forecast + 0.2 * rng.standard_normal(periods)
+    actual.iloc[[100, 333, 600]] += 3.0
+    actual.iloc[[50, 51]] = np.nan
+    return actual, forecast
+
+
+def _write_raw_file(path, minutes=600, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2007-01-01 00:17", periods=minutes, freq="min")
+    index = index.delete(slice(200, 330))  # a gap spanning several hours
+    values = rng.random((len(index), len(RAW_COLUMNS) - 2)) * 5
+    lines = [";".join(RAW_COLUMNS)]
+    for i, ts in enumerate(index):
+        row = ["?" if (i % 37 == 0 or 50 <= i < 120) else str(float(v)) for v in values[i]]
+        date = f"{ts.day}/{ts.month}/{ts.year}"
+        lines.append(";".join([date, ts.strftime("%H:%M:%S")] + row))
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+
+@pytest.fixture(scope="session")
+def make_hourly_frame():
+    """
+    Builds an hourly frame with a daily cycle plus noise in Global_active_power and a Voltage column.
+    """
+    return _make_hourly_frame
+
+
+@pytest.fixture(scope="session")
+def make_actual_and_forecast():
+    """
+    Builds an hourly actual series and its forecast, with spikes at positions 100, 333 and
+    600 and a gap at 50-51.
+    """
+    return _make_actual_and_forecast
+
+
+@pytest.fixture(scope="session")
+def write_raw_file():
+    """
+    Writes a small minute-level file in the UCI layout with '?' gaps and a missing span.
+    """
+    return _write_raw_file
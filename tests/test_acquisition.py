@@ -0,0 +1,184 @@
+import io
+import os
+import hashlib
+import zipfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pandas as pd
+import pytest
+
+from acquisition import DownloadError, download, open_stream
+from data_preprocessing import download_dataset, iter_hourly_chunks, load_and_preprocess_data
+from synthetic_data import write_uci_file
+
+
+@pytest.fixture(scope="module")
+def raw_file(tmp_path_factory):
+    path, _ = write_uci_file(str(tmp_path_factory.mktemp("source") / "household_power_consumption.txt"),
+                             minutes=24 * 60 * 4, seed=3)
+    return path
+
+
+def read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class RangeServer:
+    """
+    Serves one file with Range support; the first `drops` responses stop halfway.
+    """
+
+    def __init__(self, data: bytes, drops: int = 0):
+        self.data, self.drops, self.ranges = data, drops, []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                start = int(self.headers["Range"][len("bytes="):-1]) if self.headers.get("Range") else 0
+                server.ranges.append(start)
+                body = server.data[start:]
+                self.send_response(206 if start else 200)
+                if start:
+                    self.send_header("Content-Range", f"bytes {start}-{len(server.data) - 1}/{len(server.data)}")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if server.drops:
+                    server.drops -= 1
+                    body = body[:len(body) // 2]
+                self.wfile.write(body)
+
+            def do_HEAD(self):
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(server.data)))
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/household_power_consumption.txt"
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def test_interrupted_download_is_resumed_and_verified(raw_file, tmp_path):
+    data = read_bytes(raw_file)
+    server = RangeServer(data, drops=2)
+    try:
+        dest = str(tmp_path / "raw.txt")
+        download(server.url, dest, sha256=hashlib.sha256(data).hexdigest())
+        assert read_bytes(dest) == data
+        assert server.ranges[0] == 0 and 0 < server.ranges[1] < server.ranges[2] < len(data)
+        assert not os.path.exists(dest + ".part")
+    finally:
+        server.close()
+
+
+def test_partial_file_from_an_earlier_run_is_resumed(raw_file, tmp_path):
+    data = read_bytes(raw_file)
+    dest = str(tmp_path / "raw.txt")
+    with open(dest + ".part", "wb") as f:
+        f.write(data[:1000])
+    server = RangeServer(data)
+    try:
+        download(server.url, dest)
+        assert read_bytes(dest) == data and server.ranges == [1000]
+    finally:
+        server.close()
+
+
+@pytest.mark.parametrize("expected", [{"size": 10}, {"sha256": hashlib.sha256(b"0123456789").hexdigest()}])
+def test_short_existing_file_is_resumed(tmp_path, expected):
+    source = tmp_path / "source" / "data.txt"
+    source.parent.mkdir()
+    source.write_bytes(b"0123456789")
+    dest = str(tmp_path / "raw.txt")
+    with open(dest, "wb") as f:
+        f.write(b"012")
+    download("file://" + str(source), dest, **expected)
+    assert read_bytes(dest) == b"0123456789" and not os.path.exists(dest + ".part")
+
+
+def test_existing_file_is_kept_unless_shown_to_be_truncated(tmp_path):
+    source = tmp_path / "source" / "data.txt"
+    source.parent.mkdir()
+    source.write_bytes(b"0123456789")
+    dest = str(tmp_path / "raw.txt")
+    # Rows appended to a downloaded file, or a file with nothing to check it against
+    for content, expected in [(b"0123456789extra", {"size": 10}), (b"012", {})]:
+        with open(dest, "wb") as f:
+            f.write(content)
+        download("file://" + str(source), dest, **expected)
+        assert read_bytes(dest) == content
+
+
+def test_short_existing_file_is_resumed_over_http(raw_file, tmp_path):
+    data = read_bytes(raw_file)
+    dest = str(tmp_path / "raw.txt")
+    with open(dest, "wb") as f:
+        f.write(data[:1000])
+    server = RangeServer(data)
+    try:
+        download(server.url, dest, sha256=hashlib.sha256(data).hexdigest())
+        assert read_bytes(dest) == data and server.ranges == [1000]
+    finally:
+        server.close()
+
+
+def test_hash_mismatch_leaves_no_file(raw_file, tmp_path):
+    dest = str(tmp_path / "raw.txt")
+    with pytest.raises(DownloadError):
+        download("file://" + raw_file, dest, sha256="0" * 64)
+    assert not os.path.exists(dest) and not os.path.exists(dest + ".part")
+
+    # A truncated file from the old implementation is replaced when a hash is given
+    with open(dest, "wb") as f:
+        f.write(read_bytes(raw_file)[:100])
+    download_dataset("file://" + raw_file, dest, sha256=hashlib.sha256(read_bytes(raw_file)).hexdigest())
+    assert read_bytes(dest) == read_bytes(raw_file)
+
+
+def test_local_mirror_is_used_before_the_url(raw_file, tmp_path, monkeypatch):
+    monkeypatch.setenv("ENERGY_DATA_MIRROR", os.path.dirname(raw_file))
+    dest = str(tmp_path / "raw.txt")
+    # The host does not resolve, so this only succeeds from the mirror
+    download_dataset("http://mirror-test.invalid/data/household_power_consumption.txt", dest)
+    assert read_bytes(dest) == read_bytes(raw_file)
+
+
+class Unseekable(io.RawIOBase):
+    # zipfile writes data descriptors after each member when it cannot seek back
+    def __init__(self, f):
+        self.f = f
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        return self.f.write(b)
+
+
+@pytest.mark.parametrize("seekable", [True, False])
+def test_zipped_source_is_decompressed_while_streaming(raw_file, tmp_path, seekable):
+    archive = str(tmp_path / "household_power_consumption.zip")
+    with open(archive, "wb") as f:
+        with zipfile.ZipFile(f if seekable else Unseekable(f), "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.write(raw_file, "household_power_consumption.txt")
+
+    dest = str(tmp_path / "raw" / "household_power_consumption.txt")
+    download("file://" + archive, dest)
+    assert read_bytes(dest) == read_bytes(raw_file)
+    assert not os.path.exists(str(tmp_path / "raw" / "household_power_consumption.zip"))
+
+    # Parsing the stream gives the same hourly data as the file, and the stream is saved
+    saved = str(tmp_path / "streamed.txt")
+    with open_stream("file://" + archive, save_to=saved) as stream:
+        streamed = pd.concat(list(iter_hourly_chunks(stream, chunksize=1000)))
+    expected = load_and_preprocess_data(raw_file, chunksize=1000, full_precision=True)
+    pd.testing.assert_frame_equal(streamed, expected, check_freq=False, check_dtype=False)
+    assert read_bytes(saved) == read_bytes(raw_file)
@@ -0,0 +1,24 @@
+import pandas as pd
+import pytest
+
+from aggregates import build_pyramid, choose_level, range_summary, rolling_mean
+from data_preprocessing import load_and_preprocess_data
+
+
+def test_pyramid_range_queries_match_hourly_data(tmp_path, write_raw_file):
+    raw = write_raw_file(tmp_path / "raw.txt", minutes=60 * 24 * 20)
+    hourly = load_and_preprocess_data(str(raw))
+    pyramid = build_pyramid(hourly, ["Global_active_power"])
+    start, end = hourly.index[30], hourly.index[400]
+    expected = hourly.loc[start:end, "Global_active_power"]
+
+    summary = range_summary(pyramid, "Global_active_power", start, end)
+    assert summary["count"] == expected.count()
+    assert summary["mean"] == pytest.approx(expected.mean())
+    assert (summary["min"], summary["max"]) == (expected.min(), expected.max())
+    # The coarsest level with enough buckets to fill the plot
+    assert choose_level(start, end, points=100) == "hourly"
+    assert choose_level(start, end, points=10) == "daily"
+    assert choose_level(hourly.index[0], hourly.index[0] + pd.Timedelta(days=4 * 365), points=1000) == "daily"
+    rolling = rolling_mean(pyramid, "Global_active_power", 6, start, end)
+    pd.testing.assert_series_equal(rolling, hourly["Global_active_power"].rolling(6).mean().loc[start:end], check_freq=False)
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from anomaly_detection import (IsolationForestAnomalyModel, StreamingResidualDetector, detect_anomalies_residual,
+                               residual_features)
+
+
+@pytest.mark.parametrize("options", [{}, {"by_hour": True, "min_periods": 5}, {"halflife": 48}])
+def test_streaming_and_batch_replay_agree(options, make_actual_and_forecast):
+    actual, forecast = make_actual_and_forecast()
+    streaming = StreamingResidualDetector(**options)
+    events = [streaming.update(ts, a, f) for ts, a, f in zip(actual.index, actual, forecast)]
+    streamed = [e["Datetime"] for e in events if e is not None]
+
+    # Replay the first half as a batch, then continue point by point
+    half = len(actual) // 2
+    replay = StreamingResidualDetector(**options)
+    scores = replay.update_batch(actual[:half], forecast[:half])
+    tail_events = [replay.update(ts, a, f) for ts, a, f in zip(actual.index[half:], actual[half:], forecast[half:])]
+    replayed = list(scores.index[scores["is_anomaly"]]) + [e["Datetime"] for e in tail_events if e is not None]
+
+    assert streamed == replayed
+    assert pd.Timestamp(actual.index[333]) in streamed
+    np.testing.assert_array_equal(streaming.count, replay.count)
+    np.testing.assert_array_equal(streaming.sum, replay.sum)
+    # Exponentially weighted statistics are replayed with a linear filter
+    np.testing.assert_allclose(streaming.mean, replay.mean, rtol=1e-12)
+    np.testing.assert_allclose(streaming.var, replay.var, rtol=1e-12)
+
+
+def test_streaming_flags_do_not_depend_on_future_data(make_actual_and_forecast):
+    actual, forecast = make_actual_and_forecast()
+    early = StreamingResidualDetector().update_batch(actual[:200], forecast[:200])
+    full = StreamingResidualDetector().update_batch(actual, forecast)
+    pd.testing.assert_frame_equal(early, full.iloc[:200])
+
+
+def test_residual_detection_with_reference_std(make_actual_and_forecast):
+    actual, forecast = make_actual_and_forecast()
+    anomalies = detect_anomalies_residual(actual, forecast, threshold=3.0, resid_std=0.2)
+    assert {actual.index[100], actual.index[333], actual.index[600]} <= set(anomalies.index)
+
+
+def test_isolation_forest_model_scores_without_refitting(tmp_path, make_actual_and_forecast):
+    actual, forecast = make_actual_and_forecast(periods=24 * 40)
+    actual.iloc[800] += 3.0
+    model = IsolationForestAnomalyModel(window=24 * 30, retrain_every=pd.Timedelta(days=7), n_jobs=2)
+    model.fit(actual[:24 * 30], forecast[:24 * 30])
+    model.save(str(tmp_path), "iso")
+
+    loaded = IsolationForestAnomalyModel.load(str(tmp_path), "iso")
+    new_start = actual.index[24 * 30]
+    scores = loaded.score(actual[new_start - pd.Timedelta(hours=23):], forecast, start=new_start)
+    assert scores.index[0] == new_start and len(scores) == 24 * 10
+    assert scores.loc[actual.index[800], "is_anomaly"]
+    features = residual_features(actual, forecast, loaded.rolling_window).loc[new_start:]
+    assert (scores["is_anomaly"].to_numpy() == (loaded.forest.predict(features) == -1)).all()
+
+    assert not loaded.maybe_retrain(actual[:24 * 33], forecast)
+    assert loaded.maybe_retrain(actual, forecast)
+    assert loaded.trained_until == actual.index[-1]
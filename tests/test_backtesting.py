@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.arima.model import ARIMA
+
+from backtesting import backtest_arima, horizon_metrics
+
+
+def test_backtest_reuses_filtered_state(make_hourly_frame):
+    series = make_hourly_frame(periods=24 * 20)["Global_active_power"]
+    series.iloc[300:304] = np.nan
+    backtest = backtest_arima(series, order=(1, 1, 1), horizon=24, step=24, initial=24 * 10, workers=1)
+    assert len(backtest) == 10 * 24
+
+    params = ARIMA(series.iloc[:24 * 10], order=(1, 1, 1)).fit().params
+    for origin in (24 * 10, 24 * 13, 24 * 19):
+        expected = ARIMA(series.iloc[:origin], order=(1, 1, 1)).filter(params).forecast(24)
+        result = backtest.loc[backtest["origin"] == series.index[origin]]
+        np.testing.assert_allclose(result["forecast"].values, expected.values)
+        pd.testing.assert_index_equal(pd.Index(result["Datetime"]), expected.index, check_names=False)
+
+    metrics = horizon_metrics(backtest)
+    assert list(metrics.index) == list(range(1, 25))
+    assert (metrics["rmse"] >= metrics["mae"]).all()
+
+
+def test_backtest_refit_groups_run_in_parallel(make_hourly_frame):
+    series = make_hourly_frame(periods=24 * 14)["Global_active_power"]
+    kwargs = dict(order=(1, 0, 0), horizon=24, step=24, initial=24 * 10, window=24 * 7, refit_every=2)
+    serial = backtest_arima(series, workers=1, **kwargs)
+    parallel = backtest_arima(series, workers=2, **kwargs)
+    pd.testing.assert_frame_equal(serial, parallel)
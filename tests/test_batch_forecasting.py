@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.arima.model import ARIMA
+
+from batch_forecasting import forecast_many
+from storage import load_frame
+
+
+def test_forecast_many_matches_per_series_fits(tmp_path, make_hourly_frame):
+    meters = {f"m{i}": make_hourly_frame(periods=24 * 7, seed=i)["Global_active_power"] for i in range(5)}
+    long = pd.concat([s.rename("Global_active_power").reset_index().assign(meter_id=m) for m, s in meters.items()])
+    output_path = str(tmp_path / "batch.parquet")
+
+    result, errors = forecast_many(long, order=(1, 0, 0), horizon=12, workers=2, chunk_size=2, output_path=output_path)
+    assert errors == {}
+    assert len(result) == 5 * 12
+    for meter_id, series in meters.items():
+        expected = ARIMA(series, order=(1, 0, 0)).fit().forecast(12)
+        got = result[result["meter_id"] == meter_id]["forecast"]
+        np.testing.assert_allclose(got.values, expected.values)
+        pd.testing.assert_index_equal(got.index, expected.index, check_names=False, exact=False)
+    pd.testing.assert_frame_equal(load_frame(output_path, full_precision=True), result, check_freq=False)
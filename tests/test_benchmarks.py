@@ -0,0 +1,28 @@
+import pandas as pd
+
+from data_preprocessing import load_and_preprocess_data
+from run_benchmarks import compare_to_baseline
+from synthetic_data import write_meter_files, write_uci_file
+
+
+def test_synthetic_data_is_valid_uci_input(tmp_path):
+    path, rows = write_uci_file(str(tmp_path / "raw.txt"), minutes=5000, missing_rate=0.01)
+    text = open(path).read()
+    assert text.splitlines()[1].startswith("16/12/2006;17:24:00;")
+    assert "?" in text and len(text.splitlines()) == rows + 1
+
+    hourly = load_and_preprocess_data(path, chunksize=1000)
+    pd.testing.assert_frame_equal(hourly, load_and_preprocess_data(path), check_freq=False)
+    assert len(hourly) == 84 and hourly["Global_active_power"].between(0, 20).all()
+
+    paths = write_meter_files(str(tmp_path / "meters"), meters=2, minutes=100)
+    assert open(paths[0]).read() != open(paths[1]).read()
+
+
+def test_compare_to_baseline_flags_slow_stages():
+    baseline = {"stages": {"features": {"seconds": 1.0}, "ingestion": {"seconds": 0.01}}}
+    results = {"stages": {"features": {"seconds": 1.5}, "ingestion": {"seconds": 0.03},
+                          "forecasting": {"seconds": 2.0}}}
+    comparison = compare_to_baseline(results, baseline, tolerance=0.2).set_index("stage")
+    # Slower by 50%; slower by 3x but within timer noise; no baseline
+    assert comparison["regression"].to_dict() == {"features": True, "ingestion": False, "forecasting": False}
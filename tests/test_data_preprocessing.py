@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+from aggregates import load_pyramid
+from data_preprocessing import load_and_preprocess_data, iter_hourly_chunks
+
+
+@pytest.mark.parametrize("chunksize", [1, 59, 60, 61, 250, 10_000])
+def test_chunked_loading_matches_in_memory(tmp_path, chunksize, write_raw_file):
+    raw = write_raw_file(tmp_path / "raw.txt")
+    expected = load_and_preprocess_data(str(raw))
+    result = load_and_preprocess_data(str(raw), chunksize=chunksize)
+    pd.testing.assert_frame_equal(result, expected, check_exact=True, check_freq=True)
+
+
+def test_compact_schema_halves_memory(tmp_path, write_raw_file):
+    from storage import memory_report
+
+    raw = write_raw_file(tmp_path / "raw.txt")
+    compact = load_and_preprocess_data(str(raw), chunksize=100)
+    full = load_and_preprocess_data(str(raw), chunksize=100, full_precision=True)
+    assert set(compact.dtypes.astype(str)) == {"float32", "uint8"}
+    assert set(full.dtypes.astype(str)) == {"float64", "int64"}
+    pd.testing.assert_frame_equal(compact, full, check_dtype=False, check_exact=False, rtol=1e-6)
+
+    report = memory_report(full)
+    assert report.loc["total", "compact_bytes_per_row"] < 0.5 * report.loc["total", "full_bytes_per_row"]
+
+
+def test_iter_hourly_chunks_emits_incrementally(tmp_path, write_raw_file):
+    raw = write_raw_file(tmp_path / "raw.txt")
+    chunks = list(iter_hourly_chunks(str(raw), chunksize=120))
+    assert len(chunks) > 1
+    index = pd.concat(chunks).index
+    assert index.is_monotonic_increasing and index.is_unique
+
+
+def test_incremental_pipeline_matches_full_run(tmp_path, monkeypatch, write_raw_file):
+    import data_pipeline
+    from storage import load_frame
+
+    monkeypatch.setattr(data_pipeline, "grid_search_arima", lambda *args, **kwargs: (1, 0, 0))
+    full_text = write_raw_file(tmp_path / "full.txt", minutes=3000).read_text()
+    lines = full_text.splitlines(keepends=True)
+
+    def run_in(directory, parts):
+        raw = directory / "data" / "raw" / "household_power_consumption.txt"
+        raw.parent.mkdir(parents=True)
+        monkeypatch.chdir(directory)
+        raw.write_text("".join(parts[0]))
+        data_pipeline.run_pipeline()
+        for part in parts[1:]:
+            with open(raw, "a") as f:
+                f.write("".join(part))
+            data_pipeline.run_incremental_pipeline()
+        enhanced = load_frame(str(directory / "data" / "processed" / "household_power_consumption_enhanced.parquet"))
+        return enhanced, load_pyramid(str(directory / "data" / "processed" / "pyramid"))
+
+    (tmp_path / "full").mkdir()
+    (tmp_path / "incremental").mkdir()
+    expected, expected_pyramid = run_in(tmp_path / "full", [lines])
+    # Splits fall in the middle of an hour, and the last part ends with an incomplete line
+    result, pyramid = run_in(tmp_path / "incremental", [lines[:1500], lines[1500:2210], lines[2210:-1], [lines[-1][:10]], [lines[-1][10:]]])
+    pd.testing.assert_frame_equal(result, expected, check_exact=False, rtol=1e-9)
+    for level in expected_pyramid:
+        pd.testing.assert_frame_equal(pyramid[level], expected_pyramid[level], check_exact=False, rtol=1e-9)
@@ -0,0 +1,57 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+from statsmodels.tsa.seasonal import seasonal_decompose
+
+from decomposition import DecompositionCache, SeasonalDecomposition
+
+
+@pytest.mark.parametrize("model", ["additive", "multiplicative"])
+def test_decomposition_matches_statsmodels_and_extends(model, make_actual_and_forecast):
+    actual, _ = make_actual_and_forecast(periods=24 * 60)
+    series = actual.dropna().abs() + 0.5
+    expected = seasonal_decompose(series, model=model, period=24)
+    result = SeasonalDecomposition((24,), model).extend(series).components()
+    np.testing.assert_allclose(result['trend'], expected.trend, rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(result['seasonal'], expected.seasonal, rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(result['resid'], expected.resid, rtol=1e-9, atol=1e-12)
+
+    extended = SeasonalDecomposition((24, 168), model).extend(series.iloc[:500]).extend(series.iloc[500:])
+    pd.testing.assert_frame_equal(extended.components(),
+                                  SeasonalDecomposition((24, 168), model).extend(series).components())
+
+
+def test_decomposition_cache_reuses_and_extends_entries(make_actual_and_forecast):
+    actual, _ = make_actual_and_forecast(periods=24 * 60)
+    series = actual.dropna()
+    cache = DecompositionCache(maxsize=2)
+    first = cache.decompose(series.iloc[:800], periods=(24, 168), version="v1")
+    assert cache.decompose(series.iloc[:800], periods=(168, 24), version="v1") is first
+
+    # Appended data extends the cached decomposition in place of the shorter entry
+    extended = cache.decompose(series, periods=(24, 168), version="v1")
+    assert len(cache.entries) == 1
+    pd.testing.assert_frame_equal(extended, SeasonalDecomposition((24, 168)).extend(series).components())
+
+    # Least recently used entries are evicted
+    cache.decompose(series, periods=(24,), version="v2")
+    cache.decompose(series, periods=(24,), version="v3")
+    assert [key[0] for key in cache.entries] == ["v2", "v3"]
+
+
+def test_decomposition_cache_is_thread_safe_and_versioned(make_actual_and_forecast):
+    actual, _ = make_actual_and_forecast(periods=24 * 60)
+    series = actual.dropna()
+    cache = DecompositionCache(maxsize=4)
+    lengths = [400 + 24 * (i % 8) for i in range(64)]
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(lambda n: cache.decompose(series.iloc[:n], version="v1"), lengths))
+    for n, components in zip(lengths, results):
+        pd.testing.assert_frame_equal(components, SeasonalDecomposition().extend(series.iloc[:n]).components())
+
+    # Rewritten data with the same range and length gets a new version and is recomputed
+    rewritten = series.iloc[:400] * 2
+    pd.testing.assert_frame_equal(cache.decompose(rewritten, version="v2"),
+                                  SeasonalDecomposition().extend(rewritten).components())
@@ -0,0 +1,16 @@
+import pytest
+
+from downsampling import downsample
+
+
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+def test_downsampling_keeps_peaks_gaps_and_anomalies(method, make_actual_and_forecast):
+    actual, _ = make_actual_and_forecast(periods=24 * 365)
+    keep = actual.index[[100, 333]]
+    reduced = downsample(actual, 1000, method=method, keep=keep)
+    assert len(reduced) <= 1100
+    assert actual.idxmax() in reduced.index and set(keep) <= set(reduced.index)
+    assert reduced.loc[actual.index[50]] != reduced.loc[actual.index[50]]  # gap start kept as NaN
+    assert reduced.index.is_monotonic_increasing
+    if method == "minmax":
+        assert actual.idxmin() in reduced.index
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from feature_engineering import (add_fourier_features, add_lag_features, add_rolling_features,
+                                 build_feature_matrix)
+
+
+@pytest.fixture
+def hourly():
+    rng = np.random.default_rng(0)
+    index = pd.date_range("2008-01-01", periods=500, freq="H", name="Datetime")
+    values = 1.5 + rng.standard_normal(500)
+    values[[10, 11, 200, 499]] = np.nan
+    return pd.DataFrame({"Global_active_power": values}, index=index)
+
+
+def test_feature_matrix_matches_pandas(hourly):
+    spec = {"lags": (1, 24), "rolling_windows": (1, 3, 24), "rolling_stats": ("mean", "std", "min", "max"),
+            "fourier": ((24, 2), (168, 1)), "calendar": ("hour", "is_weekend")}
+    features = build_feature_matrix(hourly, "Global_active_power", spec)
+    series = hourly["Global_active_power"]
+
+    for lag in (1, 24):
+        np.testing.assert_array_equal(features[f"Global_active_power_lag_{lag}"], series.shift(lag))
+    for window in (1, 3, 24):
+        rolling = series.rolling(window)
+        for stat in ("mean", "std", "min", "max"):
+            pd.testing.assert_series_equal(features[f"Global_active_power_rolling_{stat}_{window}"],
+                                           getattr(rolling, stat)(), check_names=False, atol=1e-12)
+    t = np.arange(len(hourly))
+    np.testing.assert_allclose(features["sin_168_1"], np.sin(2 * np.pi * t / 168), atol=1e-12)
+    np.testing.assert_allclose(features["cos_24_2"], np.cos(2 * np.pi * 2 * t / 24), atol=1e-12)
+    np.testing.assert_array_equal(features["hour"], hourly.index.hour)
+    assert list(hourly.columns) == ["Global_active_power"]
+
+
+def test_feature_matrix_is_a_single_block(hourly):
+    features = build_feature_matrix(hourly, "Global_active_power", dtype="float32")
+    assert features._mgr.nblocks == 1
+    assert (features.dtypes == "float32").all()
+
+
+def test_add_functions_keep_their_columns_without_mutating_input(hourly):
+    df = add_lag_features(hourly, "Global_active_power")
+    df = add_rolling_features(df, "Global_active_power")
+    df = add_fourier_features(df, period=24, order=3)
+    assert list(hourly.columns) == ["Global_active_power"]
+    assert "Global_active_power_lag_24" in df and "Global_active_power_rolling_mean_6" in df
+    assert [c for c in df.columns if c.startswith(("sin", "cos"))] == ["sin_1", "cos_1", "sin_2", "cos_2", "sin_3", "cos_3"]
+
+
+def test_pipeline_features_keep_the_enhanced_schema(hourly):
+    from data_pipeline import add_features
+
+    features = add_features(hourly, full_precision=True)
+    expected = add_fourier_features(add_rolling_features(add_lag_features(hourly, "Global_active_power"),
+                                                         "Global_active_power"), period=24, order=3)
+    assert list(features.columns) == list(expected.columns)
+    pd.testing.assert_frame_equal(features, expected, check_exact=False, atol=1e-12)
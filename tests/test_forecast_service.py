@@ -0,0 +1,138 @@
+import json
+import urllib.request
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from anomaly_detection import IsolationForestAnomalyModel, residual_features
+from forecasting_model import fit_arima_with_metadata
+from model_store import save_model
+from storage import save_frame
+from forecast_service import ForecastService, StubClient, TTLCache, make_server
+
+
+@pytest.fixture(scope="module")
+def fitted(make_hourly_frame):
+    series = make_hourly_frame(periods=24 * 30)["Global_active_power"]
+    model_fit, metadata = fit_arima_with_metadata(series.iloc[:-1], order=(2, 0, 1))
+    one_step = model_fit.predict(start=series.index[0], end=series.index[-2])
+    iso_model = IsolationForestAnomalyModel(n_jobs=1).fit(series.iloc[:-1], one_step)
+    return series, model_fit, metadata, iso_model
+
+
+@pytest.fixture
+def service(fitted):
+    series, model_fit, metadata, iso_model = fitted
+    service = ForecastService({"Global_active_power": (model_fit, metadata)}, iso_model=iso_model,
+                              history={"Global_active_power": series}, max_wait=0.01)
+    yield service
+    service.close()
+
+
+def test_concurrent_forecasts_share_one_model_call(fitted, service):
+    _, model_fit, _, _ = fitted
+    client = StubClient(service)
+    hours = [6, 12, 24, 48] * 50
+    barrier = threading.Barrier(len(hours))
+
+    def request(h):
+        barrier.wait()
+        return client.get("/forecast", meter="Global_active_power", hours=h)
+
+    with ThreadPoolExecutor(max_workers=len(hours)) as pool:
+        responses = list(pool.map(request, hours))
+
+    expected = model_fit.forecast(48)
+    for h, response in zip(hours, responses):
+        assert response.status == 200
+        values = [row["value"] for row in response.json["forecast"]]
+        np.testing.assert_allclose(values, expected.iloc[:h])
+        assert response.json["forecast"][0]["Datetime"] == expected.index[0].isoformat()
+    stats = service.stats()
+    assert stats["model_calls"] < len(hours) / 10
+    assert stats["requests"] == len(hours) and stats["p99_ms"] is not None
+
+    # Shorter horizons are served from the cached longest forecast
+    response = client.get("/forecast", meter="Global_active_power", hours=12)
+    assert response.json["cached"] is True
+    assert service.stats()["model_calls"] == stats["model_calls"]
+
+
+def test_scores_match_the_pipeline_detectors(fitted, service):
+    series, model_fit, metadata, iso_model = fitted
+    client = StubClient(service)
+    readings = series.iloc[-48:].copy()
+    readings.iloc[10] += 5.0
+    batches = [readings.iloc[:24], readings.iloc[24:]]
+    payloads = [{"meter": "Global_active_power",
+                 "readings": [{"Datetime": ts.isoformat(), "value": float(v)} for ts, v in batch.items()]}
+                for batch in batches]
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        responses = list(pool.map(lambda payload: client.post("/score", payload), payloads))
+
+    scores = pd.DataFrame([row for response in responses for row in response.json["scores"]])
+    predicted = model_fit.predict(start=readings.index[0], end=readings.index[-1])
+    np.testing.assert_allclose(scores["predicted"], predicted)
+    zscore = (readings - predicted) / metadata["resid_std"]
+    np.testing.assert_allclose(scores["zscore"], zscore)
+    assert scores["is_anomaly"].tolist() == (zscore.abs() > 3.0).tolist()
+    assert scores["is_anomaly"].iloc[10]
+
+    # Isolation Forest scores use the stored history before each request's readings
+    # for the rolling statistics
+    for batch, response in zip(batches, responses):
+        actual = pd.concat([series.loc[:batch.index[0]].iloc[-24:-1], batch])
+        context = model_fit.predict(start=actual.index[0], end=actual.index[-1])
+        expected = iso_model.score_features(residual_features(actual, context, 24).loc[batch.index[0]:])
+        np.testing.assert_allclose([row["isolation_score"] for row in response.json["scores"]], expected["score"])
+
+
+def test_invalid_requests_are_rejected(service):
+    client = StubClient(service)
+    assert client.get("/forecast", meter="unknown", hours=24).status == 404
+    assert client.get("/forecast", hours=0).status == 400
+    assert client.post("/score", {"readings": []}).status == 400
+    readings = [{"Datetime": "2008-01-20 10:00", "value": 1.0}]
+    assert client.post("/score", readings).status == 400  # not a JSON object
+    assert client.post("/score", {"meter": "unknown", "readings": readings}).status == 404
+    assert client.post("/score", {"readings": [{"Datetime": "2008-01-20 10:30", "value": 1.0}]}).status == 400
+    assert client.get("/missing").status == 404
+    assert client.get("/health").json["meters"] == ["Global_active_power"]
+
+
+def test_ttl_cache_expires_entries(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("forecast_service.time.monotonic", lambda: now[0])
+    cache = TTLCache(ttl=10, maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)  # evicts the least recently used entry
+    assert cache.get("b") is None and cache.get("c") == 3
+    now[0] += 10
+    assert cache.get("a") is None
+
+
+def test_server_loads_store_and_answers_over_http(fitted, tmp_path):
+    series, model_fit, metadata, iso_model = fitted
+    save_model(model_fit, str(tmp_path), "Global_active_power", metadata)
+    iso_model.save(str(tmp_path), "isolation_forest")
+    enhanced = str(tmp_path / "enhanced.parquet")
+    save_frame(series.to_frame(), enhanced)
+
+    service = ForecastService.from_store(str(tmp_path), enhanced)
+    server = make_server(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        url = f"http://127.0.0.1:{server.server_port}/forecast?meter=Global_active_power&hours=3"
+        with urllib.request.urlopen(url) as response:
+            payload = json.load(response)
+        np.testing.assert_allclose([row["value"] for row in payload["forecast"]], model_fit.forecast(3))
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.close()
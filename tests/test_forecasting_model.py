@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.arima.model import ARIMA
+
+from forecasting_model import (load_processed_data, search_arima_orders, grid_search_arima, series_hash,
+                               fit_arima_with_metadata, update_arima_model, needs_refit,
+                               record_residuals, DRIFT_WINDOW)
+from model_store import save_model, load_model
+from storage import save_frame
+
+
+def test_load_processed_data_projects_columns_and_time_range(tmp_path, make_hourly_frame):
+    df = make_hourly_frame()
+    path = str(tmp_path / "processed.parquet")
+    save_frame(df, path, csv_path=str(tmp_path / "processed.csv"))
+
+    start, end = df.index[100], df.index[500]
+    for file_path in (path, str(tmp_path / "processed.csv")):
+        loaded = load_processed_data(file_path, columns=["Global_active_power"], start=start, end=end,
+                                     full_precision=True)
+        assert list(loaded.columns) == ["Global_active_power"]
+        assert loaded.index.freq == pd.tseries.frequencies.to_offset("H")
+        pd.testing.assert_frame_equal(loaded, df.loc[start:end, ["Global_active_power"]], check_freq=False)
+        # The compact schema is loaded by default
+        compact = load_processed_data(file_path, columns=["Global_active_power"], start=start, end=end)
+        assert compact["Global_active_power"].dtype == np.float32
+        pd.testing.assert_frame_equal(compact, loaded.astype("float32"), check_freq=False)
+
+
+def test_compact_schema_does_not_change_forecasts_or_anomalies(make_hourly_frame):
+    from anomaly_detection import detect_anomalies_residual
+
+    series = make_hourly_frame(periods=24 * 30)["Global_active_power"]
+    series.iloc[[100, 400]] += 2.0
+    compact = series.astype("float32")
+    fit, _ = fit_arima_with_metadata(series, order=(2, 0, 1))
+    compact_fit, _ = fit_arima_with_metadata(compact, order=(2, 0, 1))
+    np.testing.assert_allclose(compact_fit.forecast(24), fit.forecast(24), rtol=1e-4)
+
+    predicted = fit.predict()
+    anomalies = detect_anomalies_residual(series, predicted)
+    pd.testing.assert_index_equal(detect_anomalies_residual(compact, predicted).index, anomalies.index)
+
+
+def test_order_search_is_parallel_and_memoized(tmp_path, make_hourly_frame):
+    series = make_hourly_frame(periods=24 * 10)["Global_active_power"]
+    cache_path = str(tmp_path / "aic_cache.json")
+    grid = dict(p_values=[0, 1], d_values=[0], q_values=[0, 1])
+
+    serial = search_arima_orders(series, **grid, workers=1)
+    parallel = search_arima_orders(series, **grid, workers=2, cache_path=cache_path)
+    assert parallel["aic"].tolist() == serial["aic"].tolist()
+    assert not parallel["cached"].any()
+
+    cached = search_arima_orders(series, **grid, workers=2, cache_path=cache_path)
+    assert cached["cached"].all()
+    assert cached["aic"].tolist() == serial["aic"].tolist()
+    assert grid_search_arima(series, **grid, cache_path=cache_path) == tuple(serial.loc[serial["aic"].idxmin(), "order"])
+
+
+def test_order_search_screens_on_subsample(make_hourly_frame):
+    series = make_hourly_frame(periods=24 * 10)["Global_active_power"]
+    report = search_arima_orders(series, p_values=[0, 1, 2], d_values=[0], q_values=[0, 1],
+                                 workers=1, screen_size=48, screen_top=2)
+    assert (report["stage"] == "screen").sum() == 6
+    assert (report["stage"] == "full").sum() == 2
+
+
+def test_stored_model_is_extended_without_refitting(tmp_path, make_hourly_frame):
+    series = make_hourly_frame(periods=24 * 20)["Global_active_power"]
+    train, new_obs = series[:-48], series[-48:]
+    model_fit, metadata = fit_arima_with_metadata(train, order=(1, 0, 1))
+    save_model(model_fit, str(tmp_path), "meter", metadata)
+
+    stored_fit, stored_metadata = load_model(str(tmp_path), "meter")
+    assert stored_metadata["train_hash"] == series_hash(train)
+    updated = update_arima_model(stored_fit, new_obs)
+    np.testing.assert_array_equal(updated.params, model_fit.params)
+
+    filtered = ARIMA(series, order=(1, 0, 1)).filter(model_fit.params)
+    np.testing.assert_allclose(updated.forecast(24), filtered.forecast(24))
+    assert needs_refit(updated, stored_metadata, new_obs) is None
+    # The schedule counts from when the parameters were estimated, not from the training span
+    fitted_at = pd.Timestamp(stored_metadata["fitted_at"])
+    assert needs_refit(updated, stored_metadata, new_obs, now=fitted_at + pd.Timedelta(days=6)) is None
+    assert needs_refit(updated, stored_metadata, new_obs, now=fitted_at + pd.Timedelta(days=7)) == "schedule"
+
+
+def test_drift_is_judged_over_a_rolling_residual_window(make_hourly_frame):
+    series = make_hourly_frame(periods=24 * 20)["Global_active_power"]
+    model_fit, metadata = fit_arima_with_metadata(series[:-DRIFT_WINDOW], order=(1, 0, 1))
+    assert len(metadata["recent_resid"]) == DRIFT_WINDOW
+
+    def extend(metadata, new_obs):
+        updated = update_arima_model(model_fit, new_obs)
+        predicted = updated.predict(start=new_obs.index[0], end=new_obs.index[-1])
+        metadata = record_residuals(metadata, new_obs - predicted)
+        return metadata, needs_refit(updated, metadata, new_obs)
+
+    # A single outlying hour does not force a refit...
+    new_obs = series[-DRIFT_WINDOW:]
+    outlier = new_obs[:1] + 20 * metadata["resid_std"]
+    extended, reason = extend(metadata, outlier)
+    assert reason is None and len(extended["recent_resid"]) == DRIFT_WINDOW
+    # ...but a sustained increase in noise does
+    noise = np.random.default_rng(1).standard_normal(len(new_obs)) * 5 * metadata["resid_std"]
+    _, reason = extend(metadata, new_obs + noise)
+    assert reason == "drift"
+    # Without enough residuals drift is not judged at all
+    _, reason = extend({**metadata, "recent_resid": []}, outlier)
+    assert reason is None
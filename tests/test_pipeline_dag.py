@@ -0,0 +1,48 @@
+import shutil
+
+import data_pipeline
+
+
+def test_pipeline_reruns_only_stages_with_changed_inputs(tmp_path, monkeypatch, write_raw_file):
+    monkeypatch.setattr(data_pipeline, "grid_search_arima", lambda *args, **kwargs: (1, 0, 0))
+    raw = tmp_path / "data" / "raw" / "household_power_consumption.txt"
+    raw.parent.mkdir(parents=True)
+    write_raw_file(raw, minutes=3000)
+    monkeypatch.chdir(tmp_path)
+
+    first = data_pipeline.run_pipeline(workers=2).set_index("stage")["status"]
+    assert (first == "ran").all() and len(first) == 8
+    assert (data_pipeline.run_pipeline(workers=2)["status"] == "cached").all()
+
+    # Changing the anomaly threshold only reruns the residual detection
+    report = data_pipeline.run_pipeline(threshold=2.0, workers=2).set_index("stage")["status"]
+    assert list(report[report == "ran"].index) == ["detect_residual"]
+
+    # A modified output invalidates the stage that wrote it and, if its content changed, its dependents
+    forecast_file = tmp_path / "data" / "processed" / "arima_forecast.parquet"
+    forecast_file.write_bytes(b"")
+    report = data_pipeline.run_pipeline(threshold=2.0).set_index("stage")["status"]
+    assert list(report[report == "ran"].index) == ["forecast"]
+
+
+def test_full_run_keeps_rows_appended_to_the_raw_file(tmp_path, monkeypatch, write_raw_file):
+    monkeypatch.setattr(data_pipeline, "grid_search_arima", lambda *args, **kwargs: (1, 0, 0))
+    raw = tmp_path / "data" / "raw" / "household_power_consumption.txt"
+    raw.parent.mkdir(parents=True)
+    write_raw_file(raw, minutes=3000)
+    # A mirror holding the published (shorter) copy of the dataset
+    mirror = tmp_path / "mirror"
+    mirror.mkdir()
+    shutil.copy(raw, mirror / raw.name)
+    monkeypatch.setenv("ENERGY_DATA_MIRROR", str(mirror))
+    monkeypatch.chdir(tmp_path)
+
+    data_pipeline.run_pipeline()
+    lines = write_raw_file(tmp_path / "later.txt", minutes=4000).read_text().splitlines(keepends=True)
+    with open(raw, "a") as f:
+        f.write("".join(lines[2871:]))
+    data_pipeline.run_incremental_pipeline()
+    appended = raw.read_bytes()
+    report = data_pipeline.run_pipeline().set_index("stage")["status"]
+    assert report["download"] == "ran"
+    assert raw.read_bytes() == appended
@@ -0,0 +1,40 @@
+import os
+
+import pandas as pd
+
+from storage import append_frame, compact_frame, load_frame, partition_files, save_frame
+
+
+def test_partitioned_dataset_loads_like_a_single_file(tmp_path, make_hourly_frame):
+    df = compact_frame(make_hourly_frame(periods=24 * 40))
+    single, partitioned = str(tmp_path / "single.parquet"), str(tmp_path / "partitioned.parquet")
+    save_frame(df, single)
+    save_frame(df, partitioned, partitioned=True)
+    assert sorted(os.listdir(partitioned)) == ["2008-01.parquet", "2008-02.parquet"]
+    pd.testing.assert_frame_equal(load_frame(partitioned), load_frame(single))
+
+    # Range reads only open the months they overlap
+    assert [os.path.basename(f) for f in partition_files(partitioned, "2008-02-03", "2008-02-05")] == ["2008-02.parquet"]
+    pd.testing.assert_frame_equal(load_frame(partitioned, start="2008-01-31 12:00", end="2008-02-02"),
+                                  load_frame(single, start="2008-01-31 12:00", end="2008-02-02"))
+
+    # Saving again replaces the whole dataset, also a single file of the same name
+    save_frame(df.iloc[:24], partitioned, partitioned=True)
+    save_frame(df.iloc[:24], single, partitioned=True)
+    assert os.listdir(partitioned) == os.listdir(single) == ["2008-01.parquet"]
+
+
+def test_appending_rewrites_only_the_partitions_from_the_first_new_row(tmp_path, make_hourly_frame):
+    full = make_hourly_frame(periods=24 * 70)
+    df = compact_frame(full)
+    path = str(tmp_path / "processed.parquet")
+    save_frame(df.iloc[:1000], path, partitioned=True)
+    january = os.path.join(path, "2008-01.parquet")
+    os.utime(january, ns=(0, 0))
+
+    # The new rows overlap the stored ones, arrive in float64 and reach a new month
+    appended = append_frame(full.iloc[990:], path)
+    pd.testing.assert_frame_equal(appended, df.iloc[990:], check_freq=False)
+    pd.testing.assert_frame_equal(load_frame(path), df)
+    assert sorted(os.listdir(path)) == ["2008-01.parquet", "2008-02.parquet", "2008-03.parquet"]
+    assert os.stat(january).st_mtime_ns == 0
@@ -0,0 +1,55 @@
+import json
+import logging
+
+import pandas as pd
+import pytest
+
+import utils
+from logging_config import JsonFormatter
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    utils.reset_metrics()
+    yield
+    utils.configure_instrumentation(enabled=True, profile=())
+    utils.reset_metrics()
+
+
+@utils.timed("double")
+def double(df):
+    return df * 2
+
+
+def test_timed_records_metrics_and_row_counts(tmp_path):
+    double(pd.DataFrame({"a": range(10)}))
+    with utils.timer("block") as span:
+        span.rows = 3
+    records = utils.get_metrics()
+    assert [r["name"] for r in records] == ["double", "block"]
+    assert [r["rows"] for r in records] == [10, 3]
+    assert all(r["wall_s"] >= 0 and r["cpu_s"] >= 0 and r["status"] == "ok" for r in records)
+
+    path = utils.export_metrics(str(tmp_path / "metrics" / "run.json"))
+    assert len(json.loads(open(path).read())["records"]) == 2
+    assert utils.get_metrics() == []
+
+
+def test_disabled_instrumentation_records_nothing():
+    utils.configure_instrumentation(enabled=False)
+    assert double(pd.Series([1.0])).iloc[0] == 2.0
+    assert utils.get_metrics() == []
+
+
+def test_profiling_reports_hotspots():
+    utils.configure_instrumentation(profile=("cpu", "memory"), top=5)
+    double(pd.DataFrame({"a": range(1000)}))
+    record = utils.get_metrics()[0]
+    assert "cumulative" in record["cpu_hotspots"] and len(record["memory_hotspots"]) <= 5
+
+
+def test_json_formatter_includes_metrics():
+    record = logging.LogRecord("pipeline", logging.INFO, __file__, 1, "done", None, None)
+    record.metrics = {"wall_s": 1.5}
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "done" and entry["metrics"] == {"wall_s": 1.5}